@@ -19,6 +19,12 @@ def create_app(config_name=None):
     from werkzeug.middleware.proxy_fix import ProxyFix
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+    # Database: cooperative psycopg2 under gevent, instrumented connection pool
+    from app.core.db_pool import InstrumentedQueuePool, make_psycopg2_cooperative
+    if (app.config.get('SQLALCHEMY_DATABASE_URI') or '').startswith('postgresql'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], poolclass=InstrumentedQueuePool)
+        make_psycopg2_cooperative()
+
     # Initialize Extensions
     db.init_app(app)
     from app.core.extensions import migrate
@@ -53,10 +59,30 @@ def create_app(config_name=None):
     with app.app_context():
         register_multitenancy_handlers(app)
 
+    # Keep the unified search index in sync with ORM writes
+    from app.core.search import register_search_handlers
+    register_search_handlers(app)
+
+    # Dashboard counters in Redis, bumped on commit
+    from app.core.metrics import register_metrics_handlers
+    register_metrics_handlers(app)
+
+    # Storefront catalog snapshots, rebuilt after catalog writes commit
+    from app.core.catalog import register_catalog_handlers
+    register_catalog_handlers(app)
+
+    # Uploaded media: validators, Range and X-Accel-Redirect (ahead of the generic static route)
+    from app.core.media_serving import register_media_routes
+    register_media_routes(app)
+
     # Middleware: Tenant Context
     @app.before_request
     def load_tenant_context():
         import sys
+        if request.endpoint in ('media_file', 'api.get_catalog', 'api.get_catalog_parts'):
+            # Public uploads and catalog snapshots need no tenant context; skip the Organization lookups
+            g.current_org, g.current_org_id, g.is_superuser = None, None, False
+            return
         print(f"DEBUG: before_request called for {request.path}", file=sys.stderr)
         from app.core.models import Organization
         from flask import render_template, make_response
@@ -199,15 +225,28 @@ def create_app(config_name=None):
     from app.modules.super_admin import super_admin_bp
     app.register_blueprint(super_admin_bp, url_prefix='/super_admin')
 
+    from app.modules.notifications import notifications_bp
+    app.register_blueprint(notifications_bp)
+
+    from app.modules.events import events_bp
+    app.register_blueprint(events_bp)
+
     # Register filters
     from app.core import filters
     filters.register_filters(app)
 
-    # User Loader
-    from app.core.models import User
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Navbar badge: served from the Redis counter, never a COUNT query
+    @app.context_processor
+    def inject_unread_notifications():
+        from flask_login import current_user
+        if not current_user.is_authenticated:
+            return {}
+        from app.core.notifications import get_unread_count
+        return {'unread_notification_count': get_unread_count(current_user.id)}
+
+    # User Loader: identity cached in the session, revalidated by credential version
+    from app.core.identity import register_identity_handlers
+    register_identity_handlers(app, login_manager)
 
     @login_manager.unauthorized_handler
     def unauthorized():
@@ -220,6 +259,10 @@ def create_app(config_name=None):
     @app.after_request
     def add_video_headers(response):
         """Add proper headers for video streaming and caching"""
+        # Uploaded media already carries its own validators and caching (app/core/media_serving.py)
+        if request.endpoint == 'media_file':
+            return response
+
         # Check if this is a video file
         if response.content_type and response.content_type.startswith('video/'):
             # Enable byte range requests for streaming (critical for buffering!)
@@ -227,9 +270,6 @@ def create_app(config_name=None):
 
             # Cache video files for 7 days (they're immutable after upload)
             response.headers['Cache-Control'] = 'public, max-age=604800'
-
-            # Allow conditional requests for efficient caching
-            response.headers['ETag'] = response.headers.get('ETag', '')
             response.headers['Vary'] = 'Accept-Encoding'
 
         return response
@@ -0,0 +1,86 @@
+"""
+POS bridge key authentication.
+
+Keys are looked up by their SHA-256 (unique index on organization), then the
+hashes are compared in constant time. Resolved keys are cached in-process for
+BRIDGE_KEY_CACHE_SECONDS so steady bridge traffic doesn't hit Postgres.
+Rotating or changing a key bumps a Redis epoch, which drops every worker's
+cached entries on their next lookup.
+"""
+import hmac
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import or_, and_
+from app.core.cache import get_redis
+
+EPOCH_KEY = 'bridge:key:epoch'
+CACHE_MAX_ENTRIES = 10000
+
+# key hash -> (org_id, cached_at, epoch, valid_until)
+_cache = {}
+
+
+def _epoch():
+    try:
+        return get_redis().get(EPOCH_KEY) or '0'
+    except Exception:
+        return None  # Redis unavailable: fall back to the TTL alone
+
+
+def authenticate(key):
+    """Returns the organization id for a bridge key, or None."""
+    from app.core.models import Organization
+
+    key_hash = Organization.hash_bridge_key(key)
+    ttl = current_app.config.get('BRIDGE_KEY_CACHE_SECONDS', 60)
+    epoch = _epoch()
+    now = time.monotonic()
+
+    cached = _cache.get(key_hash)
+    if cached:
+        org_id, cached_at, cached_epoch, valid_until = cached
+        if (now - cached_at < ttl and (epoch is None or epoch == cached_epoch)
+                and (valid_until is None or datetime.utcnow() < valid_until)):
+            return org_id
+        _cache.pop(key_hash, None)
+
+    row = Organization.query.with_entities(
+        Organization.id, Organization.pos_bridge_key_hash,
+        Organization.pos_bridge_key_prev_hash, Organization.pos_bridge_key_prev_expires
+    ).filter(
+        or_(Organization.pos_bridge_key_hash == key_hash,
+            and_(Organization.pos_bridge_key_prev_hash == key_hash,
+                 Organization.pos_bridge_key_prev_expires > datetime.utcnow()))
+    ).first()
+    if row is None:
+        return None
+
+    org_id, current_hash, prev_hash, prev_expires = row
+    if current_hash and hmac.compare_digest(current_hash, key_hash):
+        valid_until = None
+    elif prev_hash and hmac.compare_digest(prev_hash, key_hash):
+        valid_until = prev_expires
+    else:
+        return None
+
+    if len(_cache) >= CACHE_MAX_ENTRIES:
+        _cache.clear()
+    _cache[key_hash] = (org_id, now, epoch, valid_until)
+    return org_id
+
+
+def is_current_key(org, key):
+    """True when key is the organization's current key (not a previous one still in overlap)."""
+    if not org.pos_bridge_key_hash:
+        return False
+    return hmac.compare_digest(org.pos_bridge_key_hash, org.hash_bridge_key(key))
+
+
+def invalidate():
+    """Call after committing a key change; every worker drops its cached keys."""
+    _cache.clear()
+    try:
+        get_redis().incr(EPOCH_KEY)
+    except Exception as e:
+        current_app.logger.warning(f"Bridge key cache epoch not bumped (entries expire with the TTL): {e}")
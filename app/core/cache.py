@@ -0,0 +1,16 @@
+import redis
+from flask import current_app
+
+# One connection pool per Redis URL, shared by every request/greenlet in the process
+_pools = {}
+
+def get_redis():
+    """
+    Returns a Redis client backed by a process-wide connection pool.
+    Uses REDIS_URL (defaults to the Celery broker instance).
+    """
+    url = current_app.config['REDIS_URL']
+    pool = _pools.get(url)
+    if pool is None:
+        pool = _pools[url] = redis.ConnectionPool.from_url(url, decode_responses=True)
+    return redis.Redis(connection_pool=pool)
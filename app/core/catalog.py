@@ -0,0 +1,388 @@
+"""
+Precomputed public catalog snapshots, one per tenant.
+
+The storefront's read traffic (units with images, facets, parts, the public
+site details) is served from a JSON snapshot instead of live queries:
+
+- build_snapshot() renders a tenant's catalog. publish() stores it in Redis
+  (catalog:org:<id>) under a new version and ETag. If CATALOG_SNAPSHOT_DIR
+  is set it also writes versioned files, so a web server or CDN can serve
+  them directly.
+- ORM writes to units, unit images, parts or the public organization fields
+  mark the tenant dirty after commit (register_catalog_handlers). A
+  debounced task then rebuilds it, so a bridge sync of thousands of parts
+  causes one rebuild, not thousands.
+- A beat task rebuilds anything still marked dirty, missing or older than
+  CATALOG_MAX_AGE_SECONDS. That covers lost tasks and bulk statements that
+  bypass the ORM.
+"""
+import hashlib
+import json
+import os
+import time
+import secrets
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, orm, inspect, select
+from app.core.cache import get_redis
+
+SNAPSHOT_KEY = 'catalog:org:{org_id}'  # Hash: version, built_at, catalog, catalog_etag, parts, parts_etag
+VERSION_KEY = 'catalog:org:{org_id}:version'
+DIRTY_KEY = 'catalog:dirty'
+QUEUED_KEY = 'catalog:queued:{org_id}'
+BUILD_LOCK_KEY = 'catalog:building:{org_id}'
+HOST_KEY = 'catalog:host:{host}'
+
+HOST_CACHE_SECONDS = 300
+BUILD_LOCK_SECONDS = 30
+KEEP_FILE_VERSIONS = 3
+DOCUMENTS = ('catalog', 'parts')
+
+# Organization fields that appear in the snapshot's site section
+PUBLIC_ORG_FIELDS = ('name', 'slug', 'custom_domain', 'is_active', 'theme_config', 'modules',
+                     'ari_dealer_id', 'pos_provider', 'facebook_page_id')
+MASTER_SUBDOMAINS = ('www', 'app', 'saas', 'mail', 'api', 'admin')
+
+
+# Writes the snapshot hash only if its version is newer than the stored one
+_PUBLISH_IF_NEWER = """
+local current = tonumber(redis.call('hget', KEYS[1], 'version') or '0')
+if current >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('hset', KEYS[1], unpack(ARGV, 2))
+return 1
+"""
+
+# Deletes the build lock only if it still holds this caller's token
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def snapshot_key(org_id):
+    return SNAPSHOT_KEY.format(org_id=org_id)
+
+
+# -- Building ------------------------------------------------------------
+
+def _facet(units, field):
+    counts = {}
+    for unit in units:
+        value = unit.get(field)
+        if value:
+            counts[value] = counts.get(value, 0) + 1
+    return [{'value': value, 'count': count}
+            for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0].lower()))]
+
+
+def _bounds(values):
+    values = [v for v in values if v]
+    return {'min': min(values), 'max': max(values)} if values else {'min': None, 'max': None}
+
+
+def build_snapshot(org_id):
+    """Renders a tenant's public catalog: {'catalog': {...}, 'parts': {...}}, or None if the tenant is gone."""
+    from sqlalchemy.orm import selectinload
+    from app.core.extensions import db
+    from app.core import images
+    from app.core.models import Organization, Unit, PartInventory
+
+    org = db.session.get(Organization, org_id)
+    if org is None:
+        return None
+
+    units = Unit.query.options(selectinload(Unit.images)).filter_by(
+        organization_id=org_id, is_inventory=True, display_on_web=True
+    ).order_by(Unit.id.desc()).all()
+
+    unit_rows = []
+    for unit in units:
+        # Primary image, else the first one uploaded
+        ordered = sorted(unit.images, key=lambda img: (not img.is_primary, img.id))
+        primary_img = ordered[0] if ordered else None
+        unit_rows.append({
+            "id": unit.id,
+            "name": f"{unit.manufacturer or ''} {unit.model_number or ''}".strip(),
+            "manufacturer": unit.manufacturer,
+            "model": unit.model_number,
+            "model_number": unit.model_number,
+            "serial_number": unit.serial_number,
+            "type": unit.type,
+            "price": float(unit.price) if unit.price else 0.0,
+            "stock": 1,
+            "status": unit.status,
+            "image": primary_img.image_url if primary_img else None,
+            "image_srcset": images.srcset(primary_img.variants) if primary_img else None,
+            "description": unit.description,
+            "condition": unit.condition or "New",
+            "year": unit.year,
+            "unit_hours": unit.unit_hours
+        })
+
+    parts = PartInventory.query.filter_by(organization_id=org_id).order_by(PartInventory.updated_at.desc()).all()
+    part_rows = [{
+        "id": part.id,
+        "part_number": part.part_number,
+        "manufacturer": part.manufacturer,
+        "description": part.description,
+        "stock": part.stock_on_hand,
+        "image": part.image_url
+    } for part in parts]
+
+    modules = org.modules or {}
+    theme = org.theme_config or {}
+    built_at = datetime.utcnow().isoformat()
+    catalog = {
+        "organization_id": org.id,
+        "built_at": built_at,
+        "site": {
+            "identity": {"name": org.name, "slug": org.slug},
+            "is_active": org.is_active,
+            "contact": {"email": theme.get('contact_email'), "phone": theme.get('contact_phone')},
+            # Same safe subset as /v1/site-info; never tokens or the bridge key
+            "integrations": {
+                "ari": {"enabled": modules.get('ari', False), "dealer_id": org.ari_dealer_id},
+                "facebook": {"enabled": modules.get('facebook', False), "page_id": org.facebook_page_id},
+                "pos": {"enabled": bool(org.pos_provider and org.pos_provider != 'none'), "provider": org.pos_provider}
+            }
+        },
+        "units": unit_rows,
+        "facets": {
+            "manufacturers": _facet(unit_rows, 'manufacturer'),
+            "types": _facet(unit_rows, 'type'),
+            "conditions": _facet(unit_rows, 'condition'),
+            "price": _bounds(u['price'] for u in unit_rows),
+            "year": _bounds(u['year'] for u in unit_rows)
+        },
+        "parts_summary": {
+            "count": len(part_rows),
+            "in_stock": sum(1 for p in part_rows if (p['stock'] or 0) > 0),
+            "manufacturers": _facet(part_rows, 'manufacturer')
+        }
+    }
+    return {'catalog': catalog, 'parts': {"organization_id": org.id, "built_at": built_at, "parts": part_rows}}
+
+
+def _etag(body):
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()[:20]
+
+
+def next_version(org_id):
+    return get_redis().incr(VERSION_KEY.format(org_id=org_id))
+
+
+def publish(org_id, snapshot, version=None):
+    """
+    Stores a built snapshot under `version` (taken before the build read the
+    data; the next one if not given). A build that finishes after a newer one
+    was published is discarded. Returns the hash fields now stored.
+    """
+    r = get_redis()
+    if version is None:
+        version = next_version(org_id)
+    fields = {'version': version, 'built_at': snapshot['catalog']['built_at']}
+    for name in DOCUMENTS:
+        body = json.dumps(dict(snapshot[name], version=version), separators=(',', ':'), default=str)
+        fields[name] = body
+        fields[f"{name}_etag"] = _etag(body)
+
+    args = [version]
+    for field, value in fields.items():
+        args.extend([field, value])
+    if not r.register_script(_PUBLISH_IF_NEWER)(keys=[snapshot_key(org_id)], args=args):
+        current_app.logger.info(f"Catalog snapshot v{version} for org {org_id} superseded by a newer build")
+        return r.hgetall(snapshot_key(org_id))
+
+    snapshot_dir = current_app.config.get('CATALOG_SNAPSHOT_DIR')
+    if snapshot_dir:
+        try:
+            _write_files(os.path.join(snapshot_dir, str(org_id)), version, fields)
+        except OSError as e:
+            current_app.logger.warning(f"Catalog snapshot files for org {org_id} not written: {e}")
+    return fields
+
+
+def _write_files(directory, version, fields):
+    """<name>.v<version>.json, plus <name>.json swapped in atomically; old versions pruned."""
+    os.makedirs(directory, exist_ok=True)
+    for name in DOCUMENTS:
+        versioned = os.path.join(directory, f"{name}.v{version}.json")
+        tmp = versioned + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(fields[name])
+        os.replace(tmp, versioned)
+
+        current_tmp = os.path.join(directory, f".{name}.json.tmp")
+        with open(current_tmp, 'w', encoding='utf-8') as f:
+            f.write(fields[name])
+        os.replace(current_tmp, os.path.join(directory, f"{name}.json"))
+
+        prefix = f"{name}.v"
+        old_versions = sorted(
+            (int(entry[len(prefix):-5]) for entry in os.listdir(directory)
+             if entry.startswith(prefix) and entry.endswith('.json') and entry[len(prefix):-5].isdigit()),
+            reverse=True)
+        for old in old_versions[KEEP_FILE_VERSIONS:]:
+            try:
+                os.remove(os.path.join(directory, f"{prefix}{old}.json"))
+            except FileNotFoundError:
+                pass
+
+
+def rebuild(org_id):
+    """Builds and publishes a tenant's snapshot; drops it if the tenant no longer exists."""
+    r = get_redis()
+    # Cleared before building: changes committed from here on queue another rebuild
+    r.delete(QUEUED_KEY.format(org_id=org_id))
+    r.srem(DIRTY_KEY, org_id)
+    # Versioned before reading, so an overlapping slower build of older data can't overwrite this one
+    version = next_version(org_id)
+    snapshot = build_snapshot(org_id)
+    if snapshot is None:
+        r.delete(snapshot_key(org_id))
+        return None
+    return publish(org_id, snapshot, version)
+
+
+def pending_org_ids(max_age_seconds):
+    """Tenants still marked dirty, or whose snapshot is missing or older than max_age_seconds."""
+    from app.core.extensions import db
+    from app.core.models import Organization
+
+    r = get_redis()
+    org_ids = [org_id for (org_id,) in db.session.query(Organization.id).filter(Organization.is_active.is_(True))]
+    pipe = r.pipeline(transaction=False)
+    for org_id in org_ids:
+        pipe.hget(snapshot_key(org_id), 'built_at')
+    built = pipe.execute()
+
+    cutoff = datetime.utcnow().timestamp() - max_age_seconds
+    pending = {int(org_id) for org_id in r.smembers(DIRTY_KEY)}
+    for org_id, built_at in zip(org_ids, built):
+        if built_at is None or datetime.fromisoformat(built_at).timestamp() < cutoff:
+            pending.add(org_id)
+    return sorted(pending)
+
+
+# -- Reading -------------------------------------------------------------
+
+def get_document(org_id, name='catalog'):
+    """(etag, json body) of a published snapshot document, building it on a cold miss."""
+    r = get_redis()
+    body, etag = r.hmget(snapshot_key(org_id), name, f"{name}_etag")
+    if body is not None:
+        return etag, body
+
+    # Cold: one request builds while concurrent ones wait briefly for it
+    lock = BUILD_LOCK_KEY.format(org_id=org_id)
+    token = secrets.token_hex(16)
+    owner = r.set(lock, token, nx=True, ex=BUILD_LOCK_SECONDS)
+    if not owner:
+        for _ in range(20):
+            time.sleep(0.25)
+            body, etag = r.hmget(snapshot_key(org_id), name, f"{name}_etag")
+            if body is not None:
+                return etag, body
+    try:
+        fields = rebuild(org_id)
+    finally:
+        # Never release a lock that expired and now belongs to another builder
+        if owner:
+            r.register_script(_RELEASE_LOCK)(keys=[lock], args=[token])
+    if not fields:
+        return None, None
+    return fields[f"{name}_etag"], fields[name]
+
+
+def resolve_org_id(host, slug=None):
+    """
+    Tenant for a storefront request without the full before_request lookup,
+    cached for HOST_CACHE_SECONDS. Mirrors load_tenant_context: explicit slug,
+    tenant subdomain, master subdomains / localhost, then custom domain, with
+    the root domain and other unmapped hosts falling back to the master org.
+    """
+    from app.core.extensions import db
+    from app.core.models import Organization
+
+    cache_key = HOST_KEY.format(host=f"slug:{slug}" if slug else host)
+    r = get_redis()
+    cached = r.get(cache_key)
+    if cached:
+        return int(cached)
+
+    host_parts = host.split('.')
+    if slug:
+        org_id = db.session.query(Organization.id).filter_by(slug=slug).scalar()
+    elif len(host_parts) >= 3:
+        if host_parts[0] in MASTER_SUBDOMAINS:
+            org_id = 1
+        else:
+            org_id = db.session.query(Organization.id).filter_by(slug=host_parts[0]).scalar()
+    elif 'localhost' in host or '127.0.0.1' in host:
+        org_id = 1
+    else:
+        org_id = db.session.query(Organization.id).filter_by(custom_domain=host).scalar() or 1
+
+    if org_id:
+        r.set(cache_key, org_id, ex=HOST_CACHE_SECONDS)
+    return org_id
+
+
+# -- Change tracking -----------------------------------------------------
+
+def mark_dirty(org_ids):
+    """Flags tenants for a rebuild and queues one debounced rebuild per tenant."""
+    from app.tasks.catalog import rebuild_catalog_snapshot
+
+    delay = current_app.config.get('CATALOG_REBUILD_DELAY_SECONDS', 10)
+    r = get_redis()
+    r.sadd(DIRTY_KEY, *org_ids)
+    for org_id in org_ids:
+        # Only the first change in a window queues a task; later ones ride along
+        if r.set(QUEUED_KEY.format(org_id=org_id), 1, nx=True, ex=delay + 60):
+            rebuild_catalog_snapshot.apply_async(args=[org_id], countdown=delay)
+
+
+def _org_fields_changed(org):
+    state = inspect(org)
+    return any(state.attrs[field].history.has_changes() for field in PUBLIC_ORG_FIELDS)
+
+
+def register_catalog_handlers(app):
+    from app.core.models import Organization, Unit, UnitImage, PartInventory
+
+    @event.listens_for(orm.Session, "after_flush")
+    def _collect_catalog_changes(session, flush_context):
+        dirty_orgs = set()
+        image_unit_ids = set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, (Unit, PartInventory)):
+                dirty_orgs.add(obj.organization_id)
+            elif isinstance(obj, UnitImage):
+                image_unit_ids.add(obj.unit_id)
+            elif isinstance(obj, Organization) and (obj in session.deleted or obj in session.new or _org_fields_changed(obj)):
+                dirty_orgs.add(obj.id)
+        if image_unit_ids:
+            dirty_orgs.update(session.execute(
+                select(Unit.organization_id).where(Unit.id.in_(image_unit_ids))).scalars())
+        dirty_orgs.discard(None)
+        if dirty_orgs:
+            session.info.setdefault('catalog_dirty', set()).update(dirty_orgs)
+
+    @event.listens_for(orm.Session, "after_commit")
+    def _queue_catalog_rebuilds(session):
+        org_ids = session.info.pop('catalog_dirty', None)
+        if not org_ids:
+            return
+        try:
+            mark_dirty(org_ids)
+        except Exception as e:
+            app.logger.warning(f"Catalog rebuild not queued (the beat task will catch up): {str(e)}")
+
+    @event.listens_for(orm.Session, "after_rollback")
+    def _discard_catalog_changes(session):
+        session.info.pop('catalog_dirty', None)
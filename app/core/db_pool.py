@@ -0,0 +1,126 @@
+"""
+Database connection layer for the gevent web worker.
+
+psycopg2 is a C driver: left alone, a query blocks the whole process and
+every other greenlet with it. make_psycopg2_cooperative() installs a wait
+callback (the psycogreen approach), so libpq runs in async mode and each
+socket wait yields to the gevent hub. Concurrency is then bounded by the
+connection pool, which InstrumentedQueuePool measures: how long checkouts
+wait, how often they time out, and how close the pool is to saturation.
+"""
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+# Checkout wait histogram bucket upper bounds, in seconds
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    """psycopg2 wait callback that waits on the connection socket through gevent."""
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+
+def make_psycopg2_cooperative():
+    """
+    Installs the gevent wait callback when this process is monkey-patched
+    (the gunicorn web worker). Returns True if installed; Celery workers and
+    scripts keep the default blocking driver.
+    """
+    try:
+        import gevent.monkey
+        if not gevent.monkey.is_module_patched('socket'):
+            return False
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    extensions.set_wait_callback(_gevent_wait_callback)
+    return True
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time and timeouts for get_pool_metrics()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waiting = 0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def _do_get(self):
+        with self._stats_lock:
+            self._waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self._waiting -= 1
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self._waiting -= 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self._wait_buckets[i] += 1
+                    break
+            else:
+                self._wait_buckets[-1] += 1
+        return conn
+
+    def metrics(self, reset=False):
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        with self._stats_lock:
+            data = {
+                'pool_size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': checked_out,
+                'checked_in': self.checkedin(),
+                'overflow': max(self.overflow(), 0),
+                'saturation': round(checked_out / capacity, 3) if capacity > 0 else None,
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'wait_avg_ms': round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+                'wait_histogram': {
+                    **{f"le_{int(bound * 1000)}ms": count for bound, count in zip(WAIT_BUCKETS, self._wait_buckets)},
+                    'gt_5000ms': self._wait_buckets[-1],
+                },
+            }
+            if reset:
+                self._reset_stats()
+        return data
+
+
+def get_pool_metrics(engine, reset=False):
+    """Pool metrics for an engine, or None if it isn't using InstrumentedQueuePool (e.g. SQLite in tests)."""
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return None
+    return pool.metrics(reset=reset)
@@ -0,0 +1,34 @@
+import json
+from flask import current_app
+from app.core.cache import get_redis
+
+ORG_CHANNEL = 'events:org:{org_id}'
+USER_CHANNEL = 'events:user:{user_id}'
+
+def org_channel(org_id):
+    return ORG_CHANNEL.format(org_id=org_id)
+
+def user_channel(user_id):
+    return USER_CHANNEL.format(user_id=user_id)
+
+def publish_event(org_id, event_type, data, user_id=None):
+    """
+    Publishes a live event to the tenant's channel, or to a single user's
+    channel when user_id is given. Delivery is best-effort: a Redis outage
+    must never fail the write that triggered the event.
+    """
+    channel = user_channel(user_id) if user_id else org_channel(org_id)
+    try:
+        get_redis().publish(channel, json.dumps({'type': event_type, 'data': data}, default=str))
+    except Exception as e:
+        current_app.logger.warning(f"Failed to publish {event_type} event: {e}")
+
+def note_event_data(note):
+    """Serializable view of a Note/DealerNote for live timeline updates."""
+    return {
+        'id': note.id,
+        'parent_id': note.parent_id,
+        'user': note.user,
+        'text': note.text,
+        'timestamp': note.timestamp.strftime('%b %d, %I:%M %p') if note.timestamp else None
+    }
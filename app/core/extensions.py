@@ -15,5 +15,5 @@ migrate = Migrate()
 # The include parameter tells Celery which modules contain tasks
 celery = Celery(
     'power_equip_saas',
-    include=['app.tasks.marketing', 'app.tasks.pos_sync']
+    include=['app.tasks.marketing', 'app.tasks.pos_sync', 'app.tasks.notifications', 'app.tasks.search', 'app.tasks.media', 'app.tasks.metrics', 'app.tasks.bridge', 'app.tasks.catalog']
 )
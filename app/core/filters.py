@@ -89,6 +89,16 @@ def escapejs_filter(value):
         return ""
     return value.replace('\\', '\\\\').replace("'", "\\'").replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
 
+def storage_url_filter(key):
+    """Public URL for a storage key (see app/core/storage.py)."""
+    from app.core.storage import url_for_key
+    return url_for_key(key)
+
+def signed_url_filter(key):
+    """Short-lived URL for a private storage key; public URL on local storage."""
+    from app.core.storage import get_storage
+    return get_storage().signed_url(key) if key else None
+
 def register_filters(app):
     app.jinja_env.filters['html_to_plaintext'] = html_to_plaintext
     app.jinja_env.filters['plaintext'] = html_to_plaintext # Alias
@@ -97,3 +107,5 @@ def register_filters(app):
     app.jinja_env.filters['is_light'] = is_light_color
     app.jinja_env.filters['time_ago'] = time_ago_filter
     app.jinja_env.filters['escapejs'] = escapejs_filter
+    app.jinja_env.filters['storage_url'] = storage_url_filter
+    app.jinja_env.filters['signed_url'] = signed_url_filter
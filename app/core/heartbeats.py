@@ -0,0 +1,222 @@
+"""
+POS bridge presence, kept in Redis.
+
+A heartbeat never touches Postgres directly:
+
+- bridge:hb:<org_id> holds the latest heartbeat (epoch seconds). It carries
+  a TTL of BRIDGE_OFFLINE_AFTER_SECONDS, so its expiry *is* the offline signal.
+- bridge:hb:pending is a ZSET (org_id -> latest epoch) drained by the
+  flush_bridge_heartbeats beat task. One batched UPDATE per run writes
+  organization.last_bridge_heartbeat, and only when the stored value is more
+  than BRIDGE_HEARTBEAT_DB_RESOLUTION_SECONDS old.
+- bridge:online is the set of bridges currently online. Adding to or removing
+  from it is the transition point, so each online/offline event fires once even
+  with several web workers, the expiry listener and the sweep racing.
+
+Offline transitions come from key-expiry notifications (bridge_monitor.py).
+Pub/sub is fire-and-forget, so sweep_bridge_status also reconciles the online
+set against the live keys.
+"""
+import time
+from datetime import datetime
+from flask import current_app
+from app.core.cache import get_redis
+from app.core.events import publish_event
+
+HEARTBEAT_KEY = 'bridge:hb:{org_id}'
+HEARTBEAT_KEY_PREFIX = 'bridge:hb:'
+PENDING_KEY = 'bridge:hb:pending'
+ONLINE_KEY = 'bridge:online'
+
+FLUSH_BATCH_SIZE = 1000
+MASTER_ORG_ID = 1  # The platform owner's channel receives every tenant's transitions
+
+# Refresh the TTL key, remember the heartbeat for the next flush and report
+# whether this heartbeat brought the bridge online
+_RECORD_HEARTBEAT = """
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('zadd', KEYS[2], ARGV[1], ARGV[3])
+return redis.call('sadd', KEYS[3], ARGV[3])
+"""
+
+
+def heartbeat_key(org_id):
+    return HEARTBEAT_KEY.format(org_id=org_id)
+
+
+def _ttl():
+    return int(current_app.config.get('BRIDGE_OFFLINE_AFTER_SECONDS', 3600))
+
+
+def record_heartbeat(org_id, now=None):
+    """
+    Records a bridge check-in. Returns the heartbeat time (UTC datetime).
+    Falls back to a direct column update if Redis is unavailable.
+    """
+    now = now or time.time()
+    try:
+        r = get_redis()
+        came_online = r.register_script(_RECORD_HEARTBEAT)(
+            keys=[heartbeat_key(org_id), PENDING_KEY, ONLINE_KEY], args=[now, _ttl(), org_id])
+    except Exception as e:
+        current_app.logger.warning(f"Heartbeat cache unavailable, writing to the database: {e}")
+        _write_through(org_id, now)
+        return datetime.utcfromtimestamp(now)
+
+    if came_online:
+        _emit_transition(org_id, 'online', now)
+    return datetime.utcfromtimestamp(now)
+
+
+def _write_through(org_id, now):
+    from app.core.extensions import db
+    from app.core.models import Organization
+    Organization.query.filter_by(id=org_id).update(
+        {'last_bridge_heartbeat': datetime.utcfromtimestamp(now)}, synchronize_session=False)
+    db.session.commit()
+
+
+def last_seen(org):
+    """Latest heartbeat for an Organization: live from Redis, else the flushed column."""
+    try:
+        value = get_redis().get(heartbeat_key(org.id))
+    except Exception:
+        value = None
+    if value is not None:
+        return datetime.utcfromtimestamp(float(value))
+    return org.last_bridge_heartbeat
+
+
+def online_org_ids():
+    """Org ids whose bridge is online, or None when Redis is unavailable."""
+    try:
+        return {int(org_id) for org_id in get_redis().smembers(ONLINE_KEY)}
+    except Exception as e:
+        current_app.logger.warning(f"Bridge presence unavailable: {e}")
+        return None
+
+
+# -- Transitions ---------------------------------------------------------
+
+def mark_offline(org_id):
+    """Offline transition for a bridge whose heartbeat key expired; a no-op if already offline."""
+    r = get_redis()
+    if r.exists(heartbeat_key(org_id)):
+        return False  # It checked in again before we got here
+    if not r.srem(ONLINE_KEY, org_id):
+        return False
+    _emit_transition(org_id, 'offline', time.time())
+    return True
+
+
+def _emit_transition(org_id, status, at):
+    data = {'organization_id': org_id, 'status': status,
+            'at': datetime.utcfromtimestamp(at).isoformat()}
+    current_app.logger.info(f"Bridge for org {org_id} is {status}")
+    publish_event(org_id, 'bridge_status', data)
+    if org_id != MASTER_ORG_ID:
+        publish_event(MASTER_ORG_ID, 'bridge_status', data)
+    try:
+        from app.core.metrics import OFFLINE_BRIDGES_KEY
+        get_redis().delete(OFFLINE_BRIDGES_KEY)  # The command center recomputes on its next view
+    except Exception:
+        pass
+
+
+def sweep():
+    """
+    Reconciles bridge:online with the live heartbeat keys, catching expiry
+    notifications the listener missed. Returns the org ids marked offline.
+    """
+    r = get_redis()
+    members = list(r.smembers(ONLINE_KEY))
+    if not members:
+        return []
+    pipe = r.pipeline(transaction=False)
+    for org_id in members:
+        pipe.exists(heartbeat_key(org_id))
+    alive = pipe.execute()
+    return [int(org_id) for org_id, exists in zip(members, alive) if not exists and mark_offline(int(org_id))]
+
+
+def listen_for_expiry():
+    """
+    Blocks forever, turning heartbeat-key expiry into offline transitions.
+    Needs keyspace notifications for expired events (notify-keyspace-events Ex).
+    """
+    r = get_redis()
+    try:
+        flags = r.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+        if not ('E' in flags and ('x' in flags or 'A' in flags)):
+            r.config_set('notify-keyspace-events', ''.join(sorted(set(flags + 'Ex'))))
+    except Exception as e:
+        current_app.logger.warning(f"Could not enable keyspace notifications (relying on the sweep): {e}")
+
+    db_index = r.connection_pool.connection_kwargs.get('db', 0)
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f"__keyevent@{db_index}__:expired")
+    current_app.logger.info("Listening for bridge heartbeat expiry")
+
+    for message in pubsub.listen():
+        key = message.get('data')
+        if not isinstance(key, str) or not key.startswith(HEARTBEAT_KEY_PREFIX):
+            continue
+        org_id = key[len(HEARTBEAT_KEY_PREFIX):]
+        if not org_id.isdigit():
+            continue  # bridge:hb:pending
+        try:
+            mark_offline(int(org_id))
+        except Exception as e:
+            current_app.logger.error(f"Offline transition for org {org_id} failed: {e}")
+
+
+# -- Persistence ---------------------------------------------------------
+
+def flush_pending(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Drains bridge:hb:pending into organization.last_bridge_heartbeat with one
+    UPDATE ... FROM (VALUES ...) per batch. Rows whose stored heartbeat is
+    recent enough are skipped. Returns (drained, rows_updated).
+    """
+    from sqlalchemy import text
+    from app.core.extensions import db
+
+    resolution = int(current_app.config.get('BRIDGE_HEARTBEAT_DB_RESOLUTION_SECONDS', 600))
+    r = get_redis()
+    drained = updated = 0
+
+    while True:
+        batch = r.zpopmin(PENDING_KEY, batch_size)
+        if not batch:
+            break
+        drained += len(batch)
+
+        params = {}
+        values = []
+        for i, (org_id, score) in enumerate(batch):
+            params[f"id{i}"] = int(org_id)
+            params[f"ts{i}"] = datetime.utcfromtimestamp(score)
+            values.append(f"(CAST(:id{i} AS INTEGER), CAST(:ts{i} AS TIMESTAMP))")
+        params['resolution'] = resolution
+
+        try:
+            result = db.session.execute(text(f"""
+                UPDATE organization AS o
+                SET last_bridge_heartbeat = v.ts
+                FROM (VALUES {', '.join(values)}) AS v(id, ts)
+                WHERE o.id = v.id
+                AND (o.last_bridge_heartbeat IS NULL
+                     OR o.last_bridge_heartbeat < v.ts - make_interval(secs => :resolution))
+            """), params)
+            db.session.commit()
+            updated += result.rowcount
+        except Exception:
+            db.session.rollback()
+            # Put the batch back (never over a newer heartbeat) for the next run
+            r.zadd(PENDING_KEY, {org_id: score for org_id, score in batch}, gt=True)
+            raise
+
+        if len(batch) < batch_size:
+            break
+
+    return drained, updated
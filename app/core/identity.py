@@ -0,0 +1,149 @@
+"""
+Session-cached user identity.
+
+Flask-Login's user loader used to SELECT the user on every authenticated
+request. Instead, the fields most pages need (id, organization, role,
+username, reset flag) are kept in the session alongside the user's
+credential_version. Each request checks that version against Redis
+(user:cv:<id>), one GET. A password or role change, or deletion, bumps
+the version after commit, so other sessions reload from the database on
+their next request and a deleted user is logged out immediately. The
+cached identity is also refreshed every IDENTITY_CACHE_SECONDS regardless,
+in case a bump never reached Redis.
+
+current_user is a CachedUser. Reading any other attribute, or assigning
+one, loads the real User row once per request and delegates to it.
+"""
+import time
+from flask import session, current_app
+from flask_login import UserMixin
+from sqlalchemy import event, orm, inspect
+from app.core.cache import get_redis
+
+VERSION_KEY = 'user:cv:{user_id}'
+VERSION_TTL = 7 * 24 * 3600  # Cold keys fall back to one database load
+REVOKED = 'revoked'
+SESSION_KEY = '_identity'
+
+IDENTITY_FIELDS = ('id', 'organization_id', 'role', 'username', 'password_reset_required', 'credential_version')
+# Changing any of these invalidates cached identities
+CREDENTIAL_FIELDS = ('password', 'role', 'organization_id', 'username', 'password_reset_required')
+
+
+def version_key(user_id):
+    return VERSION_KEY.format(user_id=user_id)
+
+
+class CachedUser(UserMixin):
+    """Identity fields from the session; everything else from the User row, loaded on first use."""
+
+    def __init__(self, identity, user=None):
+        object.__setattr__(self, '_identity', identity)
+        object.__setattr__(self, '_user', user)
+
+    def _load(self):
+        user = self._user
+        if user is None:
+            from app.core.extensions import db
+            from app.core.models import User
+            user = db.session.get(User, self._identity['id'])
+            object.__setattr__(self, '_user', user)
+        return user
+
+    def __getattr__(self, name):
+        identity = self.__dict__['_identity']
+        if name in identity:
+            return identity[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+        if name in self._identity:
+            self._identity[name] = value
+
+    def get_id(self):
+        return str(self._identity['id'])
+
+    def __repr__(self):
+        return f"<CachedUser {self._identity['id']}>"
+
+
+def _identity_of(user):
+    return {field: getattr(user, field) for field in IDENTITY_FIELDS}
+
+
+def load_user(user_id):
+    """Flask-Login user loader."""
+    from app.core.extensions import db
+    from app.core.models import User
+
+    user_id = int(user_id)
+    cached = session.get(SESSION_KEY)
+    current = None
+    redis_ok = True
+    try:
+        current = get_redis().get(version_key(user_id))
+    except Exception as e:
+        redis_ok = False
+        current_app.logger.warning(f"Identity cache unavailable: {e}")
+
+    max_age = current_app.config.get('IDENTITY_CACHE_SECONDS', 300)
+    if cached and cached.get('id') == user_id and current is not None \
+            and current == str(cached.get('credential_version')) \
+            and time.time() - cached.get('cached_at', 0) < max_age:
+        return CachedUser({field: cached[field] for field in IDENTITY_FIELDS})
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        session.pop(SESSION_KEY, None)
+        return None
+
+    identity = _identity_of(user)
+    session[SESSION_KEY] = dict(identity, cached_at=time.time())
+    if redis_ok and current is None:
+        try:
+            # NX: never overwrite a version bumped by a concurrent commit
+            get_redis().set(version_key(user_id), user.credential_version, ex=VERSION_TTL, nx=True)
+        except Exception:
+            pass
+    return CachedUser(dict(identity), user)
+
+
+def register_identity_handlers(app, login_manager):
+    from app.core.models import User
+
+    login_manager.user_loader(load_user)
+
+    @event.listens_for(orm.Session, "before_flush")
+    def _bump_credential_versions(session_, flush_context, instances):
+        changed = session_.info.setdefault('credential_changes', {})
+        for obj in session_.dirty:
+            if isinstance(obj, User) and any(inspect(obj).attrs[field].history.has_changes() for field in CREDENTIAL_FIELDS):
+                obj.credential_version = (obj.credential_version or 1) + 1
+                changed[obj.id] = obj.credential_version
+        for obj in session_.deleted:
+            if isinstance(obj, User):
+                changed[obj.id] = REVOKED
+
+    @event.listens_for(orm.Session, "after_commit")
+    def _publish_credential_versions(session_):
+        changed = session_.info.pop('credential_changes', None)
+        if not changed:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for user_id, version in changed.items():
+                pipe.set(version_key(user_id), version, ex=VERSION_TTL)
+            pipe.execute()
+        except Exception as e:
+            # Without the bump, other sessions keep their cached identity for up to
+            # IDENTITY_CACHE_SECONDS; deleting the key forces a database load instead
+            app.logger.error(f"Credential version publish failed: {e}")
+            try:
+                get_redis().delete(*[version_key(user_id) for user_id in changed])
+            except Exception:
+                pass
+
+    @event.listens_for(orm.Session, "after_rollback")
+    def _discard_credential_versions(session_):
+        session_.info.pop('credential_changes', None)
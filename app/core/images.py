@@ -0,0 +1,163 @@
+"""
+Responsive image derivatives.
+
+Every source image gets resized AVIF (when the Pillow build supports it),
+WebP and JPEG variants at fixed widths, stored content-addressed per tenant
+under the storage key:
+
+    variants/<org_id>/<sha256 of source>/<width>.<ext>
+
+A manifest describing the variants is stored on the owning record (a JSON
+column or theme_config) and turned into srcset strings for the public APIs.
+"""
+import os
+import json
+from flask import current_app
+from app.core.storage import get_storage, tenant_key
+
+VARIANT_WIDTHS = (320, 640, 960, 1280, 1920)
+QUALITY = {'avif': 50, 'webp': 80, 'jpeg': 82}
+
+_heif_registered = False
+
+
+def register_heif():
+    """Lets Pillow open HEIC/HEIF phone photos (and AVIF on older Pillow builds)."""
+    global _heif_registered
+    if _heif_registered:
+        return
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+        if hasattr(pillow_heif, 'register_avif_opener'):
+            pillow_heif.register_avif_opener()
+    except ImportError:
+        current_app.logger.warning("pillow-heif not installed; HEIC uploads will not be processed")
+    _heif_registered = True
+
+
+def output_formats(has_alpha):
+    """Formats this Pillow build can write, best first. PNG replaces JPEG for transparent logos."""
+    from PIL import features
+    formats = []
+    if features.check('avif') or _can_save('AVIF'):
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    formats.append('png' if has_alpha else 'jpeg')
+    return formats
+
+
+def _can_save(format_name):
+    from PIL import Image
+    Image.init()
+    return format_name in Image.SAVE
+
+
+def _save(img, dest, fmt):
+    tmp = f"{dest}.tmp"
+    if fmt == 'jpeg':
+        img.convert('RGB').save(tmp, 'JPEG', quality=QUALITY['jpeg'], optimize=True, progressive=True)
+    elif fmt == 'webp':
+        img.save(tmp, 'WEBP', quality=QUALITY['webp'], method=4)
+    elif fmt == 'avif':
+        img.save(tmp, 'AVIF', quality=QUALITY['avif'], speed=6)
+    elif fmt == 'png':
+        img.save(tmp, 'PNG', optimize=True)
+    os.replace(tmp, dest)
+
+
+def build_variants(src_key, org_id):
+    """
+    Writes the variants for one stored image and returns its manifest.
+    An identical source (same hash) reuses the existing manifest untouched.
+    """
+    from PIL import Image, ImageOps
+    from app.modules.marketing.media_store import sha256_file
+
+    register_heif()
+    storage = get_storage()
+
+    with storage.local_copy(src_key) as src_path:
+        digest = sha256_file(src_path)
+        prefix = tenant_key(org_id, 'variants', digest)
+        manifest_key = f"{prefix}/manifest.json"
+
+        if storage.exists(manifest_key):
+            return json.loads(storage.read_bytes(manifest_key))
+
+        with storage.work_dir() as work_dir, Image.open(src_path) as img:
+            img = ImageOps.exif_transpose(img)
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+            width, height = img.size
+
+            # Never upscale; always include one variant at (capped) native width
+            widths = [w for w in VARIANT_WIDTHS if w < width] + [min(width, VARIANT_WIDTHS[-1])]
+            formats = output_formats(has_alpha)
+
+            variants = []
+            for target in sorted(set(widths)):
+                resized = img if target == width else img.resize(
+                    (target, max(round(height * target / width), 1)), Image.LANCZOS)
+                for fmt in formats:
+                    name = f"{target}.{'jpg' if fmt == 'jpeg' else fmt}"
+                    dest = os.path.join(work_dir, name)
+                    try:
+                        _save(resized, dest, fmt)
+                    except Exception as e:
+                        current_app.logger.warning(f"Could not write {fmt} variant of {src_key}: {str(e)}")
+                        continue
+                    size = os.path.getsize(dest)
+                    variants.append({
+                        'width': target,
+                        'height': resized.size[1],
+                        'format': fmt,
+                        'key': storage.put_file(f"{prefix}/{name}", dest, move=True),
+                        'bytes': size,
+                    })
+
+    manifest = {'sha256': digest, 'width': width, 'height': height, 'variants': variants}
+    # Written last: its presence means every variant is stored
+    storage.put_bytes(manifest_key, json.dumps(manifest).encode(), 'application/json')
+    return manifest
+
+
+def build_variants_for_url(url, org_id):
+    """build_variants for a stored upload's URL; None if it isn't in our storage."""
+    storage = get_storage()
+    key = storage.key_for_url(url)
+    if not key or not storage.exists(key):
+        return None
+    return build_variants(key, org_id)
+
+
+def variant_url(variant, base_url=''):
+    url = get_storage().url(variant['key'])
+    return f"{base_url}{url}" if url.startswith('/') else url
+
+
+def srcset(manifest, base_url=''):
+    """
+    {'avif': 'u 320w, u 640w', 'webp': ..., 'jpeg': ..., 'width': w, 'height': h}
+    for <picture>/<img srcset>. `base_url` is prepended (scheme://host) to
+    site-relative URLs when the consumer needs absolute ones.
+    """
+    if not manifest or not manifest.get('variants'):
+        return None
+    by_format = {}
+    for v in sorted(manifest['variants'], key=lambda v: v['width']):
+        by_format.setdefault(v['format'], []).append(f"{variant_url(v, base_url)} {v['width']}w")
+    result = {fmt: ', '.join(entries) for fmt, entries in by_format.items()}
+    result['width'] = manifest.get('width')
+    result['height'] = manifest.get('height')
+    return result
+
+
+def base_url_for(url):
+    """scheme://host prefix of an absolute URL ('' for site-relative URLs)."""
+    if url and url.startswith('http'):
+        idx = url.find('/static/')
+        if idx > 0:
+            return url[:idx]
+    return ''
@@ -0,0 +1,147 @@
+"""
+Storefront inventory search: one page of results plus facet counts in a
+single statement.
+
+Facets are disjunctive. Each facet's counts apply every filter except its
+own, so picking "Toro" still shows how many units every other manufacturer
+has. The filtered rows are scanned once. GROUPING SETS produces the
+manufacturer / type / condition counts plus the price and year bounds, and
+Postgres assembles the whole response as one JSON value. The base scan
+matches the ix_unit_storefront covering index.
+"""
+import re
+from sqlalchemy import text
+from app.core.extensions import db
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 96
+MAX_TERMS = 6
+
+SORTS = {
+    'price': 'u.price',
+    'year': 'u.year',
+    'manufacturer': 'u.manufacturer',
+    'type': 'u.type',
+    'id': 'u.id',
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _like(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search_inventory(org_id, q=None, manufacturers=(), types=(), conditions=(),
+                     min_price=None, max_price=None, min_year=None, max_year=None,
+                     sort='id', order='desc', page=1, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Returns {'results': [...], 'total': n, 'facets': {...}} for a tenant's
+    web-visible inventory. List filters match any of their values.
+    """
+    params = {'org_id': org_id}
+
+    # Free text: every term must match one of the public fields. (The unified
+    # search index also covers owner details, which the storefront must not match on.)
+    text_clauses = []
+    for i, term in enumerate(_TERM_RE.findall(q or '')[:MAX_TERMS]):
+        params[f"t{i}"] = _like(term)
+        text_clauses.append(
+            f"(u.manufacturer ILIKE :t{i} OR u.model_number ILIKE :t{i} OR u.type ILIKE :t{i} "
+            f"OR u.description ILIKE :t{i} OR CAST(u.year AS TEXT) ILIKE :t{i})"
+        )
+
+    def any_of(column, name, values):
+        if not values:
+            return 'TRUE'
+        params[name] = list(values)
+        return f"{column} = ANY(CAST(:{name} AS TEXT[]))"
+
+    def between(column, name, low, high):
+        clauses = []
+        if low is not None:
+            params[f"{name}_min"] = low
+            clauses.append(f"{column} >= :{name}_min")
+        if high is not None:
+            params[f"{name}_max"] = high
+            clauses.append(f"{column} <= :{name}_max")
+        return ' AND '.join(clauses) or 'TRUE'
+
+    m_ok = any_of('u.manufacturer', 'manufacturers', manufacturers)
+    t_ok = any_of('u.type', 'types', types)
+    c_ok = any_of("COALESCE(u.condition, 'New')", 'conditions', conditions)
+    p_ok = between('u.price', 'price', min_price, max_price)
+    y_ok = between('u.year', 'year', min_year, max_year)
+
+    direction = 'ASC' if order == 'asc' else 'DESC'
+    order_by = f"{SORTS.get(sort, 'u.id')} {direction} NULLS LAST, u.id DESC"
+
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    params['limit'] = per_page
+    params['offset'] = (max(page, 1) - 1) * per_page
+
+    sql = f"""
+        WITH base AS (
+            SELECT u.id, u.manufacturer AS mfr, u.type AS utype,
+                   COALESCE(u.condition, 'New') AS cond, u.price, u.year,
+                   ({m_ok}) AS m_ok, ({t_ok}) AS t_ok, ({c_ok}) AS c_ok,
+                   ({p_ok}) AS p_ok, ({y_ok}) AS y_ok
+            FROM unit u
+            WHERE u.organization_id = :org_id
+            AND u.is_inventory IS TRUE
+            AND u.display_on_web IS TRUE
+            {''.join(' AND ' + clause for clause in text_clauses)}
+        ),
+        facets AS (
+            SELECT
+                CASE WHEN GROUPING(mfr) = 0 THEN 'manufacturer'
+                     WHEN GROUPING(utype) = 0 THEN 'type'
+                     WHEN GROUPING(cond) = 0 THEN 'condition'
+                     ELSE 'all' END AS facet,
+                COALESCE(mfr, utype, cond) AS value,
+                CASE WHEN GROUPING(mfr) = 0 THEN count(*) FILTER (WHERE t_ok AND c_ok AND p_ok AND y_ok)
+                     WHEN GROUPING(utype) = 0 THEN count(*) FILTER (WHERE m_ok AND c_ok AND p_ok AND y_ok)
+                     WHEN GROUPING(cond) = 0 THEN count(*) FILTER (WHERE m_ok AND t_ok AND p_ok AND y_ok)
+                     ELSE count(*) FILTER (WHERE m_ok AND t_ok AND c_ok AND p_ok AND y_ok) END AS count,
+                min(price) FILTER (WHERE m_ok AND t_ok AND c_ok AND price > 0) AS price_min,
+                max(price) FILTER (WHERE m_ok AND t_ok AND c_ok) AS price_max,
+                min(year) FILTER (WHERE m_ok AND t_ok AND c_ok) AS year_min,
+                max(year) FILTER (WHERE m_ok AND t_ok AND c_ok) AS year_max
+            FROM base
+            GROUP BY GROUPING SETS ((mfr), (utype), (cond), ())
+        ),
+        page AS (
+            SELECT row_number() OVER (ORDER BY {order_by}) AS rn,
+                   u.id, u.manufacturer, u.model_number, u.type, u.price, u.status,
+                   u.description, u.condition, u.year, img.image_url, img.variants
+            FROM base b
+            JOIN unit u ON u.id = b.id
+            LEFT JOIN LATERAL (
+                SELECT image_url, variants FROM unit_image
+                WHERE unit_image.unit_id = u.id
+                ORDER BY is_primary DESC NULLS LAST, id
+                LIMIT 1
+            ) img ON TRUE
+            WHERE b.m_ok AND b.t_ok AND b.c_ok AND b.p_ok AND b.y_ok
+            ORDER BY {order_by}
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT (SELECT json_agg(f) FROM facets f) AS facets,
+               (SELECT json_agg(p ORDER BY p.rn) FROM page p) AS results
+    """
+    facet_rows, results = db.session.execute(text(sql), params).one()
+
+    facets = {'manufacturers': [], 'types': [], 'conditions': [],
+              'price': {'min': None, 'max': None}, 'year': {'min': None, 'max': None}}
+    total = 0
+    for row in facet_rows or []:
+        if row['facet'] == 'all':
+            total = row['count']
+            facets['price'] = {'min': row['price_min'], 'max': row['price_max']}
+            facets['year'] = {'min': row['year_min'], 'max': row['year_max']}
+        elif row['value'] is not None and row['count']:
+            facets[row['facet'] + 's'].append({'value': row['value'], 'count': row['count']})
+    for key in ('manufacturers', 'types', 'conditions'):
+        facets[key].sort(key=lambda item: (-item['count'], item['value'].lower()))
+
+    return {'results': results or [], 'total': total, 'facets': facets}
@@ -0,0 +1,298 @@
+"""
+Serving of uploaded media (static/uploads).
+
+In production the response is handed to nginx with X-Accel-Redirect, so video
+bytes never pass through a gevent worker: Flask only resolves the file,
+answers conditional requests and sets the caching headers. Without nginx
+(MEDIA_ACCEL_REDIRECT_PREFIX unset) Flask serves the file itself, with single
+and multi-range (multipart/byteranges) support.
+
+ETags are strong and content based: content-addressed files use the sha256 in
+their path, everything else is hashed once and cached (in an xattr when the
+filesystem supports it, otherwise in process).
+"""
+import os
+import re
+import uuid
+import mimetypes
+from collections import OrderedDict
+from urllib.parse import quote
+from flask import current_app, request, abort, Response
+from werkzeug.http import http_date, parse_date, parse_range_header, quote_etag, unquote_etag
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+UPLOADS_URL_PREFIX = '/static/uploads'
+READ_BUFFER_SIZE = 256 * 1024
+MAX_RANGES = 16  # More (after coalescing) and the whole file is sent instead
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_MAX_AGE = 24 * 3600
+ETAG_XATTR = 'user.pes.sha256'
+
+_SHA256_RE = re.compile(r'[0-9a-f]{64}')
+_etag_cache = OrderedDict()
+_ETAG_CACHE_SIZE = 4096
+
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+
+def uploads_root():
+    from app.core.storage import get_storage
+    return getattr(get_storage(), 'root', None) or os.path.join(current_app.root_path, 'static', 'uploads')
+
+
+def _content_hash_from_path(relative_path):
+    """
+    (sha256, path below it) for content-addressed paths such as
+    media/<org>/<sha>.mp4 or variants/<org>/<sha>/640.webp; (None, None) otherwise.
+    """
+    parts = relative_path.split('/')
+    for i in range(len(parts) - 1, -1, -1):
+        stem = parts[i].split('.')[0]
+        if _SHA256_RE.fullmatch(stem):
+            return stem, '/'.join(parts[i + 1:])
+    return None, None
+
+
+def _hash_file(path):
+    from app.modules.marketing.media_store import sha256_file
+    try:
+        # Keep the hub responsive: hashlib releases the GIL on large buffers
+        import gevent
+        return gevent.get_hub().threadpool.apply(sha256_file, (path,))
+    except ImportError:
+        return sha256_file(path)
+
+
+def content_etag(path, relative_path, stat):
+    """Strong ETag value for a file (sha256, truncated for header size)."""
+    embedded, derived = _content_hash_from_path(relative_path)
+    if embedded:
+        # Renditions/variants are named after their source hash, so qualify it with their own path
+        return f"{embedded[:24]}-{derived}" if derived else embedded[:32]
+
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    cached = _etag_cache.get(key)
+    if cached:
+        _etag_cache.move_to_end(key)
+        return cached
+
+    digest = None
+    try:
+        stored = os.getxattr(path, ETAG_XATTR).decode()
+        stored_mtime, stored_digest = stored.split(':', 1)
+        if int(stored_mtime) == stat.st_mtime_ns:
+            digest = stored_digest
+    except (OSError, AttributeError, ValueError):
+        pass
+
+    if not digest:
+        digest = _hash_file(path)
+        try:
+            os.setxattr(path, ETAG_XATTR, f"{stat.st_mtime_ns}:{digest}".encode())
+        except (OSError, AttributeError):
+            pass
+
+    _etag_cache[key] = digest[:32]
+    if len(_etag_cache) > _ETAG_CACHE_SIZE:
+        _etag_cache.popitem(last=False)
+    return digest[:32]
+
+
+def cache_control_for(relative_path):
+    if _content_hash_from_path(relative_path)[0]:
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={DEFAULT_MAX_AGE}"
+
+
+def _etag_matches(header_value, etag, weak=False):
+    """Compares an If-Match / If-None-Match / If-Range value with our ETag."""
+    if not header_value:
+        return False
+    if header_value.strip() == '*':
+        return True
+    for candidate in header_value.split(','):
+        value, is_weak = unquote_etag(candidate.strip())
+        if value == etag and (weak or not is_weak):
+            return True
+    return False
+
+
+def _not_modified_since(header_value, mtime):
+    since = parse_date(header_value) if header_value else None
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def evaluate_preconditions(etag, mtime):
+    """
+    RFC 9110 precondition order. Returns a status code (304/412) to answer
+    with, or None to serve the representation.
+    """
+    if_match = request.headers.get('If-Match')
+    if if_match and not _etag_matches(if_match, etag):
+        return 412
+    if not if_match:
+        unmodified_since = request.headers.get('If-Unmodified-Since')
+        if unmodified_since and not _not_modified_since(unmodified_since, mtime):
+            return 412
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        if _etag_matches(if_none_match, etag, weak=True):
+            return 304 if request.method in ('GET', 'HEAD') else 412
+    elif request.method in ('GET', 'HEAD') and _not_modified_since(request.headers.get('If-Modified-Since'), mtime):
+        return 304
+    return None
+
+
+def _range_applies(etag, mtime):
+    """If-Range: only honour Range when the client's copy is still current."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.strip().startswith(('"', 'W/')):
+        return _etag_matches(if_range, etag)
+    date = parse_date(if_range)
+    return date is not None and int(mtime) == int(date.timestamp())
+
+
+def resolve_ranges(header_value, length):
+    """
+    Parses a Range header into sorted, coalesced (start, stop) pairs.
+    Returns None when there is no usable Range header, [] when unsatisfiable.
+    """
+    parsed = parse_range_header(header_value)
+    if parsed is None or parsed.units != 'bytes':
+        return None
+
+    ranges = []
+    for start, stop in parsed.ranges:
+        if start < 0:  # Suffix range: last N bytes
+            start, stop = max(length + start, 0), length
+        else:
+            stop = length if stop is None else min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+
+    ranges.sort()
+    coalesced = []
+    for start, stop in ranges:
+        if coalesced and start <= coalesced[-1][1]:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], stop))
+        else:
+            coalesced.append((start, stop))
+    return coalesced
+
+
+def _read_range(f, start, stop):
+    remaining = stop - start
+    while remaining > 0:
+        buf = os.pread(f.fileno(), min(READ_BUFFER_SIZE, remaining), start)
+        if not buf:
+            break
+        start += len(buf)
+        remaining -= len(buf)
+        yield buf
+
+
+def _send_single_range(path, start, stop, length, headers, mimetype):
+    f = open(path, 'rb')
+    f.seek(start)
+    if stop == length:
+        # Open-ended range (the common video case): the file wrapper lets the
+        # WSGI server use sendfile from the current offset
+        body = wrap_file(request.environ, f, READ_BUFFER_SIZE)
+    else:
+        body = _read_range(f, start, stop)
+    response = Response(body, status=206, mimetype=mimetype, headers=headers, direct_passthrough=True)
+    response.call_on_close(f.close)
+    response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{length}"
+    response.content_length = stop - start
+    return response
+
+
+def _send_multiple_ranges(path, ranges, length, headers, mimetype):
+    boundary = uuid.uuid4().hex
+    parts = [(
+        f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+        f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n"
+    ).encode() for start, stop in ranges]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+
+    f = open(path, 'rb')
+
+    def generate():
+        for part_header, (start, stop) in zip(parts, ranges):
+            yield part_header
+            yield from _read_range(f, start, stop)
+        yield closing
+
+    response = Response(generate(), status=206, headers=headers, direct_passthrough=True,
+                        content_type=f"multipart/byteranges; boundary={boundary}")
+    response.call_on_close(f.close)
+    response.content_length = sum(len(p) for p in parts) + sum(b - a for a, b in ranges) + len(closing)
+    return response
+
+
+def send_media(filename):
+    """Serves static/uploads/<filename> with validators, ranges and X-Accel-Redirect."""
+    relative_path = filename
+    if any(part.startswith('.') for part in relative_path.split('/')) or relative_path.endswith('.tmp'):
+        abort(404)  # In-progress uploads and temp files
+    path = safe_join(uploads_root(), relative_path)
+    if not path:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    etag = content_etag(path, relative_path, stat)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    headers = {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(int(stat.st_mtime)),
+        'Cache-Control': cache_control_for(relative_path),
+        'Accept-Ranges': 'bytes',
+    }
+
+    status = evaluate_preconditions(etag, stat.st_mtime)
+    if status:
+        return Response(status=status, headers=headers)
+
+    accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        # nginx serves the bytes (and Range) from its internal location
+        response = Response(status=200, mimetype=mimetype, headers=headers)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative_path)}"
+        return response
+
+    length = stat.st_size
+    range_header = request.headers.get('Range')
+    ranges = resolve_ranges(range_header, length) if range_header and _range_applies(etag, stat.st_mtime) else None
+
+    if ranges == []:
+        response = Response(status=416, headers=headers)
+        response.headers['Content-Range'] = f"bytes */{length}"
+        return response
+    if ranges and len(ranges) == 1:
+        return _send_single_range(path, ranges[0][0], ranges[0][1], length, headers, mimetype)
+    if ranges and len(ranges) <= MAX_RANGES:
+        return _send_multiple_ranges(path, ranges, length, headers, mimetype)
+
+    f = open(path, 'rb')
+    response = Response(wrap_file(request.environ, f, READ_BUFFER_SIZE), mimetype=mimetype,
+                        headers=headers, direct_passthrough=True)
+    response.call_on_close(f.close)
+    response.content_length = length
+    return response
+
+
+def register_media_routes(app):
+    """Routes /static/uploads/... through send_media (ahead of Flask's generic static route)."""
+    app.add_url_rule(f"{UPLOADS_URL_PREFIX}/<path:filename>", 'media_file', send_media, methods=['GET', 'HEAD'])
@@ -0,0 +1,271 @@
+"""
+Cached counters for the dashboards.
+
+The SaaS command center (tenant totals, offline bridges) and the dealer
+dashboard (parts / web units per tenant) read these from Redis instead of
+running COUNT queries per page view:
+
+- Writes bump the counters after the transaction commits (session events
+  registered by register_metrics_handlers).
+- A beat task recomputes everything periodically, fixing drift from bulk
+  updates that bypass the ORM.
+- A cold key is computed once on demand and then cached.
+"""
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, orm, func, inspect
+from app.core.cache import get_redis
+from app.core import heartbeats
+
+TENANTS_TOTAL_KEY = 'metrics:tenants:total'
+TENANTS_ACTIVE_KEY = 'metrics:tenants:active'
+OFFLINE_BRIDGES_KEY = 'metrics:bridges:offline'  # JSON {'count', 'tenants': [...], 'refreshed_at'}
+ORG_KEY = 'metrics:org:{org_id}'  # Hash: parts, units_web
+
+BRIDGE_OFFLINE_AFTER = timedelta(hours=1)
+OFFLINE_LIST_LIMIT = 50  # The alert table shows the longest-silent tenants; the card shows the full count
+
+# Only bump counters that already exist; missing ones are rebuilt on demand / by the refresh task
+_INCR_IF_EXISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incrby', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+_HINCR_IF_EXISTS = """
+if redis.call('hexists', KEYS[1], ARGV[1]) == 1 then
+    return redis.call('hincrby', KEYS[1], ARGV[1], ARGV[2])
+end
+return nil
+"""
+
+
+def org_key(org_id):
+    return ORG_KEY.format(org_id=org_id)
+
+
+# -- Reads ---------------------------------------------------------------
+
+def get_platform_metrics():
+    """
+    {'total_dealers', 'active_dealers', 'offline_count', 'offline_bridges': [...]}
+    for the command center. Three keys in one round trip.
+    """
+    try:
+        total, active, offline = get_redis().mget(TENANTS_TOTAL_KEY, TENANTS_ACTIVE_KEY, OFFLINE_BRIDGES_KEY)
+    except Exception as e:
+        current_app.logger.warning(f"Metrics cache unavailable: {e}")
+        total = active = offline = None
+
+    if total is None or active is None or offline is None:
+        return refresh_platform_metrics()
+
+    offline = json.loads(offline)
+    return {
+        'total_dealers': int(total),
+        'active_dealers': int(active),
+        'offline_count': offline['count'],
+        'offline_bridges': offline['tenants'],
+    }
+
+
+def get_org_metrics(org_id):
+    """{'parts': n, 'units_web': n} for one tenant's dashboard."""
+    try:
+        parts, units_web = get_redis().hmget(org_key(org_id), 'parts', 'units_web')
+    except Exception as e:
+        current_app.logger.warning(f"Metrics cache unavailable: {e}")
+        parts = units_web = None
+
+    if parts is None or units_web is None:
+        return refresh_org_metrics([org_id]).get(org_id, {'parts': 0, 'units_web': 0})
+    return {'parts': int(parts), 'units_web': int(units_web)}
+
+
+# -- Recomputation -------------------------------------------------------
+
+def refresh_platform_metrics():
+    """Recomputes the command-center counters from the database and caches them."""
+    from app.core.extensions import db
+    from app.core.models import Organization
+
+    total, active = db.session.query(
+        func.count(Organization.id),
+        func.count(Organization.id).filter(Organization.is_active.is_(True))
+    ).one()
+
+    offline_filter = [
+        Organization.id != 1,  # Ignore Master
+        Organization.is_active.is_(True),
+    ]
+    online_ids = heartbeats.online_org_ids()
+    if online_ids is not None:
+        # Presence lives in Redis; the column is only flushed periodically
+        if online_ids:
+            offline_filter.append(Organization.id.notin_(online_ids))
+    else:
+        cutoff = datetime.utcnow() - BRIDGE_OFFLINE_AFTER
+        offline_filter.append(
+            (Organization.last_bridge_heartbeat < cutoff) | (Organization.last_bridge_heartbeat.is_(None)))
+    offline_count = db.session.query(func.count(Organization.id)).filter(*offline_filter).scalar()
+    offline_orgs = db.session.query(
+        Organization.id, Organization.name, Organization.last_bridge_heartbeat
+    ).filter(*offline_filter).order_by(
+        Organization.last_bridge_heartbeat.asc().nullsfirst(), Organization.id
+    ).limit(OFFLINE_LIST_LIMIT).all()
+
+    offline_tenants = [{
+        'id': org_id,
+        'name': name,
+        'last_bridge_heartbeat': heartbeat.isoformat() if heartbeat else None,
+    } for org_id, name, heartbeat in offline_orgs]
+
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.set(TENANTS_TOTAL_KEY, total)
+        pipe.set(TENANTS_ACTIVE_KEY, active)
+        pipe.set(OFFLINE_BRIDGES_KEY, json.dumps({
+            'count': offline_count,
+            'tenants': offline_tenants,
+            'refreshed_at': datetime.utcnow().isoformat(),
+        }))
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Could not cache platform metrics: {e}")
+
+    return {
+        'total_dealers': total,
+        'active_dealers': active,
+        'offline_count': offline_count,
+        'offline_bridges': offline_tenants,
+    }
+
+
+def refresh_org_metrics(org_ids=None):
+    """
+    Recomputes per-tenant counters with one GROUP BY per table (all tenants
+    when org_ids is None) and caches them. Returns {org_id: counters}.
+    """
+    from app.core.extensions import db
+    from app.core.models import Organization, PartInventory, Unit
+
+    parts_q = db.session.query(PartInventory.organization_id, func.count(PartInventory.id)).group_by(PartInventory.organization_id)
+    units_q = db.session.query(Unit.organization_id, func.count(Unit.id)).filter(
+        Unit.display_on_web.is_(True)).group_by(Unit.organization_id)
+    if org_ids is not None:
+        parts_q = parts_q.filter(PartInventory.organization_id.in_(org_ids))
+        units_q = units_q.filter(Unit.organization_id.in_(org_ids))
+    else:
+        org_ids = [org_id for (org_id,) in db.session.query(Organization.id)]
+
+    parts = dict(parts_q.all())
+    units = dict(units_q.all())
+    counters = {org_id: {'parts': parts.get(org_id, 0), 'units_web': units.get(org_id, 0)} for org_id in org_ids}
+
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for org_id, values in counters.items():
+            pipe.hset(org_key(org_id), mapping=values)
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Could not cache tenant metrics: {e}")
+    return counters
+
+
+# -- Write-through -------------------------------------------------------
+
+def apply_deltas(platform, per_org, removed_orgs=()):
+    """
+    platform: {redis key: delta}; per_org: {(org_id, field): delta}.
+    Only counters already cached are bumped.
+    """
+    r = get_redis()
+    incr = r.register_script(_INCR_IF_EXISTS)
+    hincr = r.register_script(_HINCR_IF_EXISTS)
+    pipe = r.pipeline(transaction=False)
+    for key, delta in platform.items():
+        if delta:
+            incr(keys=[key], args=[delta], client=pipe)
+    for (org_id, field), delta in per_org.items():
+        if delta:
+            hincr(keys=[org_key(org_id)], args=[field, delta], client=pipe)
+    for org_id in removed_orgs:
+        pipe.delete(org_key(org_id))
+    pipe.execute()
+
+
+def _changed(obj, attr):
+    """(old, new) for an attribute changed in this flush, else None."""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def register_metrics_handlers(app):
+    from app.core.models import Organization, PartInventory, Unit
+
+    @event.listens_for(orm.Session, "after_flush")
+    def _collect_metric_deltas(session, flush_context):
+        """Accumulates counter changes; they are only applied once the transaction commits."""
+        platform, per_org, removed = {}, {}, set()
+
+        def bump(counters, key, delta):
+            counters[key] = counters.get(key, 0) + delta
+
+        for obj in session.new:
+            if isinstance(obj, Organization):
+                bump(platform, TENANTS_TOTAL_KEY, 1)
+                if obj.is_active:
+                    bump(platform, TENANTS_ACTIVE_KEY, 1)
+            elif isinstance(obj, PartInventory):
+                bump(per_org, (obj.organization_id, 'parts'), 1)
+            elif isinstance(obj, Unit) and obj.display_on_web:
+                bump(per_org, (obj.organization_id, 'units_web'), 1)
+
+        for obj in session.deleted:
+            if isinstance(obj, Organization):
+                bump(platform, TENANTS_TOTAL_KEY, -1)
+                if obj.is_active:
+                    bump(platform, TENANTS_ACTIVE_KEY, -1)
+                removed.add(obj.id)
+            elif isinstance(obj, PartInventory):
+                bump(per_org, (obj.organization_id, 'parts'), -1)
+            elif isinstance(obj, Unit) and obj.display_on_web:
+                bump(per_org, (obj.organization_id, 'units_web'), -1)
+
+        for obj in session.dirty:
+            if isinstance(obj, Organization):
+                change = _changed(obj, 'is_active')
+                if change and bool(change[0]) != bool(change[1]):
+                    bump(platform, TENANTS_ACTIVE_KEY, 1 if change[1] else -1)
+            elif isinstance(obj, Unit):
+                change = _changed(obj, 'display_on_web')
+                if change and bool(change[0]) != bool(change[1]):
+                    bump(per_org, (obj.organization_id, 'units_web'), 1 if change[1] else -1)
+
+        if platform or per_org or removed:
+            pending_platform, pending_org, pending_removed = session.info.setdefault('metric_deltas', ({}, {}, set()))
+            for key, delta in platform.items():
+                bump(pending_platform, key, delta)
+            for key, delta in per_org.items():
+                bump(pending_org, key, delta)
+            pending_removed.update(removed)
+
+    @event.listens_for(orm.Session, "after_commit")
+    def _apply_metric_deltas(session):
+        deltas = session.info.pop('metric_deltas', None)
+        if not deltas:
+            return
+        try:
+            apply_deltas(*deltas)
+        except Exception as e:
+            app.logger.warning(f"Metrics update failed (the refresh task will catch up): {str(e)}")
+
+    @event.listens_for(orm.Session, "after_rollback")
+    def _discard_metric_deltas(session):
+        session.info.pop('metric_deltas', None)
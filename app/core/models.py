@@ -1,8 +1,10 @@
 from datetime import datetime
 from flask_login import UserMixin
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from app.core.extensions import db
 import json
+import hashlib
 from decimal import Decimal
 
 class Organization(db.Model):
@@ -19,7 +21,12 @@ class Organization(db.Model):
     # Integrations
     ari_dealer_id = db.Column(db.String(50))
     pos_provider = db.Column(db.String(50), default='none')
-    pos_bridge_key = db.Column(db.String(100))
+    pos_bridge_key = db.Column(db.String(100))  # Legacy plaintext key; no longer stored (scripts/15 clears it)
+    # Bridges authenticate against the SHA-256 of the key (see app/core/bridge_auth.py).
+    # During a rotation the previous key stays valid until pos_bridge_key_prev_expires.
+    pos_bridge_key_hash = db.Column(db.String(64), unique=True, index=True)
+    pos_bridge_key_prev_hash = db.Column(db.String(64), unique=True, index=True)
+    pos_bridge_key_prev_expires = db.Column(db.DateTime, nullable=True)
     
     # Social Media
     # Social Media
@@ -41,6 +48,30 @@ class Organization(db.Model):
     
     users = db.relationship('User', backref='organization', lazy=True)
 
+    __table_args__ = (
+        # Offline-bridge scan in app/core/metrics.py
+        db.Index('ix_organization_active_heartbeat', 'is_active', 'last_bridge_heartbeat'),
+    )
+
+    @staticmethod
+    def hash_bridge_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def set_bridge_key(self, key, keep_previous_until=None):
+        """
+        Sets the POS bridge key. Only its lookup hash is stored, so the caller
+        shows the key once. With keep_previous_until the current key keeps
+        authenticating until then, so a bridge can switch over.
+        """
+        if keep_previous_until and self.pos_bridge_key_hash:
+            self.pos_bridge_key_prev_hash = self.pos_bridge_key_hash
+            self.pos_bridge_key_prev_expires = keep_previous_until
+        else:
+            self.pos_bridge_key_prev_hash = None
+            self.pos_bridge_key_prev_expires = None
+        self.pos_bridge_key = None  # Legacy plaintext column, cleared once a key is hashed
+        self.pos_bridge_key_hash = self.hash_bridge_key(key) if key else None
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -60,6 +91,8 @@ class User(UserMixin, db.Model):
     
     # Settings
     password_reset_required = db.Column(db.Boolean, default=False, nullable=False)
+    # Bumped on password / role changes so cached session identities are revalidated (app/core/identity.py)
+    credential_version = db.Column(db.Integer, default=1, nullable=False)
     receive_automated_reports = db.Column(db.Boolean, default=False, nullable=False)
     
     notifications = db.relationship('Notification', backref='recipient', lazy=True, cascade="all, delete-orphan")
@@ -89,6 +122,10 @@ class Dealer(db.Model):
     cases = db.relationship('Case', backref='dealer', lazy=True)
     dealer_notes = db.relationship('DealerNote', backref='dealer', cascade="all, delete-orphan", lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_dealer_org_name', 'organization_id', 'name'),
+    )
+
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -99,6 +136,10 @@ class Contact(db.Model):
     email = db.Column(db.String(100))
     phone = db.Column(db.String(50))
 
+    __table_args__ = (
+        db.Index('ix_contact_org_dealer', 'organization_id', 'dealer_id'),
+    )
+
 class DealerNote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -111,6 +152,10 @@ class DealerNote(db.Model):
     replies = db.relationship('DealerNote', backref=db.backref('parent', remote_side=[id]), lazy='dynamic', cascade="all, delete-orphan")
     notifications = db.relationship('Notification', backref='dealer_note', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_dealer_note_org_dealer_ts', 'organization_id', 'dealer_id', 'timestamp'),
+    )
+
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -154,17 +199,26 @@ class Unit(db.Model):
     description = db.Column(db.Text)
     is_inventory = db.Column(db.Boolean, default=False)
     
-    # __table_args__ = (
-    #     UniqueConstraint('serial_number', 'organization_id', name='_serial_org_uc'),
-    # )
+    __table_args__ = (
+        # UniqueConstraint('serial_number', 'organization_id', name='_serial_org_uc'),
+        # Storefront search / facets (app/core/inventory_search.py): covers the base scan
+        db.Index('ix_unit_storefront', 'organization_id', 'is_inventory', 'display_on_web',
+                 'manufacturer', 'type', 'condition', 'price', 'year'),
+    )
 
 class UnitImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     unit_id = db.Column(db.Integer, db.ForeignKey('unit.id'), nullable=False)
     image_url = db.Column(db.String(500), nullable=False)
     is_primary = db.Column(db.Boolean, default=False)
+    variants = db.Column(db.JSON)  # Responsive variant manifest (see app/core/images.py)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Primary-image lookup per unit (storefront listings)
+        db.Index('ix_unit_image_unit_primary', 'unit_id', 'is_primary'),
+    )
+
 class Case(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -192,6 +246,10 @@ class Case(db.Model):
     parts_used = db.relationship('PartUsed', backref='case', lazy=True, cascade="all, delete-orphan")
     labor_entries = db.relationship('LaborEntry', backref='case', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_case_org_dealer_status', 'organization_id', 'dealer_id', 'status'),
+    )
+
     @property
     def total_parts_cost(self):
         if not self.parts_used:
@@ -233,6 +291,10 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_notification_recipient_read', 'recipient_id', 'is_read'),
+    )
+
 class Attachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -367,6 +429,12 @@ class FacebookPost(db.Model):
     facebook_post_id = db.Column(db.String(100))  # FB post ID if successful
     error_message = db.Column(db.Text)  # Error details if failed
 
+    # Resumable video upload progress (see FacebookService.upload_video)
+    upload_session_id = db.Column(db.String(100))
+    upload_video_id = db.Column(db.String(100))
+    upload_offset = db.Column(db.BigInteger, default=0)  # Bytes Facebook has acknowledged
+    upload_size = db.Column(db.BigInteger)
+
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -388,6 +456,12 @@ class MediaContent(db.Model):
     thumbnail_url = db.Column(db.String(500))  # Auto-generated from image or provided for video
     media_type = db.Column(db.String(20), default='image')  # 'image' or 'video'
     link_url = db.Column(db.String(500))  # Optional click-through URL
+    content_sha256 = db.Column(db.String(64))  # Hash of the stored file (content-addressed, deduped per tenant)
+
+    # Video renditions (filled in by the transcode task; media_url then points at the web MP4)
+    original_url = db.Column(db.String(500))  # As uploaded, kept as playback fallback
+    renditions = db.Column(db.JSON)  # {'mp4': url, 'hls': url, 'width', 'height', 'duration'}; images: {'variants': manifest}
+    transcode_status = db.Column(db.String(20))  # 'pending', 'processing', 'ready', 'failed', 'skipped'
 
     # Destination Flags
     post_to_facebook = db.Column(db.Boolean, default=False)
@@ -396,7 +470,7 @@ class MediaContent(db.Model):
 
     # Scheduling
     scheduled_post_time = db.Column(db.DateTime, nullable=True)  # NULL = post now
-    status = db.Column(db.String(50), default='draft')  # 'draft', 'scheduled', 'posted', 'failed'
+    status = db.Column(db.String(50), default='draft')  # 'draft', 'scheduled', 'publishing', 'posted', 'partial', 'failed'
 
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -406,6 +480,13 @@ class MediaContent(db.Model):
     organization = db.relationship('Organization', backref='media_content')
     scheduled_posts = db.relationship('ScheduledPost', backref='media_content', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_media_content_org_sha256', 'organization_id', 'content_sha256'),
+        # Due-post scan in process_scheduled_posts (index-only for the claim query)
+        db.Index('ix_media_content_status_scheduled', 'status', 'scheduled_post_time',
+                 postgresql_include=['organization_id']),
+    )
+
 
 class ScheduledPost(db.Model):
     """Tracks where and when media content has been posted"""
@@ -425,6 +506,12 @@ class ScheduledPost(db.Model):
     facebook_post_id = db.Column(db.String(100), nullable=True)  # Reference to FB post
     error_message = db.Column(db.Text, nullable=True)
 
+    # Resumable video upload progress (see FacebookService.upload_video)
+    upload_session_id = db.Column(db.String(100), nullable=True)
+    upload_video_id = db.Column(db.String(100), nullable=True)
+    upload_offset = db.Column(db.BigInteger, default=0)  # Bytes Facebook has acknowledged
+    upload_size = db.Column(db.BigInteger, nullable=True)
+
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -432,6 +519,11 @@ class ScheduledPost(db.Model):
     # Relationships
     organization = db.relationship('Organization', backref='scheduled_posts')
 
+    __table_args__ = (
+        # One row per destination of a MediaContent (fan-out lookups, banner check in the ads API)
+        db.Index('ix_scheduled_post_media_destination', 'media_content_id', 'destination'),
+    )
+
 
 class Banner(db.Model):
     """Website banner management"""
@@ -455,3 +547,34 @@ class Banner(db.Model):
 
     # Relationships
     organization = db.relationship('Organization', backref='banners')
+
+class SearchDocument(db.Model):
+    """
+    One row per searchable record (case, unit, dealer, contact, part, bulletin).
+    Kept in sync by the after-flush hooks in app.core.search.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+
+    doc_type = db.Column(db.String(20), nullable=False) # case, unit, dealer, contact, part, bulletin
+    object_id = db.Column(db.Integer, nullable=False)
+    parent_id = db.Column(db.Integer, nullable=True) # e.g. dealer_id for contacts
+    title = db.Column(db.String(255), nullable=False, default='')
+    subtitle = db.Column(db.String(255))
+    body = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    search_vector = db.Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(subtitle, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(body, '')), 'C')",
+        persisted=True
+    ))
+
+    __table_args__ = (
+        UniqueConstraint('doc_type', 'object_id', name='_search_doc_type_object_uc'),
+        # btree_gin lets the tenant filter and the text match share one index scan
+        db.Index('ix_search_document_org_vector', 'organization_id', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_search_document_org_title_trgm', 'organization_id', 'title', postgresql_using='gin',
+                 postgresql_ops={'title': 'gin_trgm_ops'}),
+    )
@@ -0,0 +1,57 @@
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+
+def load_note_threads(model, owner_filter, page=1, per_page=20):
+    """
+    Loads a page of top-level note threads plus every reply beneath them.
+
+    Works for any self-referential note model with `parent_id` / `timestamp`
+    columns (Note, DealerNote). Top-level notes are paginated newest first;
+    all descendants of the page's roots come back in one recursive CTE query,
+    so a page costs the same number of queries no matter how deep or long the
+    conversation is.
+
+    Each returned root gets a `thread_replies` list (depth-first, oldest first)
+    and every reply gets a `thread_depth` (1 = direct reply).
+
+    Returns: (roots, pagination)
+    """
+    pagination = (model.query
+                  .filter(owner_filter, model.parent_id.is_(None))
+                  .order_by(model.timestamp.desc())
+                  .paginate(page=page, per_page=per_page, error_out=False))
+    roots = pagination.items
+
+    for root in roots:
+        root.thread_replies = []
+
+    if not roots:
+        return roots, pagination
+
+    # Walk the reply tree below this page's roots in a single statement
+    tree = (select(model.id)
+            .where(model.parent_id.in_([r.id for r in roots]))
+            .cte('note_tree', recursive=True))
+    child = aliased(model)
+    tree = tree.union_all(select(child.id).where(child.parent_id == tree.c.id))
+
+    descendants = (model.query
+                   .filter(model.id.in_(select(tree.c.id)))
+                   .order_by(model.timestamp.asc(), model.id.asc())
+                   .all())
+
+    children = {}
+    for note in descendants:
+        children.setdefault(note.parent_id, []).append(note)
+
+    # Flatten each thread depth-first so templates can render with one loop
+    for root in roots:
+        stack = [(reply, 1) for reply in reversed(children.get(root.id, []))]
+        while stack:
+            reply, depth = stack.pop()
+            reply.thread_depth = depth
+            root.thread_replies.append(reply)
+            stack.extend((c, depth + 1) for c in reversed(children.get(reply.id, [])))
+
+    return roots, pagination
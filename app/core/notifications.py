@@ -0,0 +1,80 @@
+import re
+from flask import current_app, g
+from app.core.cache import get_redis
+
+# @username tokens. Usernames may be e-mail addresses, so allow . @ + - inside.
+MENTION_RE = re.compile(r'(?<![\w.])@([\w.@+-]+)')
+
+UNREAD_KEY = 'notif:unread:{user_id}'
+
+# At most one reconcile job per user while a cold counter is being rebuilt
+RECONCILE_KEY = 'reconcile:{org_id}:{user_id}'
+RECONCILE_DEBOUNCE_SECONDS = 30
+
+# Only bump counters that already exist; missing ones are rebuilt by reconciliation
+_INCR_IF_EXISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incrby', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+def extract_mentions(text):
+    """Returns the unique @mentioned usernames in a note, in order of appearance."""
+    if not text:
+        return []
+    mentions = []
+    for match in MENTION_RE.finditer(text):
+        username = match.group(1).rstrip('.,;:!?')
+        if username and username not in mentions:
+            mentions.append(username)
+    return mentions
+
+def unread_key(user_id):
+    return UNREAD_KEY.format(user_id=user_id)
+
+def get_unread_count(user_id):
+    """
+    Unread badge count from Redis. Never touches the notification table:
+    on a cold key we schedule a reconcile and show 0 until it lands.
+    """
+    try:
+        r = get_redis()
+        value = r.get(unread_key(user_id))
+        if value is None:
+            # Every page load polls the badge; only the first miss enqueues a rebuild
+            debounce_key = RECONCILE_KEY.format(org_id=getattr(g, 'current_org_id', None), user_id=user_id)
+            if r.set(debounce_key, 1, nx=True, ex=RECONCILE_DEBOUNCE_SECONDS):
+                from app.tasks.notifications import reconcile_unread_counters
+                reconcile_unread_counters.delay([user_id])
+            return 0
+    except Exception as e:
+        current_app.logger.warning(f"Unread counter unavailable: {e}")
+        return 0
+    return max(int(value), 0)
+
+def incr_unread(user_ids, amount=1):
+    """
+    Bumps the unread counters of the given users (only keys already being tracked).
+    Returns {user_id: new count or None if the key is cold}.
+    """
+    r = get_redis()
+    script = r.register_script(_INCR_IF_EXISTS)
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        script(keys=[unread_key(user_id)], args=[amount], client=pipe)
+    return dict(zip(user_ids, pipe.execute()))
+
+def set_unread(user_id, count):
+    get_redis().set(unread_key(user_id), max(int(count), 0))
+
+def queue_mention_notifications(org_id, text, actor, message, **targets):
+    """
+    Parses @mentions once and hands the fan-out to Celery.
+    targets: case_id / note_id / dealer_note_id for the Notification rows.
+    """
+    mentions = [m for m in extract_mentions(text) if m != actor]
+    if not mentions:
+        return
+    from app.tasks.notifications import fan_out_notifications
+    fan_out_notifications.delay(org_id, mentions, message[:255], **targets)
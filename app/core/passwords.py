@@ -0,0 +1,93 @@
+"""
+Password hashing off the event loop.
+
+PBKDF2/scrypt take tens to hundreds of milliseconds of CPU. Under the gevent
+worker that would stall every other greenlet, so the work runs on a small
+native thread pool (hashlib releases the GIL while it hashes) and only the
+calling greenlet waits.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_pool = None
+_pool_lock = threading.Lock()
+_reference_hash = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = current_app.config.get('PASSWORD_HASH_THREADS', 4)
+                try:
+                    import gevent.monkey
+                    if gevent.monkey.is_module_patched('threading'):
+                        # gevent's pool uses real OS threads and yields to the hub while waiting
+                        from gevent.threadpool import ThreadPool
+                        _pool = ThreadPool(size)
+                except ImportError:
+                    pass
+                if _pool is None:
+                    _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='password-hash')
+    return _pool
+
+
+def _run(fn, *args):
+    pool = _get_pool()
+    if isinstance(pool, ThreadPoolExecutor):
+        return pool.submit(fn, *args).result()
+    return pool.apply(fn, args)
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD')
+
+
+def _generate(password):
+    method = _method()
+    return generate_password_hash(password, method=method) if method else generate_password_hash(password)
+
+
+def hash_password(password):
+    return _run(_generate, password)
+
+
+def _get_reference_hash():
+    """A hash with the current parameters: its prefix drives needs_rehash, and it is verified for unknown users."""
+    global _reference_hash
+    if _reference_hash is None:
+        _reference_hash = hash_password('not-a-real-password')
+    return _reference_hash
+
+
+def verify_password(pwhash, password):
+    """
+    Checks password against pwhash. With no stored hash (unknown user) a
+    reference hash is verified anyway, so the response time doesn't reveal
+    which usernames exist.
+    """
+    if not pwhash:
+        _run(check_password_hash, _get_reference_hash(), password or '')
+        return False
+    return _run(check_password_hash, pwhash, password or '')
+
+
+def needs_rehash(pwhash):
+    """True when pwhash was made with other parameters than the current ones (e.g. fewer PBKDF2 iterations)."""
+    return pwhash.split('$', 1)[0] != _get_reference_hash().split('$', 1)[0]
+
+
+def verify_and_upgrade(user, password):
+    """
+    Verifies a User's password. If it matches but the stored hash is outdated,
+    the hash is replaced (the caller commits).
+    """
+    if not verify_password(user.password if user else None, password):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+        current_app.logger.info(f"Upgraded password hash for user {user.id}")
+    return True
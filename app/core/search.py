@@ -0,0 +1,242 @@
+"""
+Unified per-tenant search index.
+
+Every searchable record is mirrored into a single `search_document` row
+(title / subtitle / body plus a generated tsvector). The rows are kept in sync
+from a SQLAlchemy after-flush hook, so any ORM write to an indexed model updates
+the index inside the same transaction. Bulk statements that bypass the ORM are
+picked up by the `rebuild_search_index` task.
+"""
+import re
+from flask import current_app
+from sqlalchemy import event, orm, select, delete, func, literal, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.extensions import db
+from app.core.models import (
+    SearchDocument, Case, Unit, Dealer, Contact, PartInventory, ServiceBulletin
+)
+
+DOC_TYPES = {
+    Case: 'case',
+    Unit: 'unit',
+    Dealer: 'dealer',
+    Contact: 'contact',
+    PartInventory: 'part',
+    ServiceBulletin: 'bulletin',
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _join(*parts):
+    return ' '.join(str(p) for p in parts if p)
+
+
+def _clip(value, length=255):
+    return value[:length] if value else value
+
+
+def build_document(obj, dealer_names=None, units=None):
+    """
+    Returns the search document fields for a model instance. `dealer_names` and
+    `units` are prefetched lookups ({id: name}, {id: (serial, model)}) so cases
+    and contacts can be found by their dealer / unit without lazy loads.
+    """
+    dealer_names = dealer_names or {}
+    units = units or {}
+
+    if isinstance(obj, Case):
+        serial, model = units.get(obj.unit_id, (None, None))
+        title = f"Case #{obj.id}" + (f" - {obj.caller_name}" if obj.caller_name else '')
+        subtitle = _join(dealer_names.get(obj.dealer_id), obj.status)
+        body = _join(obj.id, obj.reference, obj.case_type, obj.assigned_to, obj.channel, serial, model)
+        parent_id = obj.dealer_id
+    elif isinstance(obj, Unit):
+        title = _join(obj.year, obj.manufacturer, obj.model_number) or obj.serial_number or f"Unit #{obj.id}"
+        subtitle = f"S/N {obj.serial_number}" if obj.serial_number else None
+        body = _join(obj.serial_number, obj.engine_model, obj.engine_serial, obj.owner_name,
+                     obj.owner_company, obj.owner_phone, obj.owner_email, obj.type, obj.description)
+        parent_id = None
+    elif isinstance(obj, Dealer):
+        title = obj.name
+        subtitle = obj.dealer_dba or obj.dealer_code
+        body = _join(obj.dealer_code, obj.address, obj.manufacturers)
+        parent_id = None
+    elif isinstance(obj, Contact):
+        title = obj.name or obj.email or f"Contact #{obj.id}"
+        subtitle = _join(obj.role, dealer_names.get(obj.dealer_id))
+        body = _join(obj.email, obj.phone)
+        parent_id = obj.dealer_id
+    elif isinstance(obj, PartInventory):
+        title = obj.part_number
+        subtitle = obj.manufacturer
+        body = _join(obj.description, obj.bin_location)
+        parent_id = None
+    elif isinstance(obj, ServiceBulletin):
+        title = _join(obj.sb_number, obj.title)
+        subtitle = obj.issue_date.strftime('%Y-%m-%d') if obj.issue_date else None
+        body = _join(obj.warranty_code, obj.description)
+        parent_id = None
+    else:
+        return None
+
+    return {
+        'organization_id': obj.organization_id,
+        'doc_type': DOC_TYPES[type(obj)],
+        'object_id': obj.id,
+        'parent_id': parent_id,
+        'title': _clip(title or ''),
+        'subtitle': _clip(subtitle),
+        'body': body,
+    }
+
+
+def _prefetch(connection, objs):
+    """Loads dealer names and unit serials referenced by cases/contacts in two queries."""
+    dealer_ids = {o.dealer_id for o in objs if isinstance(o, (Case, Contact)) and o.dealer_id}
+    unit_ids = {o.unit_id for o in objs if isinstance(o, Case) and o.unit_id}
+
+    dealer_names, units = {}, {}
+    if dealer_ids:
+        dealer_names = dict(connection.execute(
+            select(Dealer.id, Dealer.name).where(Dealer.id.in_(dealer_ids))
+        ).all())
+    if unit_ids:
+        units = {row.id: (row.serial_number, row.model_number) for row in connection.execute(
+            select(Unit.id, Unit.serial_number, Unit.model_number).where(Unit.id.in_(unit_ids))
+        )}
+    return dealer_names, units
+
+
+def upsert_documents(connection, objs):
+    """Writes search documents for the given model instances (one statement)."""
+    if not objs:
+        return
+    dealer_names, units = _prefetch(connection, objs)
+    rows = [doc for doc in (build_document(o, dealer_names, units) for o in objs) if doc]
+    if not rows:
+        return
+
+    stmt = pg_insert(SearchDocument.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['doc_type', 'object_id'],
+        set_={
+            'organization_id': stmt.excluded.organization_id,
+            'parent_id': stmt.excluded.parent_id,
+            'title': stmt.excluded.title,
+            'subtitle': stmt.excluded.subtitle,
+            'body': stmt.excluded.body,
+            'updated_at': func.now(),
+        }
+    )
+    connection.execute(stmt)
+
+
+def delete_documents(connection, doc_type, object_ids):
+    if not object_ids:
+        return
+    connection.execute(delete(SearchDocument.__table__).where(
+        SearchDocument.doc_type == doc_type,
+        SearchDocument.object_id.in_(object_ids)
+    ))
+
+
+def register_search_handlers(app):
+    @event.listens_for(orm.Session, "after_flush")
+    def _sync_search_index(session, flush_context):
+        """
+        Mirrors inserts/updates/deletes of indexed models into search_document
+        within the flushing transaction. Runs in a savepoint so an indexing
+        problem never blocks the business write.
+        """
+        changed = [o for o in session.new if type(o) in DOC_TYPES]
+        changed += [o for o in session.dirty
+                    if type(o) in DOC_TYPES and session.is_modified(o, include_collections=False)]
+
+        deleted = {}
+        for o in session.deleted:
+            if type(o) in DOC_TYPES:
+                deleted.setdefault(DOC_TYPES[type(o)], []).append(o.id)
+
+        if not changed and not deleted:
+            return
+
+        connection = session.connection()
+        try:
+            with connection.begin_nested():
+                upsert_documents(connection, changed)
+                for doc_type, ids in deleted.items():
+                    delete_documents(connection, doc_type, ids)
+        except Exception as e:
+            app.logger.error(f"Search index sync failed: {str(e)}")
+
+
+def build_tsquery(text):
+    """'john deer' -> 'john:* & deer:*' (prefix match on every term)."""
+    terms = _TERM_RE.findall(text.lower())
+    return ' & '.join(f"{t}:*" for t in terms)
+
+
+def search(org_id, text, doc_types=None, limit=20):
+    """
+    Ranked search across every indexed record of one tenant.
+
+    Full-text prefix matches are ranked by weighted ts_rank (title > subtitle >
+    body); trigram similarity on the title catches typos and partial serials.
+    Both predicates are served by the (organization_id, ...) GIN indexes.
+    """
+    text = (text or '').strip()
+    tsquery_text = build_tsquery(text)
+    if not tsquery_text:
+        return []
+
+    tsquery = func.to_tsquery('simple', tsquery_text)
+    rank = (func.ts_rank(SearchDocument.search_vector, tsquery)
+            + func.similarity(SearchDocument.title, text)).label('rank')
+
+    query = db.session.query(
+        SearchDocument.doc_type,
+        SearchDocument.object_id,
+        SearchDocument.parent_id,
+        SearchDocument.title,
+        SearchDocument.subtitle,
+        rank
+    ).filter(
+        SearchDocument.organization_id == org_id,
+        or_(
+            SearchDocument.search_vector.op('@@')(tsquery),
+            SearchDocument.title.op('%')(literal(text))
+        )
+    )
+    if doc_types:
+        query = query.filter(SearchDocument.doc_type.in_(doc_types))
+
+    return query.order_by(rank.desc(), SearchDocument.object_id.desc()).limit(limit).all()
+
+
+def rebuild_index(org_id=None, batch_size=500):
+    """Re-indexes every record (optionally for one tenant). Returns the row count."""
+    connection = db.session.connection()
+    total = 0
+    for model, doc_type in DOC_TYPES.items():
+        stale = delete(SearchDocument.__table__).where(SearchDocument.doc_type == doc_type)
+        if org_id:
+            stale = stale.where(SearchDocument.organization_id == org_id)
+        connection.execute(stale)
+
+        query = model.query.order_by(model.id)
+        if org_id:
+            query = query.filter(model.organization_id == org_id)
+        batch = []
+        for obj in query.yield_per(batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                upsert_documents(connection, batch)
+                total += len(batch)
+                batch = []
+        upsert_documents(connection, batch)
+        total += len(batch)
+
+    db.session.commit()
+    current_app.logger.info(f"Search index rebuilt: {total} documents")
+    return total
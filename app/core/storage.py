@@ -1,36 +1,480 @@
+"""
+Storage for tenant uploads.
+
+One interface, three backends selected by STORAGE_BACKEND:
+
+  local  files under app/static/uploads (default; served by media_serving)
+  s3     any S3-compatible store: AWS, MinIO (STORAGE_ENDPOINT_URL), R2...
+  gcs    Google Cloud Storage (honours STORAGE_EMULATOR_HOST for fake-gcs-server)
+
+Everything is addressed by a key such as ``inventory/<org_id>/<uuid>.jpg``.
+Keys always carry the tenant id right after the folder (see tenant_key), which
+keeps tenants isolated and matches the existing static/uploads layout, so
+local URLs are unchanged. Remote clients are created once per process and
+reuse pooled HTTP connections.
+"""
+import io
 import os
-from google.cloud import storage
-from flask import current_app, g
+import re
+import uuid
+import errno
+import shutil
+import tempfile
+import threading
+import mimetypes
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from flask import current_app, request
+from werkzeug.utils import secure_filename
+
+COPY_BUFFER_SIZE = 1024 * 1024
+SIGNED_URL_TTL = 3600
+
+_KEY_PART_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+class StorageError(Exception):
+    pass
+
+
+def tenant_key(org_id, folder, filename):
+    """'<folder>/<org_id>/<filename>'; refuses anything that could escape the tenant prefix."""
+    if not org_id:
+        raise StorageError("Security Error: Attempting to store a file without Tenant Context.")
+    filename = secure_filename(filename)
+    if not filename or not _KEY_PART_RE.match(folder):
+        raise StorageError(f"Invalid storage key component: {folder}/{filename}")
+    return f"{folder}/{int(org_id)}/{filename}"
+
+
+def unique_filename(original_name, default_ext=''):
+    ext = os.path.splitext(secure_filename(original_name or ''))[1].lower() or default_ext
+    return f"{uuid.uuid4().hex}{ext}"
+
+
+def _check_key(key):
+    parts = key.split('/')
+    if not key or any(not _KEY_PART_RE.match(p) for p in parts):
+        raise StorageError(f"Invalid storage key: {key}")
+    return key
+
+
+def _content_type(key, content_type=None):
+    return content_type or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+class StorageBackend(ABC):
+    name = None
+
+    def __init__(self, public_url):
+        self.public_url = public_url.rstrip('/')
+
+    # -- Implemented by each backend --------------------------------------
+    @abstractmethod
+    def put(self, key, fileobj, content_type=None):
+        pass
+
+    def put_file(self, key, local_path, content_type=None, move=False):
+        with open(local_path, 'rb') as f:
+            self.put(key, f, content_type)
+        if move:
+            os.remove(local_path)
+        return key
+
+    @abstractmethod
+    def open(self, key):
+        pass
+
+    @abstractmethod
+    def read_range(self, key, start, stop):
+        """Bytes [start, stop) of an object."""
+
+    @abstractmethod
+    def exists(self, key):
+        pass
+
+    @abstractmethod
+    def size(self, key):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def signed_url(self, key, expires_in=SIGNED_URL_TTL):
+        pass
+
+    # -- Shared behaviour -------------------------------------------------
+    def url(self, key):
+        return f"{self.public_url}/{key}"
+
+    def key_for_url(self, url):
+        """Inverse of url(): the key for a stored URL (absolute or relative), else None."""
+        if not url:
+            return None
+        url = url.split('?')[0]
+        prefix = self.public_url + '/'
+        if url.startswith(prefix):
+            return url[len(prefix):]
+        if prefix.startswith('/'):
+            idx = url.find(prefix)
+            if idx >= 0:
+                return url[idx + len(prefix):]
+        return None
+
+    def iter_chunks(self, key, chunk_size=COPY_BUFFER_SIZE):
+        with self.open(key) as f:
+            for buf in iter(lambda: f.read(chunk_size), b''):
+                yield buf
+
+    def read_bytes(self, key):
+        with self.open(key) as f:
+            return f.read()
+
+    def put_bytes(self, key, data, content_type=None):
+        return self.put(key, io.BytesIO(data), content_type)
+
+    @contextmanager
+    def local_copy(self, key):
+        """A local file path with the object's content (for ffmpeg, Pillow, PDF parsers)."""
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for buf in self.iter_chunks(key):
+                    out.write(buf)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    @contextmanager
+    def work_dir(self):
+        """Scratch directory for derived files that are then put_file(move=True)'d."""
+        path = tempfile.mkdtemp(prefix='pes-')
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def put_tree(self, prefix, local_dir):
+        """
+        Uploads every file below local_dir under `prefix/` (HLS playlists and
+        segments). Deeper files go first, so a top-level playlist only becomes
+        visible once everything it references is stored.
+        """
+        files = []
+        for dirpath, _, filenames in os.walk(local_dir):
+            for name in filenames:
+                relative = os.path.relpath(os.path.join(dirpath, name), local_dir).replace(os.sep, '/')
+                files.append(relative)
+        files.sort(key=lambda rel: (-rel.count('/'), rel))
+        return [self.put_file(f"{prefix}/{rel}", os.path.join(local_dir, rel), move=True) for rel in files]
+
+
+class LocalStorage(StorageBackend):
+    """Files on the web node's disk, served from /static/uploads."""
+    name = 'local'
+
+    def __init__(self, root, public_url='/static/uploads'):
+        super().__init__(public_url)
+        self.root = os.path.normpath(root)
+
+    def path(self, key):
+        path = os.path.normpath(os.path.join(self.root, _check_key(key)))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"Invalid storage key: {key}")
+        return path
+
+    def _staging_path(self, dest):
+        return os.path.join(os.path.dirname(dest), f".{uuid.uuid4().hex}.tmp")
+
+    def put(self, key, fileobj, content_type=None):
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = self._staging_path(dest)
+        try:
+            with open(tmp, 'wb') as out:
+                shutil.copyfileobj(fileobj, out, COPY_BUFFER_SIZE)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, dest)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return key
+
+    def put_file(self, key, local_path, content_type=None, move=False):
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if move:
+            try:
+                os.replace(local_path, dest)
+                os.chmod(dest, 0o644)
+                return key
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        # Different filesystem (or a copy was asked for): copy next to the destination, then rename
+        tmp = self._staging_path(dest)
+        shutil.copyfile(local_path, tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dest)
+        if move:
+            os.remove(local_path)
+        return key
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def read_range(self, key, start, stop):
+        with open(self.path(key), 'rb') as f:
+            return os.pread(f.fileno(), stop - start, start)
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
 
-def upload_for_tenant(file_storage, folder='uploads'):
+    def signed_url(self, key, expires_in=SIGNED_URL_TTL):
+        # Uploads on local disk are public static files
+        return self.url(key)
+
+    @contextmanager
+    def local_copy(self, key):
+        yield self.path(key)
+
+    @contextmanager
+    def work_dir(self):
+        # Inside the uploads root so put_file(move=True) is a rename
+        staging = os.path.join(self.root, '.staging')
+        os.makedirs(staging, exist_ok=True)
+        path = tempfile.mkdtemp(dir=staging)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage (AWS S3, MinIO, Cloudflare R2...)."""
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 public_url=None, max_pool_connections=32):
+        import boto3
+        from botocore.config import Config as BotoConfig
+
+        if not public_url:
+            public_url = f"{endpoint_url.rstrip('/')}/{bucket}" if endpoint_url else f"https://{bucket}.s3.amazonaws.com"
+        super().__init__(public_url)
+        self.bucket = bucket
+        # boto3 clients are thread-safe; one per process shares its connection pool
+        self.client = boto3.session.Session().client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=BotoConfig(
+                max_pool_connections=max_pool_connections,
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+                s3={'addressing_style': 'path' if endpoint_url else 'auto'},
+            ),
+        )
+
+    def put(self, key, fileobj, content_type=None):
+        # upload_fileobj streams (multipart above 8MB) instead of reading the file into memory
+        self.client.upload_fileobj(fileobj, self.bucket, _check_key(key),
+                                   ExtraArgs={'ContentType': _content_type(key, content_type)})
+        return key
+
+    def put_file(self, key, local_path, content_type=None, move=False):
+        self.client.upload_file(local_path, self.bucket, _check_key(key),
+                                ExtraArgs={'ContentType': _content_type(key, content_type)})
+        if move:
+            os.remove(local_path)
+        return key
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def iter_chunks(self, key, chunk_size=COPY_BUFFER_SIZE):
+        body = self.open(key)
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def read_range(self, key, start, stop):
+        obj = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{stop - 1}")
+        return obj['Body'].read()
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def size(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def signed_url(self, key, expires_in=SIGNED_URL_TTL):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=expires_in)
+
+
+class GCSStorage(StorageBackend):
+    """Google Cloud Storage."""
+    name = 'gcs'
+
+    def __init__(self, bucket, public_url=None, max_pool_connections=32):
+        from google.cloud import storage as gcs
+        from requests.adapters import HTTPAdapter
+
+        super().__init__(public_url or f"https://storage.googleapis.com/{bucket}")
+        if os.environ.get('STORAGE_EMULATOR_HOST'):
+            from google.auth.credentials import AnonymousCredentials
+            client = gcs.Client(project='local', credentials=AnonymousCredentials())
+        else:
+            client = gcs.Client()
+        # Widen the authorized session's connection pool for concurrent workers
+        adapter = HTTPAdapter(pool_connections=max_pool_connections, pool_maxsize=max_pool_connections)
+        client._http.mount('https://', adapter)
+        client._http.mount('http://', adapter)
+        self.client = client
+        self.bucket = client.bucket(bucket)
+
+    def put(self, key, fileobj, content_type=None):
+        self.bucket.blob(_check_key(key)).upload_from_file(fileobj, content_type=_content_type(key, content_type))
+        return key
+
+    def put_file(self, key, local_path, content_type=None, move=False):
+        self.bucket.blob(_check_key(key)).upload_from_filename(local_path, content_type=_content_type(key, content_type))
+        if move:
+            os.remove(local_path)
+        return key
+
+    def open(self, key):
+        return self.bucket.blob(key).open('rb', chunk_size=COPY_BUFFER_SIZE)
+
+    def read_range(self, key, start, stop):
+        return self.bucket.blob(key).download_as_bytes(start=start, end=stop - 1)
+
+    def exists(self, key):
+        return self.bucket.blob(key).exists()
+
+    def size(self, key):
+        blob = self.bucket.get_blob(key)
+        if blob is None:
+            raise FileNotFoundError(key)
+        return blob.size
+
+    def delete(self, key):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(key).delete()
+        except NotFound:
+            pass
+
+    def signed_url(self, key, expires_in=SIGNED_URL_TTL):
+        from datetime import timedelta
+        return self.bucket.blob(key).generate_signed_url(version='v4', expiration=timedelta(seconds=expires_in))
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def _build_backend(config, root_path):
+    backend = (config.get('STORAGE_BACKEND') or 'local').lower()
+    if backend == 'local':
+        return LocalStorage(config.get('STORAGE_LOCAL_ROOT') or os.path.join(root_path, 'static', 'uploads'))
+    if backend == 's3':
+        return S3Storage(
+            config['STORAGE_BUCKET'],
+            endpoint_url=config.get('STORAGE_ENDPOINT_URL'),
+            region=config.get('STORAGE_REGION'),
+            access_key=config.get('STORAGE_ACCESS_KEY'),
+            secret_key=config.get('STORAGE_SECRET_KEY'),
+            public_url=config.get('STORAGE_PUBLIC_URL'),
+            max_pool_connections=config.get('STORAGE_MAX_POOL_CONNECTIONS', 32),
+        )
+    if backend == 'gcs':
+        return GCSStorage(
+            config['STORAGE_BUCKET'],
+            public_url=config.get('STORAGE_PUBLIC_URL'),
+            max_pool_connections=config.get('STORAGE_MAX_POOL_CONNECTIONS', 32),
+        )
+    raise StorageError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage():
     """
-    Uploads a file to GCS with mandatory tenant isolation.
-    Path: gs://{bucket}/{organization_id}/{folder}/{filename}
+    The configured backend, created lazily once per process (after gunicorn /
+    Celery forks, so pooled connections are never shared between processes).
     """
-    if not g.get('current_org_id'):
-        raise ValueError("Security Error: Attempting to upload file without Tenant Context.")
-    
-    bucket_name = current_app.config['GCS_BUCKET']
-    if not bucket_name:
-        # Fallback for local dev if no bucket - maybe save to disk?
-        # For now, just logging warning or error. 
-        # Ideally, we mock this in dev.
-        return None
+    cache_key = (os.getpid(), current_app.import_name)
+    backend = _backends.get(cache_key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(cache_key)
+            if backend is None:
+                backend = _backends[cache_key] = _build_backend(current_app.config, current_app.root_path)
+    return backend
+
+
+def save_upload(file_storage, org_id, folder, filename=None):
+    """
+    Streams a werkzeug FileStorage into `<folder>/<org_id>/<filename>`
+    (a fresh uuid name by default). Returns the key.
+    """
+    key = tenant_key(org_id, folder, filename or unique_filename(file_storage.filename))
+    get_storage().put(key, file_storage.stream, file_storage.mimetype or None)
+    return key
+
+
+def url_for_key(key):
+    """Public URL for a key: site-relative for local storage, absolute for buckets/CDNs."""
+    return get_storage().url(key) if key else None
+
+
+def absolute_url(key, org=None):
+    """
+    Absolute URL for a key, for consumers outside the site (Facebook,
+    Instagram, emails). Local files are addressed via the dealer's subdomain.
+    """
+    url = url_for_key(key)
+    if url and url.startswith('/'):
+        if org is not None and org.slug:
+            return f"https://{org.slug}.bentcrankshaft.com{url}"
+        return f"{request.scheme}://{request.host}{url}"
+    return url
+
+
+def url_like(reference_url, key):
+    """URL for `key` on the same host as `reference_url` (used by background tasks)."""
+    url = url_for_key(key)
+    if url.startswith('/') and reference_url:
+        idx = reference_url.find('/static/')
+        if idx > 0:
+            return f"{reference_url[:idx]}{url}"
+    return url
+
 
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    
-    # Sanitize filename
-    from werkzeug.utils import secure_filename
-    filename = secure_filename(file_storage.filename)
-    
-    # Construct isolated path
-    blob_path = f"{g.current_org_id}/{folder}/{filename}"
-    blob = bucket.blob(blob_path)
-    
-    blob.upload_from_file(file_storage, content_type=file_storage.content_type)
-    
-    # Return signed URL or public URL depending on policy.
-    # For private assets, we usually generate signed URLs on retrieval.
-    # Here we return the storage path to save in DB.
-    return blob_path
+def key_for_url(url):
+    return get_storage().key_for_url(url)
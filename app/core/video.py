@@ -0,0 +1,199 @@
+"""
+ffmpeg helpers for promotion videos: probing, web-optimised MP4, HLS and
+thumbnails.
+
+Everything here works on local files; the media tasks fetch sources from and
+store outputs to app.core.storage.
+"""
+import os
+import json
+import shutil
+import subprocess
+from flask import current_app
+
+# (height, video bitrate, max bitrate, audio bitrate)
+HLS_LADDER = [
+    (1080, '5000k', '5350k', '128k'),
+    (720, '2800k', '3000k', '128k'),
+    (480, '1400k', '1500k', '96k'),
+    (360, '800k', '856k', '96k'),
+]
+HLS_SEGMENT_SECONDS = 4
+TRANSCODE_TIMEOUT = 60 * 60
+
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+THUMBNAIL_CANDIDATES = (0.1, 0.25, 0.5, 0.75)  # Fractions of the duration to try
+
+
+def ffmpeg_available():
+    return bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+
+def probe(path):
+    """Returns {'width', 'height', 'duration', 'has_audio'} via ffprobe."""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-print_format', 'json',
+        '-show_streams', '-show_format', path
+    ], capture_output=True, timeout=60, check=True)
+    info = json.loads(result.stdout or b'{}')
+
+    video = next((s for s in info.get('streams', []) if s.get('codec_type') == 'video'), None)
+    if not video:
+        raise ValueError(f"No video stream in {path}")
+
+    width, height = int(video.get('width', 0)), int(video.get('height', 0))
+    # Phone recordings are often stored landscape with a rotation tag
+    rotation = abs(int((video.get('tags') or {}).get('rotate', 0) or 0))
+    for side_data in video.get('side_data_list', []) or []:
+        rotation = abs(int(side_data.get('rotation', rotation) or 0))
+    if rotation in (90, 270):
+        width, height = height, width
+
+    return {
+        'width': width,
+        'height': height,
+        'duration': float(info.get('format', {}).get('duration') or video.get('duration') or 0),
+        'has_audio': any(s.get('codec_type') == 'audio' for s in info.get('streams', [])),
+    }
+
+
+def _run(cmd):
+    result = subprocess.run(cmd, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace')[-2000:]}")
+
+
+def transcode_web_mp4(src, dest, max_height=1080):
+    """
+    H.264 High / AAC MP4 with the moov atom moved to the front (faststart), so
+    playback can begin after the first few KB instead of the whole file.
+    """
+    tmp = f"{dest}.tmp.mp4"
+    _run([
+        'ffmpeg', '-y', '-v', 'error', '-i', src,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+        '-profile:v', 'high', '-pix_fmt', 'yuv420p',
+        '-vf', f"scale=-2:'min({max_height},ih)'",
+        '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
+        '-movflags', '+faststart',
+        tmp
+    ])
+    os.replace(tmp, dest)
+
+
+def build_hls(src, out_dir, source_height, has_audio=True):
+    """
+    Encodes an adaptive HLS ladder (only rungs at or below the source height)
+    in a single ffmpeg pass. Returns the master playlist path.
+    """
+    ladder = [r for r in HLS_LADDER if r[0] <= max(source_height, HLS_LADDER[-1][0])]
+    if not ladder:
+        ladder = HLS_LADDER[-1:]
+
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    split = f"[0:v]split={len(ladder)}" + ''.join(f"[v{i}]" for i in range(len(ladder)))
+    scales = [f"[v{i}]scale=-2:{h}[v{i}out]" for i, (h, _, _, _) in enumerate(ladder)]
+
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-i', src, '-filter_complex', ';'.join([split] + scales)]
+    stream_map = []
+    for i, (height, bitrate, maxrate, audio_bitrate) in enumerate(ladder):
+        cmd += [
+            '-map', f"[v{i}out]",
+            f"-c:v:{i}", 'libx264', f"-b:v:{i}", bitrate, f"-maxrate:v:{i}", maxrate,
+            f"-bufsize:v:{i}", maxrate, f"-profile:v:{i}", 'main',
+        ]
+        if has_audio:
+            cmd += ['-map', 'a:0', f"-c:a:{i}", 'aac', f"-b:a:{i}", audio_bitrate, '-ac', '2']
+            stream_map.append(f"v:{i},a:{i},name:{height}p")
+        else:
+            stream_map.append(f"v:{i},name:{height}p")
+
+    cmd += [
+        '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        # Keyframe on every segment boundary so renditions switch cleanly
+        '-force_key_frames', f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})", '-sc_threshold', '0',
+        '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(tmp_dir, '%v', 'seg_%03d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(tmp_dir, '%v', 'index.m3u8'),
+    ]
+    _run(cmd)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return os.path.join(out_dir, 'master.m3u8')
+
+
+def extract_frame(src, timestamp, dest, width=None):
+    """
+    Grabs one frame at `timestamp` seconds. `-ss` before `-i` makes ffmpeg seek
+    the demuxer to the nearest keyframe instead of decoding from the start, so
+    this costs the same for a 10 s clip and a 10 min recording.
+    """
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-ss', f"{max(timestamp, 0):.3f}", '-i', src, '-frames:v', '1']
+    if width:
+        cmd += ['-vf', f"scale='min({width},iw)':-2"]
+    cmd += ['-q:v', '3', dest]
+    subprocess.run(cmd, capture_output=True, timeout=60, check=True)
+    if not os.path.exists(dest) or os.path.getsize(dest) == 0:
+        raise RuntimeError(f"No frame extracted at {timestamp}s")
+    return dest
+
+
+def frame_score(path):
+    """
+    (is_usable, detail) for a frame: rejects black/blank frames (fade-ins,
+    lens caps) by mean brightness and flat frames by contrast.
+    """
+    from PIL import Image, ImageStat
+    with Image.open(path) as img:
+        stat = ImageStat.Stat(img.convert('L'))
+    brightness, contrast = stat.mean[0], stat.stddev[0]
+    return (brightness > 24 and contrast > 12), contrast
+
+
+def pick_thumbnail_time(src, duration, work_dir):
+    """
+    Samples small frames at a few points through the video and returns the
+    timestamp of the first non-black, non-flat one (else the most detailed).
+    """
+    if duration <= 0:
+        return 0
+    candidates = sorted({min(duration * f, max(duration - 0.5, 0)) for f in THUMBNAIL_CANDIDATES})
+    best_time, best_contrast = candidates[0], -1
+    for i, timestamp in enumerate(candidates):
+        probe_path = os.path.join(work_dir, f"probe_{i}.jpg")
+        try:
+            extract_frame(src, timestamp, probe_path, width=160)
+            usable, contrast = frame_score(probe_path)
+        except Exception as e:
+            current_app.logger.info(f"Thumbnail probe at {timestamp:.1f}s failed: {str(e)}")
+            continue
+        finally:
+            if os.path.exists(probe_path):
+                os.remove(probe_path)
+        if usable:
+            return timestamp
+        if contrast > best_contrast:
+            best_time, best_contrast = timestamp, contrast
+    return best_time
+
+
+def build_thumbnails(src, out_dir, duration, widths=THUMBNAIL_WIDTHS):
+    """Writes thumb_<width>.jpg for each width from one representative frame. Returns {width: path}."""
+    os.makedirs(out_dir, exist_ok=True)
+    timestamp = pick_thumbnail_time(src, duration, out_dir)
+    thumbs = {}
+    for width in widths:
+        dest = os.path.join(out_dir, f"thumb_{width}.jpg")
+        tmp = f"{dest}.tmp.jpg"
+        extract_frame(src, timestamp, tmp, width=width)
+        os.replace(tmp, dest)
+        thumbs[width] = dest
+    return thumbs
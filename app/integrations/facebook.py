@@ -1,28 +1,49 @@
 """
 Facebook Graph API Integration Service
 
-Handles posting to Facebook pages using the Graph API.
+Handles posting to Facebook pages using the Graph API, through the shared
+pooled and rate-limited client in graph_client.py.
 """
-import requests
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, Callable
 from flask import current_app
+from app.integrations.graph_client import GraphClient, GraphError, DEFAULT_TIMEOUT, get_graph_client
+
+# Upper bound on one transfer request; Graph may ask for less via end_offset
+VIDEO_CHUNK_MAX_BYTES = 8 * 1024 * 1024
+VIDEO_CHUNK_RETRIES = 4
 
 class FacebookService:
     """Service for interacting with Facebook Graph API"""
     
-    GRAPH_API_VERSION = 'v21.0'
-    BASE_URL = f'https://graph.facebook.com/{GRAPH_API_VERSION}'
-    
-    def __init__(self, page_id: str, access_token: str):
+    def __init__(self, page_id: str, access_token: str, client: Optional[GraphClient] = None):
         """
         Initialize Facebook service with page credentials.
         
         Args:
             page_id: Facebook Page ID
             access_token: Page Access Token
+            client: Optional GraphClient (defaults to the shared, pooled client)
         """
         self.page_id = page_id
         self.access_token = access_token
+        self.client = client or get_graph_client()
+        self.last_error: Optional[GraphError] = None  # Lets callers decide whether a failure is worth retrying
+    
+    def _post(self, edge: str, data: Dict[str, Any], timeout=DEFAULT_TIMEOUT, files=None, node: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            return self.client.post(f'/{node or self.page_id}/{edge}', self.access_token, page_id=self.page_id,
+                                    data=data, files=files, timeout=timeout)
+        except GraphError as e:
+            self.last_error = e
+            raise
+    
+    def _get(self, node: str, params: Dict[str, Any], timeout=DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        try:
+            return self.client.get(f'/{node}', self.access_token, page_id=self.page_id, params=params, timeout=timeout)
+        except GraphError as e:
+            self.last_error = e
+            raise
     
     def verify_credentials(self) -> tuple[bool, Optional[str]]:
         """
@@ -32,26 +53,14 @@ class FacebookService:
             Tuple of (success: bool, error_message: Optional[str])
         """
         try:
-            url = f'{self.BASE_URL}/{self.page_id}'
-            params = {
-                'fields': 'name,id',
-                'access_token': self.access_token
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                page_name = data.get('name', 'Unknown')
-                current_app.logger.info(f"Facebook credentials verified for page: {page_name}")
-                return True, None
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                return False, f"Invalid credentials: {error_msg}"
-                
-        except requests.RequestException as e:
-            return False, f"Connection error: {str(e)}"
+            data = self._get(self.page_id, {'fields': 'name,id'}, timeout=10)
+            page_name = data.get('name', 'Unknown')
+            current_app.logger.info(f"Facebook credentials verified for page: {page_name}")
+            return True, None
+        except GraphError as e:
+            if e.status is None:
+                return False, e.message
+            return False, f"Invalid credentials: {e.message}"
         except Exception as e:
             return False, f"Verification error: {str(e)}"
     
@@ -66,25 +75,13 @@ class FacebookService:
             Tuple of (success: bool, post_id: Optional[str], error: Optional[str])
         """
         try:
-            url = f'{self.BASE_URL}/{self.page_id}/feed'
-            data = {
-                'message': message,
-                'access_token': self.access_token
-            }
-            
-            response = requests.post(url, data=data, timeout=15)
-            
-            if response.status_code == 200:
-                result = response.json()
-                post_id = result.get('id')
-                current_app.logger.info(f"Successfully posted to Facebook. Post ID: {post_id}")
-                return True, post_id, None
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                current_app.logger.error(f"Facebook post failed: {error_msg}")
-                return False, None, error_msg
-                
+            result = self._post('feed', {'message': message}, timeout=(5, 15))
+            post_id = result.get('id')
+            current_app.logger.info(f"Successfully posted to Facebook. Post ID: {post_id}")
+            return True, post_id, None
+        except GraphError as e:
+            current_app.logger.error(f"Facebook post failed: {e.message}")
+            return False, None, e.message
         except Exception as e:
             current_app.logger.error(f"Exception posting to Facebook: {str(e)}")
             return False, None, str(e)
@@ -101,26 +98,13 @@ class FacebookService:
             Tuple of (success: bool, post_id: Optional[str], error: Optional[str])
         """
         try:
-            url = f'{self.BASE_URL}/{self.page_id}/photos'
-            data = {
-                'message': message,
-                'url': image_url,
-                'access_token': self.access_token
-            }
-            
-            response = requests.post(url, data=data, timeout=20)
-            
-            if response.status_code == 200:
-                result = response.json()
-                post_id = result.get('id')
-                current_app.logger.info(f"Successfully posted photo to Facebook. Post ID: {post_id}")
-                return True, post_id, None
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                current_app.logger.error(f"Facebook photo post failed: {error_msg}")
-                return False, None, error_msg
-                
+            result = self._post('photos', {'message': message, 'url': image_url}, timeout=(5, 20))
+            post_id = result.get('id')
+            current_app.logger.info(f"Successfully posted photo to Facebook. Post ID: {post_id}")
+            return True, post_id, None
+        except GraphError as e:
+            current_app.logger.error(f"Facebook photo post failed: {e.message}")
+            return False, None, e.message
         except Exception as e:
             current_app.logger.error(f"Exception posting photo to Facebook: {str(e)}")
             return False, None, str(e)
@@ -138,50 +122,230 @@ class FacebookService:
             Tuple of (success: bool, post_id: Optional[str], error: Optional[str])
         """
         try:
-            url = f'{self.BASE_URL}/{self.page_id}/videos'
             data = {
                 'description': message,
                 'file_url': video_url,
-                'access_token': self.access_token
             }
             
             if title:
                 data['title'] = title
             
-            # Video uploads can take longer, increase timeout to 10 minutes
-            response = requests.post(url, data=data, timeout=600)
+            # Facebook fetches the file itself, so the response can take up to 10 minutes
+            result = self._post('videos', data, timeout=(5, 600))
+            post_id = result.get('id')
+            current_app.logger.info(f"Successfully posted video to Facebook. Post ID: {post_id}")
+            return True, post_id, None
+        except GraphError as e:
+            current_app.logger.error(f"Facebook video post failed: {e.message}")
+            return False, None, e.message
+        except Exception as e:
+            current_app.logger.error(f"Exception posting video to Facebook: {str(e)}")
+            return False, None, str(e)
+    
+    def upload_video(self, key: str, message: str, title: Optional[str] = None,
+                     state: Optional[Dict[str, Any]] = None,
+                     checkpoint: Optional[Callable[[Dict[str, Any]], None]] = None) -> tuple[bool, Optional[str], Optional[str]]:
+        """
+        Upload a video from our storage with Graph's resumable protocol
+        (start / transfer / finish), streaming it chunk by chunk.
+        
+        Args:
+            key: Storage key of the video file
+            message: Caption/description for the video
+            title: Optional title for the video
+            state: Progress from an earlier attempt ({'upload_session_id', 'video_id',
+                'start_offset', 'file_size'}); the upload resumes from start_offset
+            checkpoint: Called with the current state after the start phase and
+                after every acknowledged chunk, so the caller can persist it
             
-            if response.status_code == 200:
-                result = response.json()
-                post_id = result.get('id')
-                current_app.logger.info(f"Successfully posted video to Facebook. Post ID: {post_id}")
-                return True, post_id, None
+        Returns:
+            Tuple of (success: bool, video_id: Optional[str], error: Optional[str]).
+            On failure the last checkpointed state is still valid for a retry.
+        """
+        from app.core.storage import get_storage
+        storage = get_storage()
+        checkpoint = checkpoint or (lambda state: None)
+        
+        try:
+            file_size = storage.size(key)
+            state = dict(state or {})
+            if state.get('upload_session_id') and state.get('file_size') != file_size:
+                current_app.logger.warning(f"Video {key} changed since upload session {state['upload_session_id']}; starting over")
+                state = {}
+            
+            if not state.get('upload_session_id'):
+                result = self._post('videos', {'upload_phase': 'start', 'file_size': file_size})
+                state = {
+                    'upload_session_id': result['upload_session_id'],
+                    'video_id': result.get('video_id'),
+                    'start_offset': int(result['start_offset']),
+                    'end_offset': int(result['end_offset']),
+                    'file_size': file_size,
+                }
+                checkpoint(state)
             else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                current_app.logger.error(f"Facebook video post failed: {error_msg}")
-                return False, None, error_msg
+                current_app.logger.info(f"Resuming video upload {state['upload_session_id']} at byte {state['start_offset']} of {file_size}")
+            
+            while state['start_offset'] < file_size:
+                start = state['start_offset']
+                end = state.get('end_offset') or file_size
+                if end <= start:
+                    end = file_size
+                end = min(end, start + VIDEO_CHUNK_MAX_BYTES, file_size)
                 
+                result = self._transfer_chunk(state['upload_session_id'], start, storage.read_range(key, start, end))
+                state['start_offset'] = int(result['start_offset'])
+                state['end_offset'] = int(result['end_offset'])
+                checkpoint(state)
+            
+            data = {
+                'upload_phase': 'finish',
+                'upload_session_id': state['upload_session_id'],
+                'description': message,
+            }
+            if title:
+                data['title'] = title
+            result = self._post('videos', data)
+            if not result.get('success', True):
+                return False, None, 'Facebook did not accept the finished upload'
+            
+            video_id = state.get('video_id') or result.get('video_id')
+            current_app.logger.info(f"Successfully uploaded video to Facebook. Video ID: {video_id}")
+            return True, video_id, None
+        except GraphError as e:
+            current_app.logger.error(f"Facebook video upload failed: {e.message}")
+            return False, None, e.message
         except Exception as e:
-            current_app.logger.error(f"Exception posting video to Facebook: {str(e)}")
+            current_app.logger.error(f"Exception uploading video to Facebook: {str(e)}")
             return False, None, str(e)
     
-    def post_unit(self, unit_data: Dict[str, Any]) -> tuple[bool, Optional[str], Optional[str]]:
+    def _transfer_chunk(self, upload_session_id: str, start: int, chunk: bytes) -> Dict[str, Any]:
         """
-        Post an inventory unit to Facebook with formatted message.
+        One transfer-phase request, retried with backoff on transient errors.
+        When Graph reports it expects a different offset (its error_data carries
+        start_offset/end_offset), that is returned so the caller re-syncs.
+        """
+        for attempt in range(VIDEO_CHUNK_RETRIES + 1):
+            try:
+                return self._post('videos', {
+                    'upload_phase': 'transfer',
+                    'upload_session_id': upload_session_id,
+                    'start_offset': start,
+                }, files={'video_file_chunk': ('chunk', chunk, 'application/octet-stream')}, timeout=(5, 120))
+            except GraphError as e:
+                if 'start_offset' in e.error_data and 'end_offset' in e.error_data:
+                    return e.error_data
+                if not e.is_transient or attempt == VIDEO_CHUNK_RETRIES:
+                    raise
+                delay = 2 ** attempt
+                current_app.logger.warning(f"Video chunk at byte {start} failed ({e.message}); retrying in {delay}s")
+                time.sleep(delay)
+    
+    def get_instagram_account_id(self) -> Optional[str]:
+        """The Instagram professional account linked to the page, if any."""
+        if not hasattr(self, '_ig_user_id'):
+            data = self._get(self.page_id, {'fields': 'instagram_business_account'})
+            self._ig_user_id = (data.get('instagram_business_account') or {}).get('id')
+        return self._ig_user_id
+    
+    def create_instagram_container(self, caption: str, media_url: str, media_type: str = 'image') -> tuple[Optional[str], Optional[str]]:
+        """
+        Create an Instagram media container (step one of publishing).
         
         Args:
-            unit_data: Dictionary containing unit information
-                - name: Unit name/title
-                - description: Unit description
-                - price: Unit price
-                - image_url: Public URL to unit image
-                - dealer_url: URL to dealer's website
-                
+            caption: Post caption
+            media_url: Public HTTPS URL of the JPEG image or MP4 video
+            media_type: 'image' or 'video' (videos are published as Reels)
+            
         Returns:
-            Tuple of (success: bool, post_id: Optional[str], error: Optional[str])
+            Tuple of (container_id: Optional[str], error: Optional[str])
+        """
+        try:
+            ig_user_id = self.get_instagram_account_id()
+            if not ig_user_id:
+                return None, 'No Instagram professional account is linked to this Facebook page'
+            
+            data = {'caption': caption}
+            if media_type == 'video':
+                data.update({'media_type': 'REELS', 'video_url': media_url})
+            else:
+                data['image_url'] = media_url
+            result = self._post('media', data, node=ig_user_id, timeout=(5, 60))
+            return result.get('id'), None
+        except GraphError as e:
+            current_app.logger.error(f"Instagram container creation failed: {e.message}")
+            return None, e.message
+        except Exception as e:
+            current_app.logger.error(f"Exception creating Instagram container: {str(e)}")
+            return None, str(e)
+    
+    def instagram_container_status(self, container_id: str) -> str:
+        """Container status_code: IN_PROGRESS, FINISHED, ERROR, EXPIRED or PUBLISHED."""
+        return self._get(container_id, {'fields': 'status_code'}).get('status_code', 'IN_PROGRESS')
+    
+    def publish_instagram_container(self, container_id: str) -> tuple[bool, Optional[str], Optional[str]]:
+        """
+        Publish a finished Instagram media container (step two).
+        
+        Returns:
+            Tuple of (success: bool, media_id: Optional[str], error: Optional[str])
+        """
+        try:
+            ig_user_id = self.get_instagram_account_id()
+            if not ig_user_id:
+                return False, None, 'No Instagram professional account is linked to this Facebook page'
+            result = self._post('media_publish', {'creation_id': container_id}, node=ig_user_id)
+            media_id = result.get('id')
+            current_app.logger.info(f"Successfully published to Instagram. Media ID: {media_id}")
+            return True, media_id, None
+        except GraphError as e:
+            current_app.logger.error(f"Instagram publish failed: {e.message}")
+            return False, None, e.message
+        except Exception as e:
+            current_app.logger.error(f"Exception publishing to Instagram: {str(e)}")
+            return False, None, str(e)
+    
+    def post_many(self, posts: List[Dict[str, Any]]) -> List[tuple[bool, Optional[str], Optional[str]]]:
+        """
+        Publish several text/photo posts in one Graph batch request.
+        
+        Args:
+            posts: List of {'message': str, 'image_url': Optional[str]}
+            
+        Returns:
+            One (success, post_id, error) tuple per post, in order
         """
-        # Format the message
+        calls = []
+        for post in posts:
+            if post.get('image_url'):
+                calls.append({'method': 'POST', 'relative_url': f'{self.page_id}/photos',
+                              'body': {'message': post['message'], 'url': post['image_url']}})
+            else:
+                calls.append({'method': 'POST', 'relative_url': f'{self.page_id}/feed',
+                              'body': {'message': post['message']}})
+        
+        try:
+            results = self.client.batch(calls, self.access_token, page_id=self.page_id)
+        except GraphError as e:
+            current_app.logger.error(f"Facebook batch post failed: {e.message}")
+            return [(False, None, e.message)] * len(posts)
+        except Exception as e:
+            current_app.logger.error(f"Exception sending Facebook batch: {str(e)}")
+            return [(False, None, str(e))] * len(posts)
+        
+        outcomes = []
+        for result in results:
+            if isinstance(result, GraphError):
+                outcomes.append((False, None, result.message))
+            else:
+                outcomes.append((True, result.get('post_id') or result.get('id'), None))
+        posted = sum(1 for ok, _, _ in outcomes if ok)
+        current_app.logger.info(f"Facebook batch: {posted}/{len(posts)} posts published")
+        return outcomes
+    
+    @staticmethod
+    def format_unit_message(unit_data: Dict[str, Any]) -> str:
+        """Builds the post text for an inventory unit (see post_unit)."""
         message = f"🚜 {unit_data['name']}\n\n"
         
         if unit_data.get('description'):
@@ -194,12 +358,37 @@ class FacebookService:
         
         if unit_data.get('dealer_url'):
             message += f"🔗 View details: {unit_data['dealer_url']}"
+        return message
+    
+    def post_unit(self, unit_data: Dict[str, Any]) -> tuple[bool, Optional[str], Optional[str]]:
+        """
+        Post an inventory unit to Facebook with formatted message.
+        
+        Args:
+            unit_data: Dictionary containing unit information
+                - name: Unit name/title
+                - description: Unit description
+                - price: Unit price
+                - image_url: Public URL to unit image
+                - dealer_url: URL to dealer's website
+                
+        Returns:
+            Tuple of (success: bool, post_id: Optional[str], error: Optional[str])
+        """
+        message = self.format_unit_message(unit_data)
         
         # Post with or without image
         if unit_data.get('image_url'):
             return self.post_photo(message, unit_data['image_url'])
         else:
             return self.post_text(message)
+    
+    def post_units(self, units: List[Dict[str, Any]]) -> List[tuple[bool, Optional[str], Optional[str]]]:
+        """Share several inventory units in a single batch request (see post_unit)."""
+        return self.post_many([
+            {'message': self.format_unit_message(unit_data), 'image_url': unit_data.get('image_url')}
+            for unit_data in units
+        ])
 
 
 def get_facebook_service(organization) -> Optional[FacebookService]:
@@ -1,6 +1,6 @@
-import requests
 from flask import url_for, current_app
 from typing import List, Dict, Any, Optional
+from app.integrations.graph_client import DEFAULT_GRAPH_URL, DEFAULT_TIMEOUT, get_session
 
 class FacebookOAuth:
     """
@@ -9,8 +9,14 @@ class FacebookOAuth:
     """
     
     auth_url = "https://www.facebook.com/v21.0/dialog/oauth"
-    token_url = "https://graph.facebook.com/v21.0/oauth/access_token"
-    graph_url = "https://graph.facebook.com/v21.0"
+    
+    @property
+    def graph_url(self):
+        return (current_app.config.get('FACEBOOK_GRAPH_URL') or DEFAULT_GRAPH_URL).rstrip('/')
+    
+    @property
+    def token_url(self):
+        return f"{self.graph_url}/oauth/access_token"
     
     @property
     def client_id(self):
@@ -48,7 +54,7 @@ class FacebookOAuth:
         }
         
         try:
-            resp = requests.get(self.token_url, params=params)
+            resp = get_session().get(self.token_url, params=params, timeout=DEFAULT_TIMEOUT)
             data = resp.json()
             if 'error' in data:
                 current_app.logger.error(f"Facebook Auth Error: {data['error']}")
@@ -73,7 +79,7 @@ class FacebookOAuth:
         }
         
         try:
-            resp = requests.get(self.token_url, params=params)
+            resp = get_session().get(self.token_url, params=params, timeout=DEFAULT_TIMEOUT)
             data = resp.json()
             token = data.get('access_token')
             current_app.logger.error(f"DEBUG_OAUTH: Received long_token: {token[:10]}..." if token else "DEBUG_OAUTH: No long_token in response")
@@ -98,7 +104,7 @@ class FacebookOAuth:
             all_pages = []
             # Fetch Pages
             while True:
-                resp = requests.get(url, params=params)
+                resp = get_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
                 data = resp.json()
                 
                 if 'data' in data:
@@ -115,7 +121,7 @@ class FacebookOAuth:
                 current_app.logger.info("Facebook OAuth: No pages in /me/accounts, trying fallback granular scopes")
                 app_token = f"{self.client_id}|{self.client_secret}"
                 debug_url = f"{self.graph_url}/debug_token"
-                debug_resp = requests.get(debug_url, params={'input_token': user_token, 'access_token': app_token})
+                debug_resp = get_session().get(debug_url, params={'input_token': user_token, 'access_token': app_token}, timeout=DEFAULT_TIMEOUT)
                 debug_data = debug_resp.json().get('data', {})
                 
                 target_ids = []
@@ -129,7 +135,7 @@ class FacebookOAuth:
                         'access_token': user_token,
                         'fields': 'name,id,access_token,category'
                     }
-                    p_resp = requests.get(page_url, params=page_params)
+                    p_resp = get_session().get(page_url, params=page_params, timeout=DEFAULT_TIMEOUT)
                     p_data = p_resp.json()
                     if 'id' in p_data and 'access_token' in p_data:
                         all_pages.append(p_data)
@@ -0,0 +1,342 @@
+"""
+Shared Facebook Graph API client.
+
+One keep-alive requests.Session per process (connection pooling, urllib3
+retry with backoff for transient failures), a token-bucket limiter per app and
+per page that slows down as Graph's usage headers approach 100%, and support
+for Graph batch requests so several calls go out in a single round trip.
+
+The Graph base URL comes from FACEBOOK_GRAPH_URL, so the client can be pointed
+at a local stub server.
+"""
+import os
+import json
+import time
+import threading
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+
+DEFAULT_GRAPH_URL = 'https://graph.facebook.com/v21.0'
+BATCH_LIMIT = 50  # Graph rejects batches with more than 50 requests
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read)
+
+# Graph error codes that mean "slow down" rather than "this request is wrong"
+THROTTLE_CODES = {4, 17, 32, 613} | set(range(80001, 80015))
+# Video upload timeouts / transient processing failures
+TRANSIENT_SUBCODES = {1363030, 1363019}
+# Usage percentage at which the limiter starts scaling its refill rate down
+USAGE_SOFT_LIMIT = 75
+MIN_RATE_FACTOR = 0.05
+THROTTLE_PAUSE_SECONDS = 60
+
+
+class GraphError(Exception):
+    """An error returned by Graph (or a transport failure talking to it)."""
+
+    def __init__(self, message, status=None, code=None, subcode=None, fbtrace_id=None, error_data=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.code = code
+        self.subcode = subcode
+        self.fbtrace_id = fbtrace_id
+        self.error_data = error_data or {}
+
+    @property
+    def is_throttle(self):
+        return self.status == 429 or self.code in THROTTLE_CODES
+
+    @property
+    def is_transient(self):
+        """Worth retrying: transport failures, 5xx, throttling and Graph's 'temporary' errors."""
+        return (self.status is None or self.status >= 500 or self.is_throttle
+                or self.code in (1, 2) or self.subcode in TRANSIENT_SUBCODES)
+
+    @classmethod
+    def from_body(cls, body, status=None):
+        error = (body or {}).get('error', {}) if isinstance(body, dict) else {}
+        return cls(
+            error.get('message', 'Unknown error'),
+            status=status,
+            code=error.get('code'),
+            subcode=error.get('error_subcode'),
+            fbtrace_id=error.get('fbtrace_id'),
+            error_data=error.get('error_data') if isinstance(error.get('error_data'), dict) else None,
+        )
+
+
+class TokenBucket:
+    """
+    Classic token bucket. The refill rate is scaled down by the latest usage
+    percentage Graph reported, and the bucket is closed outright while Graph
+    says access is throttled.
+    """
+
+    def __init__(self, rate, capacity):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost=1):
+        """Takes `cost` tokens (going into debt if needed) and returns how long to wait before sending."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            self.tokens -= cost
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def apply_usage(self, pct, regain_seconds=0):
+        """Adapts to a usage report (0-100, may exceed 100) from Graph."""
+        with self.lock:
+            if pct >= USAGE_SOFT_LIMIT:
+                self.rate = self.base_rate * max(MIN_RATE_FACTOR, (100 - pct) / 100)
+            else:
+                self.rate = self.base_rate
+            if pct >= 100 or regain_seconds:
+                self._pause(max(regain_seconds, THROTTLE_PAUSE_SECONDS))
+
+    def pause(self, seconds):
+        with self.lock:
+            self._pause(seconds)
+
+    def _pause(self, seconds):
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = now
+
+
+def _max_usage(usage):
+    """Highest of call_count / total_time / total_cputime in one usage dict."""
+    return max((v for k, v in usage.items() if k in ('call_count', 'total_time', 'total_cputime')
+                and isinstance(v, (int, float))), default=0)
+
+
+def parse_usage(headers):
+    """
+    Reads Graph's rate-limit headers. Returns (app_pct, page_pct, regain_seconds):
+
+    - X-App-Usage: {"call_count": 28, "total_time": 25, "total_cputime": 25}
+    - X-Page-Usage: same shape, for the page the token belongs to
+    - X-Business-Use-Case-Usage: {"<page id>": [{"type": "pages", "call_count": ...,
+      "estimated_time_to_regain_access": <minutes>}]}
+    """
+    app_pct = page_pct = 0
+    regain_seconds = 0
+
+    def load(name):
+        raw = headers.get(name)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    app_usage = load('X-App-Usage')
+    if isinstance(app_usage, dict):
+        app_pct = _max_usage(app_usage)
+
+    page_usage = load('X-Page-Usage')
+    if isinstance(page_usage, dict):
+        page_pct = _max_usage(page_usage)
+
+    buc_usage = load('X-Business-Use-Case-Usage')
+    if isinstance(buc_usage, dict):
+        for entries in buc_usage.values():
+            for entry in entries if isinstance(entries, list) else []:
+                page_pct = max(page_pct, _max_usage(entry))
+                regain_seconds = max(regain_seconds, (entry.get('estimated_time_to_regain_access') or 0) * 60)
+
+    return app_pct, page_pct, regain_seconds
+
+
+_session = None
+_session_pid = None
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_session(pool_size=20):
+    """
+    The process-wide keep-alive session. Recreated after fork so Celery
+    workers never share sockets with their parent.
+
+    Only idempotent methods are retried on read errors and 5xx responses; a
+    POST is retried only when the connection could not be established, so a
+    publish is never sent twice.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        retry = Retry(
+            total=4,
+            connect=3,
+            read=2,
+            status=3,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD', 'DELETE'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _session, _session_pid = session, os.getpid()
+        _buckets.clear()
+    return _session
+
+
+def get_bucket(key, rate, capacity):
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+
+class GraphClient:
+    """Thin Graph API client; see the module docstring."""
+
+    def __init__(self, base_url: Optional[str] = None, app_rate: Optional[float] = None,
+                 page_rate: Optional[float] = None, pool_size: Optional[int] = None):
+        config = current_app.config
+        self.base_url = (base_url or config.get('FACEBOOK_GRAPH_URL') or DEFAULT_GRAPH_URL).rstrip('/')
+        self.app_rate = app_rate or config.get('FACEBOOK_GRAPH_APP_RATE', 50)
+        self.page_rate = page_rate or config.get('FACEBOOK_GRAPH_PAGE_RATE', 5)
+        self.session = get_session(pool_size or config.get('FACEBOOK_GRAPH_POOL_SIZE', 20))
+
+    def _buckets_for(self, page_id):
+        buckets = [get_bucket(f'app:{self.base_url}', self.app_rate, self.app_rate)]
+        if page_id:
+            buckets.append(get_bucket(f'page:{page_id}', self.page_rate, self.page_rate))
+        return buckets
+
+    def _throttle(self, buckets, cost):
+        wait = max(bucket.reserve(cost) for bucket in buckets)
+        if wait > 0:
+            current_app.logger.info(f"Graph API rate limiter: waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    def _observe(self, buckets, response, body):
+        app_pct, page_pct, regain_seconds = parse_usage(response.headers)
+        buckets[0].apply_usage(app_pct)
+        if len(buckets) > 1:
+            buckets[1].apply_usage(page_pct, regain_seconds)
+        if max(app_pct, page_pct) >= USAGE_SOFT_LIMIT:
+            current_app.logger.warning(f"Graph API usage high: app {app_pct}%, page {page_pct}%")
+
+        if response.status_code >= 400 or (isinstance(body, dict) and 'error' in body):
+            error = GraphError.from_body(body, response.status_code)
+            if error.is_throttle:
+                retry_after = response.headers.get('Retry-After')
+                pause = float(retry_after) if retry_after and retry_after.isdigit() else THROTTLE_PAUSE_SECONDS
+                for bucket in buckets:
+                    bucket.pause(max(pause, regain_seconds))
+            raise error
+
+    def request(self, method: str, path: str, access_token: str, page_id: Optional[str] = None,
+                params: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
+                files=None, timeout=DEFAULT_TIMEOUT, cost: int = 1) -> Dict[str, Any]:
+        """
+        Sends one Graph call and returns the decoded JSON body.
+        `path` is relative to the base URL ('/<page>/feed') or a full URL
+        (Graph paging links). Raises GraphError on any failure.
+        """
+        url = path if path.startswith('http') else f"{self.base_url}/{path.lstrip('/')}"
+        buckets = self._buckets_for(page_id)
+        self._throttle(buckets, cost)
+
+        params = dict(params or {})
+        if access_token and 'access_token=' not in url:
+            if method.upper() == 'GET':
+                params['access_token'] = access_token
+            else:
+                data = dict(data or {}, access_token=access_token)
+
+        try:
+            response = self.session.request(method, url, params=params, data=data, files=files, timeout=timeout)
+        except requests.RequestException as e:
+            raise GraphError(f"Connection error: {str(e)}")
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {'error': {'message': f"HTTP {response.status_code}: non-JSON response"}}
+
+        self._observe(buckets, response, body)
+        return body
+
+    def get(self, path, access_token, **kwargs):
+        return self.request('GET', path, access_token, **kwargs)
+
+    def post(self, path, access_token, **kwargs):
+        return self.request('POST', path, access_token, **kwargs)
+
+    def batch(self, calls: List[Dict[str, Any]], access_token: str, page_id: Optional[str] = None,
+              timeout=(5, 120)) -> List[Any]:
+        """
+        Sends up to BATCH_LIMIT calls per HTTP round trip (larger lists are
+        split). Each call is {'method': 'POST', 'relative_url': '<page>/photos',
+        'body': {...}}. Returns one entry per call, in order: the decoded body
+        dict on success or a GraphError. Graph counts every call in a batch
+        against the rate limits, so the limiter is charged per call.
+
+        A whole-batch failure raises GraphError. Calls Graph did not get to
+        (null entries) come back as GraphError so the caller can retry them.
+        """
+        results = []
+        for start in range(0, len(calls), BATCH_LIMIT):
+            chunk = calls[start:start + BATCH_LIMIT]
+            payload = []
+            for call in chunk:
+                entry = {'method': call.get('method', 'GET').upper(), 'relative_url': call['relative_url'].lstrip('/')}
+                if call.get('body'):
+                    entry['body'] = urlencode(call['body'])
+                if call.get('name'):
+                    entry['name'] = call['name']
+                payload.append(entry)
+
+            body = self.request(
+                'POST', '/', access_token, page_id=page_id,
+                data={'batch': json.dumps(payload), 'include_headers': 'false'},
+                timeout=timeout, cost=len(chunk),
+            )
+            if not isinstance(body, list):
+                raise GraphError("Unexpected batch response")
+
+            for item in body:
+                if item is None:
+                    results.append(GraphError("Batch request not processed (timed out)"))
+                    continue
+                try:
+                    item_body = json.loads(item.get('body') or '{}')
+                except ValueError:
+                    item_body = {}
+                code = item.get('code', 500)
+                if code >= 400 or (isinstance(item_body, dict) and 'error' in item_body):
+                    results.append(GraphError.from_body(item_body, code))
+                else:
+                    results.append(item_body)
+        return results
+
+
+def get_graph_client() -> GraphClient:
+    """A GraphClient configured from the current app."""
+    return GraphClient()
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api_bp = Blueprint('api', __name__)
 
-from . import routes, auth_routes, super_admin_routes, me, bridge_routes
+from . import routes, auth_routes, super_admin_routes, me, bridge_routes, search_routes
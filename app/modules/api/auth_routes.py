@@ -1,7 +1,8 @@
-from flask import jsonify, request
+from flask import jsonify, request, g
 from flask_login import login_user
-from werkzeug.security import check_password_hash
-from app.core.models import User
+from app.core.extensions import db
+from app.core.passwords import verify_and_upgrade
+from app.modules.auth.routes import find_tenant_user
 from app.modules.api import api_bp
 
 @api_bp.route('/v1/auth/login', methods=['POST'])
@@ -12,16 +13,17 @@ def api_login():
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'message': 'Username and password required'}), 400
     
-    user = User.query.filter_by(username=data['username']).first()
+    user = find_tenant_user(g.current_org_id, data['username'].strip())
     
-    if not user or not check_password_hash(user.password, data['password']):
-        print(f"DEBUG: API Login failed for user {data.get('username')}")
+    if not verify_and_upgrade(user, data['password']):
         return jsonify({'message': 'Invalid username or password'}), 401
     
+    if db.session.dirty:
+        db.session.commit()  # Upgraded password hash
+    
     from flask import session
     login_user(user)
     session['organization_id'] = user.organization_id
-    print(f"DEBUG: API Login successful for {user.username}. Org ID: {user.organization_id}")
     
     return jsonify({
         'success': True,
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify, g
-from datetime import datetime
+from flask import Blueprint, request, jsonify, g, current_app
+from datetime import datetime, timedelta
+import secrets
 from app.core.extensions import db
 from app.core.models import Organization, PartInventory
 from app.core.multitenancy import global_tenant_bypass
+from app.core.heartbeats import record_heartbeat
+from app.core import bridge_auth
 from functools import wraps
 from . import api_bp
 
@@ -10,28 +13,22 @@ def bridge_key_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         bridge_key = request.headers.get('X-Bridge-Key')
-        print(f"DEBUG: Bridge auth attempt - Key received: {bridge_key[:20] if bridge_key else 'None'}...")
-        print(f"DEBUG: Current g.current_org_id before bypass: {g.get('current_org_id')}")
-        
         if not bridge_key:
-            print("DEBUG: No bridge key in headers")
             return jsonify({"error": "Missing X-Bridge-Key header"}), 401
             
-        # Use context manager to bypass tenant filtering during key lookup
+        # Bypass tenant filtering during key lookup; there is no tenant yet
         with global_tenant_bypass():
-            print("DEBUG: Inside global_tenant_bypass, querying for org...")
-            org = Organization.query.filter_by(pos_bridge_key=bridge_key).first()
-            print(f"DEBUG: Query result: {org.name if org else 'None'}")
+            org_id = bridge_auth.authenticate(bridge_key)
+            org = db.session.get(Organization, org_id) if org_id else None
         
         if not org:
-            print(f"DEBUG: No organization found with bridge key: {bridge_key[:20]}...")
+            current_app.logger.warning(f"Rejected bridge key from {request.remote_addr}")
             return jsonify({"error": "Invalid Bridge Key"}), 403
             
         # Set the authenticated organization as the current tenant for the remainder of the request
         g.bridge_org = org
         g.current_org = org
         g.current_org_id = org.id
-        print(f"DEBUG: Bridge auth successful for org: {org.name} (ID: {org.id})")
         
         return f(*args, **kwargs)
     return decorated_function
@@ -40,13 +37,36 @@ def bridge_key_required(f):
 @bridge_key_required
 def bridge_heartbeat():
     """
-    Bridge Check-in. Updates last_bridge_heartbeat.
+    Bridge Check-in. Recorded in Redis; last_bridge_heartbeat is flushed in batches.
     Input: Empty POST or optional metadata (version, etc.)
     """
+    seen_at = record_heartbeat(g.bridge_org.id)
+    return jsonify({"status": "ok", "timestamp": seen_at.isoformat()})
+
+@api_bp.route('/bridge/rotate-key', methods=['POST'])
+@bridge_key_required
+def bridge_rotate_key():
+    """
+    Issues a new bridge key. The key used for this call keeps working for
+    BRIDGE_KEY_ROTATION_OVERLAP_SECONDS so the bridge can switch over without downtime.
+    Output: { "bridge_key": "...", "previous_key_expires": "..." }
+    """
     org = g.bridge_org
-    org.last_bridge_heartbeat = datetime.utcnow()
+    if not bridge_auth.is_current_key(org, request.headers.get('X-Bridge-Key')):
+        return jsonify({"error": "Rotate with the current key"}), 409
+
+    overlap = timedelta(seconds=current_app.config.get('BRIDGE_KEY_ROTATION_OVERLAP_SECONDS', 86400))
+    new_key = secrets.token_hex(32)
+    org.set_bridge_key(new_key, keep_previous_until=datetime.utcnow() + overlap)
     db.session.commit()
-    return jsonify({"status": "ok", "timestamp": org.last_bridge_heartbeat.isoformat()})
+    bridge_auth.invalidate()
+
+    current_app.logger.info(f"Bridge key rotated for org {org.id}")
+    return jsonify({
+        "status": "ok",
+        "bridge_key": new_key,
+        "previous_key_expires": org.pos_bridge_key_prev_expires.isoformat()
+    })
 
 @api_bp.route('/bridge/parts-update', methods=['POST'])
 @bridge_key_required
@@ -101,8 +121,8 @@ def bridge_parts_update():
             
         updated_count += 1
         
-    org.last_bridge_heartbeat = datetime.utcnow()
     db.session.commit()
+    record_heartbeat(org.id)
     
     return jsonify({
         "status": "ok", 
@@ -1,6 +1,7 @@
 from flask import jsonify, g, request
 from . import api_bp
 from app.core.extensions import db
+from app.core import images
 
 @api_bp.route('/v1/advertisements', methods=['GET'])
 def get_advertisements():
@@ -40,11 +41,17 @@ def get_advertisements():
         try:
             from sqlalchemy import text
             sql = text("""
-                SELECT id, title, description, media_url, thumbnail_url, link_url, media_type
+                SELECT id, title, description, media_url, thumbnail_url, link_url, media_type,
+                       original_url, renditions
                 FROM media_content
                 WHERE organization_id = :org_id
                 AND post_to_banner = true
-                AND status = 'posted'
+                AND (status = 'posted' OR EXISTS (
+                    SELECT 1 FROM scheduled_post sp
+                    WHERE sp.media_content_id = media_content.id
+                    AND sp.destination = 'banner'
+                    AND sp.status = 'posted'
+                ))
             """)
             print(f"[ADS-RAW SQL] Executing raw SQL for org_id={org_id}", file=sys.stderr)
             result = db.session.execute(sql, {"org_id": org_id})
@@ -63,9 +70,15 @@ def get_advertisements():
             if hasattr(row, 'id'):
                 # ORM object
                 ad_id, ad_title, ad_desc, ad_media, ad_thumb, ad_link, ad_type = row.id, row.title, row.description, row.media_url, row.thumbnail_url, row.link_url, row.media_type
+                ad_original, ad_renditions = row.original_url, row.renditions
             else:
                 # Raw SQL tuple
-                ad_id, ad_title, ad_desc, ad_media, ad_thumb, ad_link, ad_type = row
+                ad_id, ad_title, ad_desc, ad_media, ad_thumb, ad_link, ad_type, ad_original, ad_renditions = row
+
+            if isinstance(ad_renditions, str):
+                import json
+                ad_renditions = json.loads(ad_renditions)
+            ad_hls = (ad_renditions or {}).get('hls')
 
             # Smart "either/or" logic: If we're in test environment (.local), rewrite URLs to match
             # Production (.com) keeps original URLs as-is
@@ -96,6 +109,21 @@ def get_advertisements():
                         path = ad_thumb[path_start:]
                         ad_thumb = f"{request.scheme}://{request_host}{path}"
 
+                # Rewrite rendition URLs the same way
+                if ad_hls and ad_hls.startswith('http'):
+                    path_start = ad_hls.find('/static/')
+                    if path_start > 0:
+                        ad_hls = f"{request.scheme}://{request_host}{ad_hls[path_start:]}"
+                if ad_original and ad_original.startswith('http'):
+                    path_start = ad_original.find('/static/')
+                    if path_start > 0:
+                        ad_original = f"{request.scheme}://{request_host}{ad_original[path_start:]}"
+
+            # Responsive variants (images only), on the same host as the media URL
+            ad_srcset = None
+            if ad_type == 'image' and (ad_renditions or {}).get('variants'):
+                ad_srcset = images.srcset(ad_renditions['variants'], images.base_url_for(ad_media))
+
             result.append({
                 'id': ad_id,
                 'title': ad_title,
@@ -103,7 +131,10 @@ def get_advertisements():
                 'image': ad_media,  # Use original image (high quality)
                 'thumbnail': ad_thumb or ad_media,  # Fallback to original if no thumb
                 'link_url': ad_link or '',
-                'media_type': ad_type  # Include media type so frontend knows if it's a video
+                'media_type': ad_type,  # Include media type so frontend knows if it's a video
+                'hls_url': ad_hls,  # Adaptive stream once transcoded (None until then)
+                'original_url': ad_original or ad_media,  # As uploaded, last-resort fallback
+                'image_srcset': ad_srcset  # {'avif'|'webp'|'jpeg': srcset, 'width', 'height'} once generated
             })
 
         print(f"[ADS-RETURN] Returning {len(result)} ads in JSON", file=sys.stderr)
@@ -162,6 +193,13 @@ def get_site_info():
                         converted_logos[idx] = logo_url
                 value = converted_logos
 
+        # Variant manifests are exposed as srcset-ready strings, not raw manifests
+        if camel_key == 'logoVariants':
+            value = images.srcset(value, f"{request.scheme}://{request.host}")
+        elif camel_key == 'brandLogoVariants' and isinstance(value, dict):
+            value = {idx: images.srcset(manifest, f"{request.scheme}://{request.host}")
+                     for idx, manifest in value.items()}
+
         converted_theme[camel_key] = value
 
     response = {
@@ -229,11 +267,11 @@ def get_inventory():
     for unit in units:
         # get primary image
         primary_img = UnitImage.query.filter_by(unit_id=unit.id, is_primary=True).first()
-        image_url = primary_img.image_url if primary_img else None
         
         # If no primary, grab first
-        if not image_url and unit.images:
-            image_url = unit.images[0].image_url
+        if not primary_img and unit.images:
+            primary_img = unit.images[0]
+        image_url = primary_img.image_url if primary_img else None
 
         results.append({
             "id": unit.id,
@@ -245,6 +283,7 @@ def get_inventory():
             "stock": 1,
             "status": unit.status,
             "image": image_url,
+            "image_srcset": images.srcset(primary_img.variants) if primary_img else None,
             "description": unit.description,
             "condition": unit.condition or "New",
             "year": unit.year
@@ -277,6 +316,101 @@ def get_inventory_filters():
         "types": sorted([t[0] for t in types if t[0]])
     })
 
+def _list_arg(name):
+    """Repeated (?type=a&type=b) filter values; values may themselves contain commas"""
+    return [v.strip() for v in request.args.getlist(name) if v.strip()]
+
+@api_bp.route('/v1/inventory/search', methods=['GET'])
+def search_inventory():
+    """
+    Faceted storefront search: one page of units plus facet counts, in one query.
+    ?q=&manufacturer=&type=&condition=&min_price=&max_price=&min_year=&max_year=&sort=&order=&page=&per_page=
+    """
+    from app.core.inventory_search import search_inventory as run_search, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+
+    if not g.current_org:
+        return jsonify({"results": [], "total": 0, "page": page, "facets": {}})
+
+    found = run_search(
+        g.current_org.id,
+        q=request.args.get('q', '').strip(),
+        manufacturers=_list_arg('manufacturer'),
+        types=_list_arg('type'),
+        conditions=_list_arg('condition'),
+        min_price=request.args.get('min_price', type=float),
+        max_price=request.args.get('max_price', type=float),
+        min_year=request.args.get('min_year', type=int),
+        max_year=request.args.get('max_year', type=int),
+        sort=request.args.get('sort', 'id'),
+        order=request.args.get('order', 'desc'),
+        page=page,
+        per_page=per_page
+    )
+
+    results = [{
+        "id": unit['id'],
+        "name": f"{unit['manufacturer'] or ''} {unit['model_number'] or ''}".strip(),
+        "manufacturer": unit['manufacturer'],
+        "model": unit['model_number'],
+        "type": unit['type'],
+        "price": float(unit['price']) if unit['price'] else 0.0,
+        "stock": 1,
+        "status": unit['status'],
+        "image": unit['image_url'],
+        "image_srcset": images.srcset(unit['variants']) if unit['image_url'] else None,
+        "description": unit['description'],
+        "condition": unit['condition'] or "New",
+        "year": unit['year']
+    } for unit in found['results']]
+
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    return jsonify({
+        "results": results,
+        "total": found['total'],
+        "page": page,
+        "per_page": per_page,
+        "pages": (found['total'] + per_page - 1) // per_page,
+        "facets": found['facets']
+    })
+
+def _catalog_response(name):
+    """Serves a published snapshot document with ETag revalidation; no tenant or ORM work when warm"""
+    from flask import Response
+    from app.core import catalog
+
+    header_host = request.headers.get('X-Forwarded-Host', request.host)
+    slug = request.args.get('slug') or request.headers.get('X-Dealer-Slug')
+    org_id = catalog.resolve_org_id(header_host, slug)
+    if not org_id:
+        return jsonify({"error": "Tenant not found"}), 404
+
+    etag, body = catalog.get_document(org_id, name)
+    if body is None:
+        return jsonify({"error": "Tenant not found"}), 404
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Browsers revalidate cheaply; shared caches may serve briefly stale copies
+    response.headers['Cache-Control'] = 'public, max-age=30, stale-while-revalidate=300'
+    response.headers['Vary'] = 'Host, X-Forwarded-Host, X-Dealer-Slug'
+    return response
+
+@api_bp.route('/v1/catalog', methods=['GET'])
+def get_catalog():
+    """Precomputed storefront catalog: site details, web units with images, facets, parts summary"""
+    return _catalog_response('catalog')
+
+@api_bp.route('/v1/catalog/parts', methods=['GET'])
+def get_catalog_parts():
+    """Precomputed parts list (separate document; it can be much larger than the unit catalog)"""
+    return _catalog_response('parts')
+
 @api_bp.route('/v1/parts', methods=['GET'])
 def get_parts():
     from app.core.models import PartInventory
@@ -360,11 +494,11 @@ def get_unit(id):
     
     # get primary image
     primary_img = UnitImage.query.filter_by(unit_id=unit.id, is_primary=True).first()
-    image_url = primary_img.image_url if primary_img else None
     
     # If no primary, grab first
-    if not image_url and unit.images:
-        image_url = unit.images[0].image_url
+    if not primary_img and unit.images:
+        primary_img = unit.images[0]
+    image_url = primary_img.image_url if primary_img else None
         
     return jsonify({
         "id": unit.id,
@@ -373,6 +507,7 @@ def get_unit(id):
         "stock": 1, 
         "status": unit.status,
         "image": image_url,
+        "image_srcset": images.srcset(primary_img.variants) if primary_img else None,
         "description": unit.description,
         "manufacturer": unit.manufacturer,
         "model_number": unit.model_number,
@@ -0,0 +1,47 @@
+from flask import jsonify, g, request, url_for
+from flask_login import login_required
+from app.modules.api import api_bp
+from app.core.search import search, DOC_TYPES
+
+def _result_url(row):
+    if row.doc_type == 'case':
+        return url_for('cases.view', case_id=row.object_id)
+    if row.doc_type == 'unit':
+        return url_for('units.view', unit_id=row.object_id)
+    if row.doc_type == 'dealer':
+        return url_for('dealers.view', dealer_id=row.object_id)
+    if row.doc_type == 'contact':
+        return url_for('dealers.view', dealer_id=row.parent_id) if row.parent_id else None
+    if row.doc_type == 'part':
+        return url_for('inventory.index')
+    if row.doc_type == 'bulletin':
+        return url_for('service_bulletins.view', sb_id=row.object_id)
+    return None
+
+@api_bp.route('/v1/search', methods=['GET'])
+@login_required
+def global_search():
+    """
+    Ranked search across cases, units, dealers, contacts, parts and bulletins.
+    ?q=<text>&types=case,unit&limit=20
+    """
+    if not g.current_org_id:
+        return jsonify({'error': 'Organization not found'}), 404
+
+    q = request.args.get('q', '').strip()
+    types = [t for t in request.args.get('types', '').split(',') if t in DOC_TYPES.values()]
+    limit = min(request.args.get('limit', 20, type=int), 50)
+
+    rows = search(g.current_org_id, q, doc_types=types or None, limit=limit) if q else []
+
+    return jsonify({
+        'query': q,
+        'results': [{
+            'type': row.doc_type,
+            'id': row.object_id,
+            'title': row.title,
+            'subtitle': row.subtitle,
+            'url': _result_url(row),
+            'rank': round(float(row.rank), 4)
+        } for row in rows]
+    })
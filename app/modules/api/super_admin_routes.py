@@ -1,29 +1,76 @@
 from flask import jsonify, request, session, g
 from flask_login import login_required, current_user
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 from app.core.extensions import db
 from app.core.models import Organization
+from app.core.metrics import get_platform_metrics
 from app.modules.api import api_bp
 
+TENANT_PAGE_SIZE = 50
+TENANT_MAX_PAGE_SIZE = 200
+TENANT_SORTS = {
+    'id': Organization.id,
+    'name': Organization.name,
+    'created': Organization.created_at,
+}
+
 @api_bp.route('/v1/super_admin/tenants', methods=['GET'])
 def api_list_tenants():
-    """List all organizations as JSON for super admin"""
+    """
+    One page of organizations for the super admin site manager.
+
+    Query params: page (1-based), per_page (max 200), q (name/slug search),
+    status ('active' / 'inactive'), sort ('id', 'name', 'created'), order ('asc' / 'desc').
+    """
     if not current_user.is_authenticated:
         return jsonify({'error': 'Unauthenticated'}), 401
-        
-    print(f"DEBUG: api_list_tenants called. User: {current_user.username}. Org ID: {g.get('current_org_id')}")
+
     # Security: Ensure only Super Admin (Org 1) can do this
     if g.current_org_id != 1 and not session.get('impersonation_origin_org'):
-        print(f"DEBUG: api_list_tenants Unauthorized. Org ID: {g.current_org_id}")
         return jsonify({'error': 'Unauthorized'}), 403
-    
-    orgs = Organization.query.order_by(Organization.id).all()
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', TENANT_PAGE_SIZE, type=int), 1), TENANT_MAX_PAGE_SIZE)
+    search = (request.args.get('q') or '').strip()
+    status = request.args.get('status')
+    sort_column = TENANT_SORTS.get(request.args.get('sort'), Organization.id)
+    descending = request.args.get('order') == 'desc'
+
+    query = Organization.query
+    if search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(Organization.name.ilike(pattern), Organization.slug.ilike(pattern)))
+    if status == 'active':
+        query = query.filter(Organization.is_active.is_(True))
+    elif status == 'inactive':
+        query = query.filter(Organization.is_active.is_(False))
+
+    # The unfiltered total is already cached for the dashboard cards
+    if not search and not status:
+        total = get_platform_metrics()['total_dealers']
+    else:
+        total = query.order_by(None).count()
+
+    order = sort_column.desc() if descending else sort_column.asc()
+    orgs = query.options(selectinload(Organization.users)).order_by(order, Organization.id).offset(
+        (page - 1) * per_page).limit(per_page).all()
+
     return jsonify({
         'organizations': [{
             'id': org.id,
             'name': org.name,
-            'modules': org.modules,
-            'theme': org.theme_config
-        } for org in orgs]
+            'slug': org.slug,
+            'is_active': org.is_active,
+            'modules': org.modules or {},
+            'created_at': org.created_at.isoformat() if org.created_at else None,
+            'last_bridge_heartbeat': org.last_bridge_heartbeat.isoformat() if org.last_bridge_heartbeat else None,
+            'users': [{'id': user.id, 'username': user.username} for user in org.users]
+        } for org in orgs],
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page
     })
 
 @api_bp.route('/v1/super_admin/impersonate/<int:org_id>', methods=['POST'])
@@ -80,3 +127,43 @@ def api_exit_impersonation():
 
     response.delete_cookie('is_impersonating', path='/')
     return response
+
+@api_bp.route('/v1/super_admin/upload-metrics', methods=['GET'])
+def api_upload_metrics():
+    """Temp disk held by in-flight chunked uploads, overall and per tenant"""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Unauthenticated'}), 401
+
+    if g.current_org_id != 1 and not session.get('impersonation_origin_org'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    from flask import current_app
+    from app.modules.marketing import chunk_upload
+    usage = chunk_upload.temp_usage()
+    return jsonify({
+        'total_bytes': usage['total_bytes'],
+        'sessions': usage['sessions'],
+        'oldest_session_age_seconds': usage['oldest_session_age'],
+        'by_org': [{'organization_id': org_id, **stats} for org_id, stats in usage['by_org'].items()],
+        'limits': {
+            'per_org_bytes': current_app.config.get('CHUNK_QUOTA_ORG_BYTES'),
+            'total_bytes': current_app.config.get('CHUNK_QUOTA_TOTAL_BYTES'),
+            'ttl_hours': current_app.config.get('CHUNK_UPLOAD_TTL_HOURS')
+        }
+    })
+
+@api_bp.route('/v1/super_admin/db-pool-metrics', methods=['GET'])
+def api_db_pool_metrics():
+    """Connection pool checkout waits and saturation for this web worker"""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Unauthenticated'}), 401
+
+    if g.current_org_id != 1 and not session.get('impersonation_origin_org'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    import os
+    from app.core.db_pool import get_pool_metrics
+    metrics = get_pool_metrics(db.engine, reset=request.args.get('reset') == '1')
+    if metrics is None:
+        return jsonify({'error': 'Pool metrics are not enabled for this database'}), 404
+    return jsonify({'pid': os.getpid(), **metrics})
@@ -1,12 +1,28 @@
 from flask import render_template, redirect, url_for, flash, request, session, g
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
+from app.core.passwords import verify_password, verify_and_upgrade, hash_password
 from app.core.models import User, Organization
 from app.core.extensions import db
 from . import auth_bp
 from .forms import ProfileForm, ChangePasswordForm, LoginForm
 import sys
 
+def find_tenant_user(org_id, username):
+    """
+    Looks a login up by (organization, username), the _user_org_uc key.
+    An exact username match wins over the lowercase fallback.
+    """
+    if not org_id or not username:
+        return None
+    candidates = User.query.filter(
+        User.organization_id == org_id,
+        User.username.in_({username, username.lower()})
+    ).all()
+    for user in candidates:
+        if user.username == username:
+            return user
+    return candidates[0] if candidates else None
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -17,39 +33,20 @@ def login():
     form = LoginForm()
     
     if form.validate_on_submit():
-        print("DEBUG: Login POST received")
         username = form.username.data.strip() if form.username.data else ""
         password = form.password.data
-        print(f"DEBUG: Attempting to login user: '{username}'")
-        
-        # 1. Find User (Try exact match, then try lowercase fallback)
-        users = User.query.filter_by(username=username).all()
-        if not users and username:
-             # Try lowercase match just in case
-             users = User.query.filter_by(username=username.lower()).all()
-
-        user_to_login = None
         
-        for user in users:
-            if user.password and check_password_hash(user.password, password):
-                user_to_login = user
-                break
-            else:
-                print(f"DEBUG: Password check failed for user ID {user.id} in Org {user.organization_id}")
+        # 1. Find the User in this site's tenant (unique per organization; lowercase fallback)
+        user_to_login = find_tenant_user(g.current_org_id, username)
         
-        if user_to_login:
-            print("DEBUG: User found and password verified.")
-            # 2. Login User
-            try:
-                login_user(user_to_login)
-                print("DEBUG: login_user successful")
-            except Exception as e:
-                print(f"ERROR in login_user: {e}")
-                raise e
+        if verify_and_upgrade(user_to_login, password):
+            # 2. Login User (persisting an upgraded password hash, if any)
+            if db.session.dirty:
+                db.session.commit()
+            login_user(user_to_login)
             
             # 3. Set Tenant Context
             session['organization_id'] = user_to_login.organization_id
-            print(f"DEBUG: Session Org ID set to {user_to_login.organization_id}")
             
             # 4. Check for mandatory password reset
             if user_to_login.password_reset_required:
@@ -104,8 +101,8 @@ def force_reset():
     form = ChangePasswordForm()
     # Profile update part not needed here, only password
     if form.validate_on_submit():
-        if check_password_hash(current_user.password, form.current_password.data):
-            current_user.password = generate_password_hash(form.new_password.data)
+        if verify_password(current_user.password, form.current_password.data):
+            current_user.password = hash_password(form.new_password.data)
             current_user.password_reset_required = False
             db.session.commit()
             flash('Your password has been set. Welcome to your dashboard!', 'success')
@@ -132,8 +129,8 @@ def profile():
         
     # Handle Password Change
     if password_form.submit_password.data and password_form.validate():
-        if check_password_hash(current_user.password, password_form.current_password.data):
-            current_user.password = generate_password_hash(password_form.new_password.data)
+        if verify_password(current_user.password, password_form.current_password.data):
+            current_user.password = hash_password(password_form.new_password.data)
             db.session.commit()
             flash('Password changed successfully.', 'success')
             return redirect(url_for('auth.profile'))
@@ -4,6 +4,9 @@ from sqlalchemy import desc
 from app.core.extensions import db
 from app.core.models import Case, Unit, Dealer, Note, User
 from app.core.utils import render_note_html
+from app.core.notes import load_note_threads
+from app.core.notifications import queue_mention_notifications
+from app.core.events import publish_event, note_event_data
 from . import cases_bp
 from datetime import datetime
 
@@ -94,6 +97,13 @@ def create():
         print(f"DEBUG: Pre-Commit for Case {new_case.id}", flush=True)
         db.session.commit()
         print(f"DEBUG: Post-Commit for Case {new_case.id}", flush=True)
+
+        if description:
+            queue_mention_notifications(
+                g.current_org_id, description, current_user.username,
+                f"{current_user.username} mentioned you on Case #{new_case.id}",
+                case_id=new_case.id, note_id=note.id
+            )
         
         flash(f'Case #{new_case.id} created.', 'success')
         return redirect(url_for('cases.view', case_id=new_case.id))
@@ -112,8 +122,13 @@ def view(case_id):
     users = User.query.order_by(User.username).all()
     print(f"DEBUG: Fetched users", flush=True)
     mention_data = jsonify([{'key': u.username, 'value': u.username} for u in users]).json
+
+    page = request.args.get('page', 1, type=int)
+    threads, threads_page = load_note_threads(Note, Note.case_id == case.id, page=page)
     
-    return render_template('cases/detail.html', case=case, users=users, render_note_html=render_note_html)
+    return render_template('cases/detail.html', case=case, users=users,
+                           threads=threads, threads_page=threads_page,
+                           render_note_html=render_note_html)
 
 @cases_bp.route('/cases/<int:case_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -124,9 +139,15 @@ def edit(case_id):
         dealer_id = request.form.get('dealer_id')
         unit_id = request.form.get('unit_id')
         reference = request.form.get('reference')
+        assigned_to = request.form.get('assigned_to')
+        newly_assigned = None
         
         if dealer_id:
             case.dealer_id = dealer_id
+
+        if assigned_to is not None and (assigned_to or None) != case.assigned_to:
+            case.assigned_to = assigned_to or None
+            newly_assigned = case.assigned_to
         
         # Handle unit update
         if unit_id:
@@ -143,11 +164,21 @@ def edit(case_id):
             case.reference = reference
             
         db.session.commit()
+
+        if newly_assigned and newly_assigned != current_user.username:
+            from app.tasks.notifications import fan_out_notifications
+            fan_out_notifications.delay(
+                g.current_org_id, [newly_assigned],
+                f"{current_user.username} assigned you Case #{case.id}",
+                case_id=case.id
+            )
+
         flash('Case details updated.', 'success')
         return redirect(url_for('cases.view', case_id=case.id))
         
     dealers = Dealer.query.order_by(Dealer.name).all()
-    return render_template('cases/edit.html', case=case, dealers=dealers)
+    users = User.query.order_by(User.username).all()
+    return render_template('cases/edit.html', case=case, dealers=dealers, users=users)
 
 @cases_bp.route('/cases/<int:case_id>/notes/add', methods=['POST'])
 @login_required
@@ -166,6 +197,13 @@ def add_note(case_id):
         # Touch case updated
         # case.last_updated = ...
         db.session.commit()
+
+        queue_mention_notifications(
+            g.current_org_id, text, current_user.username,
+            f"{current_user.username} mentioned you on Case #{case.id}",
+            case_id=case.id, note_id=note.id
+        )
+        publish_event(g.current_org_id, 'note_added', {'case_id': case.id, 'note': note_event_data(note)})
         flash('Note added.', 'success')
         
     return redirect(url_for('cases.view', case_id=case_id))
@@ -190,6 +228,11 @@ def update_status(case_id):
         )
         db.session.add(sys_note)
         db.session.commit()
+        publish_event(g.current_org_id, 'case_status', {
+            'case_id': case.id,
+            'status': new_status,
+            'note': note_event_data(sys_note)
+        })
         flash(f'Status updated to {new_status}.', 'success')
         
     return redirect(url_for('cases.view', case_id=case_id))
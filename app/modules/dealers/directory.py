@@ -0,0 +1,101 @@
+import math
+from collections import namedtuple
+from sqlalchemy import func
+from app.core.extensions import db
+from app.core.models import Dealer, Case, Contact, DealerNote
+
+DealerSummary = namedtuple('DealerSummary', [
+    'dealer', 'open_cases', 'closed_cases', 'total_cases', 'contact_count', 'last_activity'
+])
+
+class DirectoryPage:
+    """Minimal pagination object (same attribute names as Flask-SQLAlchemy's)."""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(math.ceil(self.total / self.per_page), 1) if self.per_page else 1
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+def dealer_directory(org_id, search=None, page=1, per_page=50):
+    """
+    One page of the dealer directory with case statistics, contact count and
+    last activity per dealer.
+
+    Everything (including the total row count, via a window function) comes
+    back in a single round trip: each statistic is a grouped subquery that is
+    outer-joined to the page of dealers.
+    """
+    page = max(page, 1)
+
+    case_stats = db.session.query(
+        Case.dealer_id.label('dealer_id'),
+        func.count(Case.id).label('total_cases'),
+        func.count(Case.id).filter(Case.status != 'Closed').label('open_cases'),
+        func.count(Case.id).filter(Case.status == 'Closed').label('closed_cases'),
+        func.max(func.greatest(Case.creation_timestamp, Case.closed_date, Case.reopened_date)).label('last_case_at')
+    ).filter(Case.organization_id == org_id).group_by(Case.dealer_id).subquery()
+
+    contact_stats = db.session.query(
+        Contact.dealer_id.label('dealer_id'),
+        func.count(Contact.id).label('contact_count')
+    ).filter(Contact.organization_id == org_id).group_by(Contact.dealer_id).subquery()
+
+    note_stats = db.session.query(
+        DealerNote.dealer_id.label('dealer_id'),
+        func.max(DealerNote.timestamp).label('last_note_at')
+    ).filter(DealerNote.organization_id == org_id).group_by(DealerNote.dealer_id).subquery()
+
+    query = db.session.query(
+        Dealer,
+        func.coalesce(case_stats.c.open_cases, 0).label('open_cases'),
+        func.coalesce(case_stats.c.closed_cases, 0).label('closed_cases'),
+        func.coalesce(case_stats.c.total_cases, 0).label('total_cases'),
+        func.coalesce(contact_stats.c.contact_count, 0).label('contact_count'),
+        # GREATEST ignores NULLs in Postgres
+        func.greatest(case_stats.c.last_case_at, note_stats.c.last_note_at).label('last_activity'),
+        func.count().over().label('total_rows')
+    ).outerjoin(
+        case_stats, case_stats.c.dealer_id == Dealer.id
+    ).outerjoin(
+        contact_stats, contact_stats.c.dealer_id == Dealer.id
+    ).outerjoin(
+        note_stats, note_stats.c.dealer_id == Dealer.id
+    ).filter(Dealer.organization_id == org_id)
+
+    if search:
+        query = query.filter(Dealer.name.ilike(f'%{search}%'))
+
+    rows = query.order_by(Dealer.name.asc(), Dealer.id.asc()).limit(per_page).offset((page - 1) * per_page).all()
+
+    items = [DealerSummary(
+        dealer=row.Dealer,
+        open_cases=row.open_cases,
+        closed_cases=row.closed_cases,
+        total_cases=row.total_cases,
+        contact_count=row.contact_count,
+        last_activity=row.last_activity
+    ) for row in rows]
+    total = rows[0].total_rows if rows else 0
+
+    return DirectoryPage(items, page, per_page, total)
@@ -6,6 +6,10 @@ from app.core.extensions import db
 from app.core.models import Dealer, Contact, DealerNote, User, Notification, Organization
 from app.core.constants import ALL_MANUFACTURERS
 from app.core.utils import render_note_html
+from app.core.notes import load_note_threads
+from app.core.notifications import queue_mention_notifications
+from app.core.events import publish_event, note_event_data
+from .directory import dealer_directory
 from . import dealers_bp
 
 # Admin requirement decorator placeholder - adapt as needed for RBAC
@@ -25,14 +29,12 @@ def admin_required(f):
 @dealers_bp.route('/dealers')
 @login_required
 def index():
-    """List all dealers."""
+    """List dealers with their case statistics, one page at a time."""
     search_term = request.args.get('search', '').strip()
-    query = Dealer.query
-    if search_term:
-        query = query.filter(Dealer.name.ilike(f'%{search_term}%'))
-    
-    dealers = query.order_by(Dealer.name.asc()).all()
-    return render_template('dealers/index.html', dealers=dealers, search_term=search_term)
+    page = request.args.get('page', 1, type=int)
+
+    directory = dealer_directory(g.current_org_id, search=search_term or None, page=page)
+    return render_template('dealers/index.html', directory=directory, search_term=search_term)
 
 @dealers_bp.route('/dealers/add', methods=['GET', 'POST'])
 @login_required
@@ -90,10 +92,16 @@ def view(dealer_id):
         {'key': f"{u.username} ({u.username})", 'value': u.username} for u in users
     ])
 
+    # Whole note tree for this page of threads in constant queries
+    page = request.args.get('page', 1, type=int)
+    threads, threads_page = load_note_threads(DealerNote, DealerNote.dealer_id == dealer.id, page=page)
+
     return render_template('dealers/detail.html', 
                            dealer=dealer, 
                            users=users, 
                            mention_data=mention_data,
+                           threads=threads,
+                           threads_page=threads_page,
                            render_note_html=render_note_html) # Pass helper to template
 
 @dealers_bp.route('/dealers/<int:dealer_id>/edit', methods=['GET', 'POST'])
@@ -136,6 +144,13 @@ def add_note(dealer_id):
         )
         db.session.add(new_note)
         db.session.commit()
+
+        queue_mention_notifications(
+            g.current_org_id, note_text, current_user.username,
+            f"{current_user.username} mentioned you on {dealer.name}",
+            dealer_note_id=new_note.id
+        )
+        publish_event(g.current_org_id, 'dealer_note_added', {'dealer_id': dealer.id, 'note': note_event_data(new_note)})
         flash('Note added.', 'success')
     else:
         flash('Note cannot be empty.', 'warning')
@@ -0,0 +1,45 @@
+import time
+from flask import Response, g
+from flask_login import login_required, current_user
+from app.core.extensions import db
+from app.core.cache import get_redis
+from app.core.events import org_channel, user_channel
+from . import events_bp
+
+# Comment line sent on idle connections so proxies don't time them out
+HEARTBEAT_SECONDS = 15
+
+@events_bp.route('/events/stream')
+@login_required
+def stream():
+    """
+    Server-sent events for the current tenant and user (note additions,
+    case status changes, new notifications). Each open page holds one
+    long-lived connection, which the gevent worker handles cheaply.
+    """
+    channels = [org_channel(g.current_org_id), user_channel(current_user.id)]
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*channels)
+
+    # Nothing below touches the DB; hand the connection back to the pool now
+    db.session.close()
+
+    def event_stream():
+        try:
+            yield 'retry: 5000\n\n'
+            last_sent = time.monotonic()
+            while True:
+                message = pubsub.get_message(timeout=HEARTBEAT_SECONDS)
+                if message and message.get('type') == 'message':
+                    yield f"data: {message['data']}\n\n"
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                    yield ': keepalive\n\n'
+                    last_sent = time.monotonic()
+        finally:
+            pubsub.close()
+
+    return Response(event_stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
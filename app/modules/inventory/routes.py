@@ -1,11 +1,10 @@
-from flask import render_template, g, redirect, url_for, flash, request, current_app
+from flask import render_template, g, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_required
 from . import inventory_bp
 from app.core.models import Unit, UnitImage, PartInventory
 from app.core.extensions import db
+from app.core import storage
 from .forms import InventoryItemForm, PartInventoryForm
-import os
-from werkzeug.utils import secure_filename
 
 @inventory_bp.route('/parts', methods=['GET'])
 @login_required
@@ -31,16 +30,8 @@ def add_part():
         
         # Handle Image Upload
         if form.image.data:
-            f = form.image.data
-            filename = secure_filename(f"{part.part_number}_{f.filename}")
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'parts', str(g.current_org.id))
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            import uuid
-            ext = os.path.splitext(filename)[1]
-            unique_filename = f"{uuid.uuid4().hex}{ext}"
-            f.save(os.path.join(upload_dir, unique_filename))
-            part.image_url = f"/static/uploads/parts/{g.current_org.id}/{unique_filename}"
+            key = storage.save_upload(form.image.data, g.current_org.id, 'parts')
+            part.image_url = storage.url_for_key(key)
 
         try:
             db.session.add(part)
@@ -74,16 +65,8 @@ def edit_part(id):
         
         # Handle Image Upload
         if form.image.data:
-            f = form.image.data
-            filename = secure_filename(f"{part.part_number}_{f.filename}")
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'parts', str(g.current_org.id))
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            import uuid
-            ext = os.path.splitext(filename)[1]
-            unique_filename = f"{uuid.uuid4().hex}{ext}"
-            f.save(os.path.join(upload_dir, unique_filename))
-            part.image_url = f"/static/uploads/parts/{g.current_org.id}/{unique_filename}"
+            key = storage.save_upload(form.image.data, g.current_org.id, 'parts')
+            part.image_url = storage.url_for_key(key)
         
         db.session.commit()
         flash('Part updated successfully.', 'success')
@@ -153,23 +136,17 @@ def add():
         
         # Handle Image Upload
         if form.primary_image.data:
-            f = form.primary_image.data
-            filename = secure_filename(f.filename)
-            # Save to static/uploads/inventory/{org_id}/
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'inventory', str(g.current_org.id))
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Make unique filename
-            import uuid
-            ext = os.path.splitext(filename)[1]
-            unique_filename = f"{uuid.uuid4().hex}{ext}"
-            f.save(os.path.join(upload_dir, unique_filename))
+            # Save to inventory/{org_id}/
+            key = storage.save_upload(form.primary_image.data, g.current_org.id, 'inventory')
             
             # Create UnitImage
-            image_url = f"/static/uploads/inventory/{g.current_org.id}/{unique_filename}"
+            image_url = storage.url_for_key(key)
             image = UnitImage(unit_id=unit.id, image_url=image_url, is_primary=True)
             db.session.add(image)
             db.session.commit()
+
+            from app.tasks.media import generate_unit_image_variants
+            generate_unit_image_variants.delay([image.id])
             
         flash('Unit added successfully.', 'success')
         return redirect(url_for('inventory.manage'))
@@ -206,27 +183,25 @@ def edit(id):
         
         # Handle Image Upload (Replace Primary or Add)
         if form.primary_image.data:
-            f = form.primary_image.data
-            filename = secure_filename(f.filename)
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'inventory', str(g.current_org.id))
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            import uuid
-            ext = os.path.splitext(filename)[1]
-            unique_filename = f"{uuid.uuid4().hex}{ext}"
-            f.save(os.path.join(upload_dir, unique_filename))
-            
-            image_url = f"/static/uploads/inventory/{g.current_org.id}/{unique_filename}"
+            key = storage.save_upload(form.primary_image.data, g.current_org.id, 'inventory')
+            image_url = storage.url_for_key(key)
             
             # Check existing primary
             existing_primary = UnitImage.query.filter_by(unit_id=unit.id, is_primary=True).first()
             if existing_primary:
-                existing_primary.image_url = image_url # Update existing
+                image = existing_primary
+                image.image_url = image_url # Update existing
+                image.variants = None  # Stale until the variant task reruns
             else:
                 image = UnitImage(unit_id=unit.id, image_url=image_url, is_primary=True)
                 db.session.add(image)
         
         db.session.commit()
+
+        if form.primary_image.data:
+            from app.tasks.media import generate_unit_image_variants
+            generate_unit_image_variants.delay([image.id])
+
         flash('Unit updated successfully.', 'success')
         return redirect(url_for('inventory.manage'))
         
@@ -245,6 +220,71 @@ def delete(id):
     flash('Unit deleted.', 'success')
     return redirect(url_for('inventory.manage'))
 
+def _unit_share_data(unit):
+    """The post_unit payload for a unit, with absolute URLs on the dealer's site."""
+    primary_img = UnitImage.query.filter_by(unit_id=unit.id, is_primary=True).first()
+    if not primary_img and unit.images:
+        primary_img = unit.images[0]
+    
+    image_url = None
+    if primary_img and primary_img.image_url:
+        key = storage.key_for_url(primary_img.image_url)
+        if key:
+            image_url = storage.absolute_url(key, g.current_org)
+        elif primary_img.image_url.startswith(('http://', 'https://')):
+            image_url = primary_img.image_url
+        else:
+            image_url = f"https://{g.current_org.slug}.bentcrankshaft.com{primary_img.image_url}"
+    
+    dealer_url = f"https://{g.current_org.slug}.bentcrankshaft.com/inventory/{unit.id}"
+    
+    return {
+        'name': f"{unit.year or ''} {unit.manufacturer} {unit.model_number}".strip(),
+        'description': unit.description,
+        'price': float(unit.price) if unit.price else 0.0,
+        'image_url': image_url,
+        'dealer_url': dealer_url
+    }
+
+@inventory_bp.route('/social-share', methods=['POST'])
+@login_required
+def social_share_bulk():
+    """Queues the selected units for one Graph batch post; returns 202 with the job id."""
+    from app.integrations.facebook import get_facebook_service
+    from app.tasks.marketing import share_units_task
+    unit_ids = request.form.getlist('unit_ids', type=int)
+    if not unit_ids:
+        return jsonify({'error': 'Select at least one unit to share.'}), 400
+    
+    if not get_facebook_service(g.current_org):
+        return jsonify({'error': 'Facebook is not connected. Go to Platform Settings to connect.'}), 400
+    
+    units = Unit.query.filter(Unit.id.in_(unit_ids), Unit.organization_id == g.current_org.id).all()
+    if not units:
+        return jsonify({'error': 'No matching units found.'}), 404
+    
+    job = share_units_task.delay(g.current_org.id, [_unit_share_data(unit) for unit in units])
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'units': len(units),
+        'status_url': url_for('inventory.social_share_status', job_id=job.id)
+    }), 202
+
+@inventory_bp.route('/social-share/<job_id>', methods=['GET'])
+@login_required
+def social_share_status(job_id):
+    """Progress of a bulk share job queued by social_share_bulk."""
+    from app.tasks.marketing import share_units_task
+    job = share_units_task.AsyncResult(job_id)
+    if not job.ready():
+        return jsonify({'job_id': job_id, 'state': 'pending'})
+    
+    result = job.result if isinstance(job.result, dict) else {'success': False, 'error': str(job.result)}
+    if result.get('organization_id') != g.current_org.id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job_id, 'state': 'done', **result})
+
 @inventory_bp.route('/<int:id>/social-share', methods=['POST'])
 @login_required
 def social_share(id):
@@ -263,25 +303,7 @@ def social_share(id):
             return redirect(url_for('inventory.manage'))
         
         # Prepare data for post
-        primary_img = UnitImage.query.filter_by(unit_id=unit.id, is_primary=True).first()
-        if not primary_img and unit.images:
-            primary_img = unit.images[0]
-            
-        print(f"DEBUG: primary_img found: {primary_img is not None}", flush=True)
-        
-        image_url = None
-        if primary_img:
-            image_url = f"https://{g.current_org.slug}.bentcrankshaft.com{primary_img.image_url}"
-        
-        dealer_url = f"https://{g.current_org.slug}.bentcrankshaft.com/inventory/{unit.id}"
-        
-        unit_data = {
-            'name': f"{unit.year or ''} {unit.manufacturer} {unit.model_number}".strip(),
-            'description': unit.description,
-            'price': float(unit.price) if unit.price else 0.0,
-            'image_url': image_url,
-            'dealer_url': dealer_url
-        }
+        unit_data = _unit_share_data(unit)
         
         print(f"DEBUG: prepared unit_data: {unit_data}", flush=True)
         
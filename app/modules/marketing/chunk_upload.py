@@ -1,38 +1,381 @@
 import os
+import io
+import json
+import math
+import time
 import uuid
+import errno
 import shutil
+import hashlib
 import tempfile
 from flask import request, jsonify, current_app, g
+from flask_login import current_user
+from app.core.cache import get_redis
+from . import media_store
 
-# Temporary directory for storing chunks during upload
+# Temporary directory for storing chunks during upload.
+# Chunk sessions are node-local: with several web nodes, route /marketing/chunk-upload
+# by uploadId (or share CHUNK_UPLOAD_DIR). With local storage, point it at the same
+# volume as static/uploads so the finished file can be renamed into place.
 CHUNK_TEMP_DIR = os.path.join(tempfile.gettempdir(), 'media_chunks')
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024  # Must match the clients' slice size
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Temp-disk quota bookkeeping. Each session's reservations live in a hash
+# (field per chunk, or 'declared' for the full size) so a re-sent chunk is not
+# charged twice and the whole session can be released in one step.
+QUOTA_ORG_KEY = 'chunk_quota:org:'          # + org_id -> {bytes, sessions}
+QUOTA_TOTAL_KEY = 'chunk_quota:total'       # {bytes, sessions}
+QUOTA_ORGS_KEY = 'chunk_quota:orgs'         # set of org_ids holding temp data
+QUOTA_STARTED_KEY = 'chunk_quota:started'   # zset upload_id -> first reservation time
+QUOTA_SESSION_KEY = 'chunk_quota:session:'  # + upload_id -> {_org, <field>: bytes}
+
+# Checks both limits and charges the difference against the field's previous
+# reservation atomically. Returns the bytes added, -1 (tenant over) or -2 (host over).
+_RESERVE_QUOTA = """
+local org_key = KEYS[1]
+local total_key = KEYS[2]
+local session_key = KEYS[3]
+local new_session = redis.call('exists', session_key) == 0
+local delta = tonumber(ARGV[2]) - tonumber(redis.call('hget', session_key, ARGV[1]) or '0')
+if delta > 0 then
+    local org_limit = tonumber(ARGV[3])
+    local total_limit = tonumber(ARGV[4])
+    if org_limit > 0 and tonumber(redis.call('hget', org_key, 'bytes') or '0') + delta > org_limit then
+        return -1
+    end
+    if total_limit > 0 and tonumber(redis.call('hget', total_key, 'bytes') or '0') + delta > total_limit then
+        return -2
+    end
+end
+redis.call('hincrby', org_key, 'bytes', delta)
+redis.call('hincrby', total_key, 'bytes', delta)
+redis.call('hset', session_key, ARGV[1], ARGV[2], '_org', ARGV[5])
+if new_session then
+    redis.call('hincrby', org_key, 'sessions', 1)
+    redis.call('hincrby', total_key, 'sessions', 1)
+    redis.call('zadd', KEYS[4], ARGV[7], ARGV[6])
+    redis.call('sadd', KEYS[5], ARGV[5])
+end
+return delta
+"""
+
+# Gives back one field's reservation (ARGV[2]) or the whole session's. Returns the bytes freed.
+_RELEASE_QUOTA = """
+local session_key = KEYS[1]
+local org = redis.call('hget', session_key, '_org')
+if not org then
+    return 0
+end
+local org_key = ARGV[3] .. org
+local freed = 0
+if ARGV[2] ~= '' then
+    freed = tonumber(redis.call('hget', session_key, ARGV[2]) or '0')
+    redis.call('hdel', session_key, ARGV[2])
+    redis.call('hincrby', org_key, 'bytes', -freed)
+else
+    local fields = redis.call('hgetall', session_key)
+    for i = 1, #fields, 2 do
+        if fields[i] ~= '_org' then
+            freed = freed + tonumber(fields[i + 1])
+        end
+    end
+    redis.call('del', session_key)
+    redis.call('zrem', KEYS[3], ARGV[1])
+    redis.call('hincrby', KEYS[2], 'sessions', -1)
+    if redis.call('hincrby', org_key, 'sessions', -1) <= 0 then
+        redis.call('del', org_key)
+        redis.call('srem', KEYS[4], org)
+    else
+        redis.call('hincrby', org_key, 'bytes', -freed)
+    end
+end
+redis.call('hincrby', KEYS[2], 'bytes', -freed)
+return freed
+"""
+
+class ChunkUploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def upload_ext(file_name):
+    """Storage extension for an upload's file name: an allowed image/video type, or .mp4 when it has none."""
+    ext = os.path.splitext(file_name or '')[1].lower()
+    if not ext:
+        return media_store.DEFAULT_EXTENSION
+    if not media_store.media_type_for_ext(ext):
+        raise ChunkUploadError(f'Invalid file type: {ext}. Allowed: images (jpg, png, gif, etc) or videos (mp4, mov, avi, etc).')
+    return ext
+
+def chunk_root():
+    return current_app.config.get('CHUNK_UPLOAD_DIR') or CHUNK_TEMP_DIR
 
 def ensure_chunk_dir():
     """Ensure chunk temporary directory exists"""
-    os.makedirs(CHUNK_TEMP_DIR, exist_ok=True)
+    os.makedirs(chunk_root(), exist_ok=True)
+
+def session_dir_for(upload_id):
+    """Resolve an upload session directory, rejecting anything that isn't a UUID."""
+    try:
+        upload_id = str(uuid.UUID(str(upload_id)))
+    except (ValueError, TypeError):
+        raise ChunkUploadError('Invalid uploadId')
+    return os.path.join(chunk_root(), upload_id)
+
+def load_session(upload_id):
+    """Loads session metadata and checks it belongs to the current tenant."""
+    session_dir = session_dir_for(upload_id)
+    try:
+        with open(os.path.join(session_dir, 'meta.json')) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise ChunkUploadError(f"Upload session {upload_id} not found", 404)
+
+    if meta.get('organization_id') != g.current_org_id:
+        raise ChunkUploadError(f"Upload session {upload_id} not found", 404)
+    return session_dir, meta
+
+def received_chunks(session_dir):
+    """Returns {chunk_index: byte_length} for every chunk fully written so far."""
+    received = {}
+    marker_dir = os.path.join(session_dir, 'received')
+    for name in os.listdir(marker_dir):
+        if name.isdigit():
+            with open(os.path.join(marker_dir, name)) as f:
+                received[int(name)] = int((f.read().split() or ['0'])[0])
+    return received
+
+def _last_activity(session_dir):
+    times = []
+    for path in (session_dir, os.path.join(session_dir, 'data.part'), os.path.join(session_dir, 'received')):
+        try:
+            times.append(os.stat(path).st_mtime)
+        except FileNotFoundError:
+            pass
+    return max(times) if times else 0
+
+def iter_sessions():
+    """Yields (session_dir, meta) for every upload session on disk (meta may be None)."""
+    root = chunk_root()
+    if not os.path.isdir(root):
+        return
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        try:
+            with open(os.path.join(entry.path, 'meta.json')) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            meta = None
+        yield entry.path, meta
+
+def temp_usage():
+    """Bytes reserved by in-flight upload sessions, overall and per organization."""
+    r = get_redis()
+    total = r.hgetall(QUOTA_TOTAL_KEY)
+    usage = {
+        'total_bytes': max(int(total.get('bytes') or 0), 0),
+        'sessions': max(int(total.get('sessions') or 0), 0),
+        'oldest_session_age': 0,
+        'by_org': {}
+    }
+    oldest = r.zrange(QUOTA_STARTED_KEY, 0, 0, withscores=True)
+    if oldest:
+        usage['oldest_session_age'] = max(int(time.time() - oldest[0][1]), 0)
+
+    org_ids = sorted(int(org_id) for org_id in r.smembers(QUOTA_ORGS_KEY))
+    pipe = r.pipeline(transaction=False)
+    for org_id in org_ids:
+        pipe.hgetall(f"{QUOTA_ORG_KEY}{org_id}")
+    for org_id, stats in zip(org_ids, pipe.execute()):
+        usage['by_org'][org_id] = {
+            'bytes': max(int(stats.get('bytes') or 0), 0),
+            'sessions': max(int(stats.get('sessions') or 0), 0)
+        }
+    return usage
+
+def reserve_quota(org_id, upload_id, field, num_bytes):
+    """
+    Reserves temp disk for a session before anything is written, refusing it
+    (507) once the tenant or the whole host would go over quota. Re-reserving
+    the same field only charges the difference.
+    """
+    org_limit = current_app.config.get('CHUNK_QUOTA_ORG_BYTES') or 0
+    total_limit = current_app.config.get('CHUNK_QUOTA_TOTAL_BYTES') or 0
+    try:
+        r = get_redis()
+        result = r.register_script(_RESERVE_QUOTA)(
+            keys=[f"{QUOTA_ORG_KEY}{org_id}", QUOTA_TOTAL_KEY, f"{QUOTA_SESSION_KEY}{upload_id}",
+                  QUOTA_STARTED_KEY, QUOTA_ORGS_KEY],
+            args=[field, int(num_bytes), org_limit, total_limit, org_id, upload_id, time.time()]
+        )
+    except Exception as e:
+        # Uploads keep working without Redis; nothing is recorded, so nothing is released later
+        current_app.logger.warning(f"Chunk upload quota unavailable: {e}")
+        return
+
+    if result == -1:
+        current_app.logger.warning(f"Chunk upload quota exceeded for org {org_id}: {num_bytes} more bytes > {org_limit}")
+        raise ChunkUploadError('Too many uploads in progress for this organization, please finish or wait for them to expire', 507)
+    if result == -2:
+        current_app.logger.warning(f"Global chunk upload quota exceeded: {num_bytes} more bytes > {total_limit}")
+        raise ChunkUploadError('Upload temporary storage is full, please try again shortly', 507)
+
+def release_quota(upload_id, field=None):
+    """Returns a session's reservation (or just one field of it). Returns the bytes freed."""
+    try:
+        r = get_redis()
+        return r.register_script(_RELEASE_QUOTA)(
+            keys=[f"{QUOTA_SESSION_KEY}{upload_id}", QUOTA_TOTAL_KEY, QUOTA_STARTED_KEY, QUOTA_ORGS_KEY],
+            args=[upload_id, field or '', QUOTA_ORG_KEY]
+        )
+    except Exception as e:
+        current_app.logger.warning(f"Failed to release chunk upload quota for {upload_id}: {e}")
+        return 0
+
+def reap_stale_sessions(ttl_seconds):
+    """Deletes upload sessions with no activity for `ttl_seconds`. Returns (sessions, bytes) freed."""
+    cutoff = time.time() - ttl_seconds
+    reaped, freed = 0, 0
+    for session_dir, meta in iter_sessions():
+        if _last_activity(session_dir) >= cutoff:
+            continue
+        try:
+            shutil.rmtree(session_dir)
+        except FileNotFoundError:
+            continue  # Completed or reaped concurrently
+        upload_id = os.path.basename(session_dir)
+        held = release_quota(upload_id)
+        reaped += 1
+        freed += held
+        current_app.logger.info(f"Reaped stale upload session {upload_id} (org {(meta or {}).get('organization_id')}, {held} bytes)")
+    return reaped, freed
+
+def _copy_into(src, dst_fd, offset, length=None, digest=None):
+    """
+    Copies an uploaded chunk into the data file at `offset`.
+
+    When werkzeug has spooled the chunk to a real temp file we let the kernel
+    move the bytes (copy_file_range), otherwise fall back to buffered pwrite.
+    If a `digest` is given the bytes have to pass through userspace anyway, so
+    the buffered path is used and hashes as it writes.
+    Returns the number of bytes written.
+    """
+    try:
+        src_fd = src.fileno()
+    except (AttributeError, io.UnsupportedOperation, OSError):
+        src_fd = None
+
+    if digest is None and src_fd is not None and hasattr(os, 'copy_file_range'):
+        src.flush()
+        size = os.fstat(src_fd).st_size if length is None else length
+        written = 0
+        try:
+            while written < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - written, written, offset + written)
+                if n == 0:
+                    break
+                written += n
+            return written
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP) or written:
+                raise
+
+    src.seek(0)
+    written = 0
+    while True:
+        buf = src.read(COPY_BUFFER_SIZE)
+        if not buf:
+            break
+        if digest is not None:
+            digest.update(buf)
+        os.pwrite(dst_fd, buf, offset + written)
+        written += len(buf)
+    return written
 
 def init_chunk_upload():
-    """Initialize chunked upload session"""
+    """
+    Initialize chunked upload session.
+
+    Optional JSON body: fileName, fileSize, chunkSize, totalChunks. When the
+    size is known the data file is preallocated so chunks can land at their
+    final offsets in any order.
+    """
     try:
         ensure_chunk_dir()
+        data = request.get_json(silent=True) or {}
         upload_id = str(uuid.uuid4())
 
+        # The assembled file keeps this extension, so refuse anything that isn't an allowed image/video
+        file_name = data.get('fileName') or data.get('filename')
+        upload_ext(file_name)
+
+        file_size = data.get('fileSize')
+        chunk_size = int(data.get('chunkSize') or DEFAULT_CHUNK_SIZE)
+        total_chunks = data.get('totalChunks')
+        if file_size:
+            file_size = int(file_size)
+            total_chunks = max(math.ceil(file_size / chunk_size), 1)
+
+        # Declared uploads reserve their full size up front, undeclared ones per chunk
+        if file_size:
+            reserve_quota(g.current_org_id, upload_id, 'declared', file_size)
+
+        meta = {
+            'upload_id': upload_id,
+            'organization_id': g.current_org_id,
+            'user_id': current_user.id if current_user.is_authenticated else None,
+            'file_name': file_name,
+            'file_size': file_size,
+            'chunk_size': chunk_size,
+            'total_chunks': int(total_chunks) if total_chunks else None,
+            'created_at': time.time()
+        }
+
         # Create upload session directory
-        session_dir = os.path.join(CHUNK_TEMP_DIR, upload_id)
-        os.makedirs(session_dir, exist_ok=True)
+        session_dir = os.path.join(chunk_root(), upload_id)
+        try:
+            os.makedirs(os.path.join(session_dir, 'received'), exist_ok=True)
+
+            fd = os.open(os.path.join(session_dir, 'data.part'), os.O_WRONLY | os.O_CREAT, 0o640)
+            try:
+                if file_size:
+                    try:
+                        os.posix_fallocate(fd, 0, file_size)
+                    except (AttributeError, OSError):
+                        os.ftruncate(fd, file_size)
+            finally:
+                os.close(fd)
 
-        current_app.logger.info(f"Initialized chunked upload: {upload_id}")
-        return jsonify({'uploadId': upload_id})
+            with open(os.path.join(session_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+        except Exception:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            release_quota(upload_id)
+            raise
+
+        current_app.logger.info(f"Initialized chunked upload: {upload_id} ({file_size or 'unknown'} bytes)")
+        return jsonify({'uploadId': upload_id, 'chunkSize': chunk_size, 'totalChunks': meta['total_chunks']})
+    except ChunkUploadError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         current_app.logger.error(f"Error initializing chunk upload: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 def upload_chunk():
-    """Handle individual chunk upload"""
+    """
+    Handle individual chunk upload.
+
+    Each chunk is written straight to its offset in the session's data file
+    through a private file descriptor, so chunks may arrive in parallel and out
+    of order; re-sending a chunk simply overwrites the same bytes.
+    """
     try:
         upload_id = request.form.get('uploadId')
         chunk_index = request.form.get('chunkIndex', type=int)
-        total_chunks = request.form.get('totalChunks', type=int)
+        if chunk_index is None:
+            chunk_index = request.form.get('chunkNumber', type=int)
 
         if not upload_id or chunk_index is None:
             return jsonify({'error': 'Missing uploadId or chunkIndex'}), 400
@@ -44,67 +387,137 @@ def upload_chunk():
         if not chunk_file:
             return jsonify({'error': 'Empty chunk file'}), 400
 
-        # Save chunk to session directory
-        session_dir = os.path.join(CHUNK_TEMP_DIR, upload_id)
-        os.makedirs(session_dir, exist_ok=True)
+        session_dir, meta = load_session(upload_id)
+        chunk_size = meta['chunk_size']
+        total_chunks = meta.get('total_chunks')
+
+        if chunk_index < 0 or (total_chunks and chunk_index >= total_chunks):
+            return jsonify({'error': f'chunkIndex {chunk_index} out of range'}), 400
 
-        chunk_path = os.path.join(session_dir, f'chunk_{chunk_index}')
-        chunk_file.save(chunk_path)
+        offset = chunk_index * chunk_size
+        stream = chunk_file.stream
+        stream.seek(0, os.SEEK_END)
+        length = stream.tell()
+        stream.seek(0)
 
-        current_app.logger.info(f"Received chunk {chunk_index + 1}/{total_chunks} for upload {upload_id}")
+        # Validate before writing so a bad chunk can never clobber its neighbours
+        if meta.get('file_size'):
+            expected = min(chunk_size, meta['file_size'] - offset)
+            if length != expected:
+                return jsonify({'error': f'Chunk {chunk_index} should be {expected} bytes, got {length}'}), 400
+        elif length > chunk_size:
+            return jsonify({'error': f'Chunk larger than chunkSize ({chunk_size})'}), 400
+        else:
+            # Undeclared size: the session grows chunk by chunk, so charge each one
+            reserve_quota(g.current_org_id, meta['upload_id'], str(chunk_index), length)
+
+        # A re-sent chunk is not "received" again until its new bytes are verified
+        marker = os.path.join(session_dir, 'received', str(chunk_index))
+        if os.path.exists(marker):
+            os.remove(marker)
+
+        expected_sha = (request.form.get('chunkSha256') or '').lower() or None
+        digest = hashlib.sha256() if expected_sha else None
+
+        fd = os.open(os.path.join(session_dir, 'data.part'), os.O_WRONLY)
+        try:
+            written = _copy_into(stream, fd, offset, length, digest)
+        except Exception:
+            if not meta.get('file_size'):
+                release_quota(meta['upload_id'], str(chunk_index))
+            raise
+        finally:
+            os.close(fd)
+
+        if digest is not None and digest.hexdigest() != expected_sha:
+            current_app.logger.warning(f"Checksum mismatch on chunk {chunk_index} of upload {upload_id}")
+            return jsonify({'error': f'Checksum mismatch on chunk {chunk_index}, please resend'}), 422
+
+        # Marker is written last and renamed into place: it only exists once the bytes do
+        tmp_marker = f"{marker}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_marker, 'w') as f:
+            f.write(f"{written} {digest.hexdigest() if digest else ''}")
+        os.replace(tmp_marker, marker)
+
+        current_app.logger.info(f"Received chunk {chunk_index + 1}/{total_chunks or '?'} for upload {upload_id}")
 
         return jsonify({
             'success': True,
             'chunkIndex': chunk_index,
             'totalChunks': total_chunks
         })
+    except ChunkUploadError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         current_app.logger.error(f"Error uploading chunk: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def upload_status(upload_id):
+    """Lists received chunk indices so a client can resume after a dropped connection."""
+    try:
+        session_dir, meta = load_session(upload_id)
+        received = received_chunks(session_dir)
+        return jsonify({
+            'uploadId': meta['upload_id'],
+            'fileName': meta.get('file_name'),
+            'fileSize': meta.get('file_size'),
+            'chunkSize': meta['chunk_size'],
+            'totalChunks': meta.get('total_chunks'),
+            'received': sorted(received),
+            'receivedBytes': sum(received.values())
+        })
+    except ChunkUploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
 def assemble_chunks(upload_id, org_id):
-    """Assemble chunks into final file and save to permanent location"""
+    """
+    Finalise the upload: chunks are already in place inside data.part, so this
+    checks completeness, trims the file, hashes it and moves it into the
+    tenant's content-addressed media storage (dropping it if an identical
+    file is already stored).
+
+    Returns: (filename, storage key, sha256, deduped)
+    """
     try:
         ensure_chunk_dir()
 
-        # Session directory with chunks
-        session_dir = os.path.join(CHUNK_TEMP_DIR, upload_id)
-        if not os.path.exists(session_dir):
+        session_dir, meta = load_session(upload_id)
+        if meta.get('organization_id') != org_id:
             raise ValueError(f"Upload session {upload_id} not found")
 
-        # Get list of chunks and sort by index
-        chunk_files = sorted(
-            [f for f in os.listdir(session_dir) if f.startswith('chunk_')],
-            key=lambda x: int(x.split('_')[1])
-        )
-
-        if not chunk_files:
+        received = received_chunks(session_dir)
+        if not received:
             raise ValueError(f"No chunks found for upload {upload_id}")
 
-        # Create permanent filename with UUID
-        unique_filename = f"{uuid.uuid4().hex}.mp4"
+        chunk_size = meta['chunk_size']
+        total_chunks = meta.get('total_chunks') or (max(received) + 1)
+        missing = [i for i in range(total_chunks) if i not in received]
+        if missing:
+            raise ValueError(f"Upload {upload_id} is missing chunks: {missing[:20]}")
+
+        final_size = meta.get('file_size') or ((total_chunks - 1) * chunk_size + received[total_chunks - 1])
 
-        # Create permanent upload directory (must match URL path in routes.py - use 'media' like regular uploads)
-        upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'media', str(org_id))
-        os.makedirs(upload_dir, exist_ok=True)
+        data_path = os.path.join(session_dir, 'data.part')
+        os.truncate(data_path, final_size)
 
-        file_path = os.path.join(upload_dir, unique_filename)
+        # Chunks land at their offsets in any order and in parallel, and a SHA-256
+        # state can't be carried between requests or combined from per-chunk
+        # digests, so the content address needs one sequential pass here. It reads
+        # the just-written (page-cached) file; storing it is then a rename.
+        sha256 = media_store.sha256_file(data_path)
 
-        # Assemble chunks into final file
-        with open(file_path, 'wb') as final_file:
-            for chunk_filename in chunk_files:
-                chunk_path = os.path.join(session_dir, chunk_filename)
-                with open(chunk_path, 'rb') as chunk_file:
-                    final_file.write(chunk_file.read())
+        ext = upload_ext(meta.get('file_name'))
+        unique_filename, key, deduped = media_store.store_file(data_path, org_id, ext, sha256)
 
-        # Clean up temporary chunks
+        # Clean up session directory
         try:
             shutil.rmtree(session_dir)
         except Exception as e:
             current_app.logger.warning(f"Failed to clean up temp chunks: {str(e)}")
+        release_quota(meta['upload_id'])
 
-        current_app.logger.info(f"Assembled {len(chunk_files)} chunks into {file_path}")
-        return unique_filename, file_path
+        current_app.logger.info(f"Assembled {total_chunks} chunks ({final_size} bytes, sha256 {sha256}) into {key}")
+        return unique_filename, key, sha256, deduped
 
     except Exception as e:
         current_app.logger.error(f"Error assembling chunks: {str(e)}")
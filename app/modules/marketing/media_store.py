@@ -0,0 +1,78 @@
+"""
+Content-addressed storage for promotion media.
+
+Files are stored under the key media/<org_id>/<sha256><ext>, so a dealer
+re-uploading the same manufacturer reel gets the existing file back instead of
+a second copy. Dedup is per tenant: the hash never crosses organisations.
+"""
+import os
+import hashlib
+from flask import current_app
+from app.core.storage import get_storage, tenant_key
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Promotion uploads are served back from the app origin, so only these types are accepted
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.wmv', '.flv', '.mkv', '.webm')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+DEFAULT_EXTENSION = '.mp4'
+
+def media_type_for_ext(ext):
+    """'video' or 'image' for an allowed extension, else None."""
+    ext = (ext or '').lower()
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    return None
+
+def media_key(org_id, filename):
+    return tenant_key(org_id, 'media', filename)
+
+def sha256_file(path):
+    """Hash a file from disk without loading it into memory."""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for buf in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(buf)
+        return digest.hexdigest()
+
+def store_file(src_path, org_id, ext, digest=None):
+    """
+    Moves the local file `src_path` into the tenant's content-addressed media.
+
+    Returns (filename, key, deduped). When an identical file is already stored
+    the source is discarded and the existing object is returned.
+    """
+    storage = get_storage()
+    digest = digest or sha256_file(src_path)
+    filename = f"{digest}{ext.lower()}"
+    key = media_key(org_id, filename)
+
+    if storage.exists(key):
+        os.remove(src_path)
+        current_app.logger.info(f"Deduplicated media upload for org {org_id}: {filename}")
+        return filename, key, True
+
+    storage.put_file(key, src_path, move=True)
+    return filename, key, False
+
+def save_upload(file_storage, org_id, ext):
+    """
+    Streams a werkzeug FileStorage to a staging file while hashing it (a single
+    pass), then stores it content-addressed. Returns (filename, key, digest, deduped).
+    """
+    digest = hashlib.sha256()
+
+    # The backend's work dir is on the uploads volume for local storage, so storing is a rename
+    with get_storage().work_dir() as work_dir:
+        tmp_path = os.path.join(work_dir, f"upload{ext.lower()}")
+        with open(tmp_path, 'wb') as out:
+            for buf in iter(lambda: file_storage.stream.read(COPY_BUFFER_SIZE), b''):
+                digest.update(buf)
+                out.write(buf)
+        filename, key, deduped = store_file(tmp_path, org_id, ext, digest.hexdigest())
+
+    return filename, key, digest.hexdigest(), deduped
@@ -3,61 +3,29 @@ from flask_login import login_required, current_user
 import zipfile
 import io
 import json
+import secrets
 import os
-import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from . import marketing_bp
 from .forms import MarketingPostForm
 from app.integrations.facebook import get_facebook_service
 from app.core.extensions import csrf, db
-from app.core.models import FacebookPost, MediaContent, ScheduledPost, Banner
+from app.core.models import FacebookPost, MediaContent, Banner
 # from . import chunk_upload  <-- causing circular import if chunk_upload imports blueprint
 import app.modules.marketing.chunk_upload as chunk_upload
+import app.modules.marketing.media_store as media_store
+from app.core import storage, bridge_auth
 
 
-def generate_video_thumbnail(video_path, output_path, frame='0'):
-    """
-    Generate a thumbnail for a video file.
-    Falls back to creating a simple placeholder if ImageMagick fails.
-
-    Args:
-        video_path: Path to the video file
-        output_path: Path to save the thumbnail
-        frame: Frame number to extract (default: 0 = first frame)
-
-    Returns:
-        True if successful, False otherwise (will use video URL as fallback)
-    """
-    try:
-        # Try to use ImageMagick's convert command to extract first frame
-        cmd = [
-            'convert',
-            f'{video_path}[{frame}]',  # Extract specific frame
-            '-quality', '80',            # JPEG quality
-            '-resize', '400x300',        # Resize to standard thumbnail size
-            output_path
-        ]
-
-        # Run convert with stderr/stdout suppressed
-        result = subprocess.run(cmd, capture_output=True, timeout=30)
-
-        if result.returncode == 0 and os.path.exists(output_path):
-            return True
-        else:
-            # ImageMagick failed, try creating a simple placeholder
-            current_app.logger.info("ImageMagick failed, creating placeholder thumbnail")
-            try:
-                # Create a simple solid color placeholder image (400x300, dark gray)
-                from PIL import Image
-                placeholder = Image.new('RGB', (400, 300), color='#2d2d2d')
-                placeholder.save(output_path, 'JPEG', quality=80)
-                return os.path.exists(output_path)
-            except:
-                # PIL not available or error, return False to use video URL as fallback
-                return False
-    except Exception as e:
-        current_app.logger.warning(f"Video thumbnail generation error: {str(e)}")
-        return False
+def existing_thumbnail_url(org_id, content_sha256):
+    """Thumbnail of an earlier upload of the same file (per tenant), if any."""
+    previous = MediaContent.query.filter(
+        MediaContent.organization_id == org_id,
+        MediaContent.content_sha256 == content_sha256,
+        MediaContent.thumbnail_url.isnot(None),
+        MediaContent.thumbnail_url != MediaContent.media_url
+    ).order_by(MediaContent.id.desc()).first()
+    return previous.thumbnail_url if previous else None
 
 @marketing_bp.route('/marketing', methods=['GET', 'POST'])
 @login_required
@@ -136,25 +104,13 @@ def facebook_posting():
                     is_video = ext in video_extensions
                     print(f"DEBUG: Is video: {is_video}", file=sys.stderr)
                     
-                    # Save to static/uploads/marketing/{org_id}/
-                    upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'marketing', str(org.id))
-                    os.makedirs(upload_dir, exist_ok=True)
-                    
-                    # Make unique filename
-                    import uuid
-                    unique_filename = f"{uuid.uuid4().hex}{ext}"
-                    file_path = os.path.join(upload_dir, unique_filename)
-                    print(f"DEBUG: Saving to {file_path}", file=sys.stderr)
-                    f.save(file_path)
-                    print("DEBUG: File saved", file=sys.stderr)
+                    # Save to marketing/{org_id}/
+                    key = storage.save_upload(f, org.id, 'marketing')
+                    print(f"DEBUG: Saved to {key}", file=sys.stderr)
                     
                     # Construct public HTTPS URL
                     # Use the dealer's subdomain for proper HTTPS access
-                    if org.slug:
-                        media_url = f"https://{org.slug}.bentcrankshaft.com/static/uploads/marketing/{org.id}/{unique_filename}"
-                    else:
-                        # Fallback to current host
-                        media_url = f"{request.scheme}://{request.host}/static/uploads/marketing/{org.id}/{unique_filename}"
+                    media_url = storage.absolute_url(key, org)
                     print(f"DEBUG: Media URL: {media_url}", file=sys.stderr)
                         
                 except Exception as e:
@@ -252,25 +208,14 @@ def parse_pdf():
         from app.modules.marketing.pdf_parser_v2 import parse_marketing_pdf
         result = parse_marketing_pdf(temp_pdf_path)
 
-        # Move the generated image to the uploads folder
+        # Move the generated image to storage
         if result.get('image_path'):
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'marketing', str(org.id))
-            os.makedirs(upload_dir, exist_ok=True)
-
             unique_filename = f"{uuid.uuid4().hex[:16]}_{secure_filename(pdf_file.filename)}.jpg"
-            final_image_path = os.path.join(upload_dir, unique_filename)
-
-            # Move the image
-            import shutil
-            shutil.move(result['image_path'], final_image_path)
+            key = storage.tenant_key(org.id, 'marketing', unique_filename)
+            storage.get_storage().put_file(key, result['image_path'], content_type='image/jpeg', move=True)
 
             # Construct public URL
-            if org.slug:
-                image_url = f"https://{org.slug}.bentcrankshaft.com/static/uploads/marketing/{org.id}/{unique_filename}"
-            else:
-                image_url = f"{request.scheme}://{request.host}/static/uploads/marketing/{org.id}/{unique_filename}"
-
-            result['image_url'] = image_url
+            result['image_url'] = storage.absolute_url(key, org)
 
         # Clean up temp PDF
         try:
@@ -298,6 +243,12 @@ def upload_chunk():
     """Upload individual chunk"""
     return chunk_upload.upload_chunk()
 
+@marketing_bp.route('/marketing/chunk-upload/<upload_id>/status', methods=['GET'])
+@login_required
+def chunk_upload_status(upload_id):
+    """List received chunk indices so an interrupted upload can resume"""
+    return chunk_upload.upload_status(upload_id)
+
 @marketing_bp.route('/marketing/complete-chunk-upload', methods=['POST'])
 @login_required
 @csrf.exempt
@@ -352,71 +303,38 @@ def complete_chunk_upload():
         if not org:
             return jsonify({'error': 'Organization not found'}), 400
 
+        # Check if at least one destination is selected (before the file is moved into storage)
+        if not (post_to_facebook or post_to_instagram or post_to_banner):
+            return jsonify({'error': 'Please select at least one destination'}), 400
+
         # Assemble chunks
-        unique_filename, file_path = chunk_upload.assemble_chunks(upload_id, org.id)
+        unique_filename, key, content_sha256, deduped = chunk_upload.assemble_chunks(upload_id, org.id)
 
-        # Determine media type based on file extension
-        import mimetypes
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if mime_type and mime_type.startswith('video/'):
-            media_type = 'video'
-        else:
-            media_type = 'image'
+        # Determine media type based on file extension (checked against the allow-list on init and assembly)
+        media_type = media_store.media_type_for_ext(os.path.splitext(unique_filename)[1])
 
-        # Construct public URL (use 'media' path to match where file is saved)
-        if org.slug:
-            media_url = f"https://{org.slug}.bentcrankshaft.com/static/uploads/media/{org.id}/{unique_filename}"
-        else:
-            media_url = f"{request.scheme}://{request.host}/static/uploads/media/{org.id}/{unique_filename}"
+        # Construct public URL
+        media_url = storage.absolute_url(key, org)
 
-        # Generate/Use thumbnails for videos
-        thumbnail_url = None
-        if media_type == 'video':
+        # Video thumbnails are extracted in the background (generate_media_thumbnails).
+        # Until then show a known thumbnail of the same file or the client-generated frame.
+        thumbnail_url = existing_thumbnail_url(org.id, content_sha256) if deduped else None
+        if media_type == 'video' and not thumbnail_url and thumbnail_file:
             try:
                 import uuid
-                thumbnail_filename = f"{uuid.uuid4().hex}_thumb.jpg"
-                upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'media', str(org.id))
-                os.makedirs(upload_dir, exist_ok=True)
-                thumbnail_path = os.path.join(upload_dir, thumbnail_filename)
-
-                # If thumbnail was provided from frontend (generated client-side), use it
-                if thumbnail_file:
-                    thumbnail_file.save(thumbnail_path)
-                    current_app.logger.info(f"Using client-generated thumbnail for video: {thumbnail_filename}")
-                    thumbnail_url_path = thumbnail_filename
-                # Otherwise, try to generate thumbnail server-side
-                elif generate_video_thumbnail(file_path, thumbnail_path):
-                    current_app.logger.info(f"Generated server-side thumbnail for video: {thumbnail_filename}")
-                    thumbnail_url_path = thumbnail_filename
-                else:
-                    # If thumbnail generation failed, use the video URL as fallback
-                    current_app.logger.warning("Could not generate thumbnail, using video URL as fallback")
-                    thumbnail_url = media_url
-                    thumbnail_url_path = None
-
-                # Construct thumbnail URL if thumbnail was created
-                if thumbnail_url_path:
-                    if org.slug:
-                        thumbnail_url = f"https://{org.slug}.bentcrankshaft.com/static/uploads/media/{org.id}/{thumbnail_url_path}"
-                    else:
-                        thumbnail_url = f"{request.scheme}://{request.host}/static/uploads/media/{org.id}/{thumbnail_url_path}"
-
+                thumbnail_key = storage.save_upload(thumbnail_file, org.id, 'media', f"{uuid.uuid4().hex}_thumb.jpg")
+                current_app.logger.info(f"Using client-generated thumbnail for video until extraction finishes: {thumbnail_key}")
+                thumbnail_url = storage.absolute_url(thumbnail_key, org)
             except Exception as e:
-                current_app.logger.warning(f"Video thumbnail processing error: {str(e)} - using video URL as thumbnail fallback")
-                # If thumbnail processing fails, fall back to using video URL as thumbnail
-                thumbnail_url = media_url
-
-        # Check if at least one destination is selected
-        if not (post_to_facebook or post_to_instagram or post_to_banner):
-            return jsonify({'error': 'Please select at least one destination'}), 400
+                current_app.logger.warning(f"Could not save client thumbnail: {str(e)}")
 
         # Determine initial status and whether to post now
         if scheduled_post_time:
             initial_status = 'scheduled'
             post_now = False
         else:
-            initial_status = 'posted' if (post_to_facebook or post_to_instagram or post_to_banner) else 'draft'
-            post_now = (post_to_facebook or post_to_instagram)
+            initial_status = 'publishing'
+            post_now = True
 
         # Create MediaContent record
         media_content = MediaContent(
@@ -426,6 +344,7 @@ def complete_chunk_upload():
             media_url=media_url,
             thumbnail_url=thumbnail_url,
             media_type=media_type,
+            content_sha256=content_sha256,
             link_url=link_url,
             post_to_facebook=post_to_facebook,
             post_to_instagram=post_to_instagram,
@@ -437,41 +356,34 @@ def complete_chunk_upload():
         db.session.add(media_content)
         db.session.flush()  # Get the ID without committing
 
-        # Queue tasks for immediate posting
-        current_app.logger.info(f"Video upload - post_now={post_now}, post_to_facebook={post_to_facebook}, post_to_instagram={post_to_instagram}")
-        if post_now:
-            from app.tasks.marketing import post_media_task
-            message = f"{media_content.title}"
-            if media_content.description:
-                message += f"\n\n{media_content.description}"
-
-            # Post to Facebook/Instagram
-            if post_to_facebook or post_to_instagram:
-                current_app.logger.info(f"Queueing post_media_task for media_content_id={media_content.id}, org_id={org.id}, media_type={media_type}")
-                task_result = post_media_task.delay(
-                    org.id,
-                    message,
-                    media_url,
-                    media_content.title,
-                    media_content.id,
-                    post_to_instagram,
-                    media_type
-                )
-                current_app.logger.info(f"Task queued with result: {task_result}")
+        # One ScheduledPost per destination; published by the fan-out after commit.
+        # With no destination left to publish to, the promotion stays a draft.
+        from app.tasks.marketing import media_destinations, prepare_destinations
+        if media_destinations(media_content):
+            prepare_destinations(media_content)
+        else:
+            media_content.status = 'draft'
+            post_now = False
 
-        # Create ScheduledPost for banner if selected
-        if post_to_banner:
-            scheduled_post = ScheduledPost(
-                organization_id=org.id,
-                media_content_id=media_content.id,
-                destination='banner',
-                scheduled_time=datetime.utcnow(),
-                status='posted'
-            )
-            db.session.add(scheduled_post)
+        if media_type == 'video':
+            media_content.transcode_status = 'pending'
 
         db.session.commit()
 
+        if post_now:
+            from app.tasks.marketing import fan_out_media
+            current_app.logger.info(f"Queueing fan_out_media for media_content_id={media_content.id}, org_id={org.id}, media_type={media_type}")
+            fan_out_media.delay(media_content.id)
+
+        # Thumbnails, web-optimised MP4 + HLS renditions and image variants are built in the background
+        if media_type == 'video':
+            from app.tasks.media import transcode_media_video, generate_media_thumbnails
+            generate_media_thumbnails.delay(media_content.id)
+            transcode_media_video.delay(media_content.id)
+        else:
+            from app.tasks.media import generate_media_image_variants
+            generate_media_image_variants.delay(media_content.id)
+
         return jsonify({
             'success': True,
             'message': f'"{title}" uploaded successfully and queued for posting!',
@@ -503,17 +415,6 @@ def download_bridge():
     else:
         server_url = request.host_url.rstrip('/')
 
-    config_data = {
-        "pos_bridge_key": org.pos_bridge_key,
-        "bridge_key": org.pos_bridge_key,
-        "slug": org.slug,
-        "dealer_slug": org.slug,
-        "name": org.name,
-        "dealer_name": org.name,
-        "server_url": server_url,
-        "url": server_url
-    }
-    
     # 2. Setup ZIP in memory
     memory_file = io.BytesIO()
     
@@ -529,6 +430,25 @@ def download_bridge():
             flash(f"Master Bridge file not found. Please contact support.", "danger")
             return redirect(url_for('marketing.dashboard'))
 
+    # Only the key's hash is stored, so each download issues a fresh key. The
+    # previous one keeps working through the rotation overlap while the bridge is updated.
+    overlap = timedelta(seconds=current_app.config.get('BRIDGE_KEY_ROTATION_OVERLAP_SECONDS', 86400))
+    bridge_key = secrets.token_hex(32)
+    org.set_bridge_key(bridge_key, keep_previous_until=datetime.utcnow() + overlap)
+    db.session.commit()
+    bridge_auth.invalidate()
+
+    config_data = {
+        "pos_bridge_key": bridge_key,
+        "bridge_key": bridge_key,
+        "slug": org.slug,
+        "dealer_slug": org.slug,
+        "name": org.name,
+        "dealer_name": org.name,
+        "server_url": server_url,
+        "url": server_url
+    }
+
     try:
         with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
             # Add config.json
@@ -593,31 +513,20 @@ def history():
 @login_required
 def dashboard():
     # --- Dual Dashboard Logic ---
-    from app.core.models import Organization, PartInventory, Unit
+    from app.core.metrics import get_platform_metrics, get_org_metrics
+    from app.core import heartbeats
     from datetime import datetime, timedelta
 
     # 1. SaaS Command Center (Master Org)
     if g.current_org_id == 1:
-        # Fetch Stats
-        total_dealers = Organization.query.count()
-        active_dealers = Organization.query.filter_by(is_active=True).count()
-
-        # Check for Offline Bridges (> 1 hour since heartbeat)
-        cutoff = datetime.utcnow() - timedelta(hours=1)
-        offline_bridges = Organization.query.filter(
-            Organization.id != 1, # Ignore Master
-            Organization.is_active == True,
-            (Organization.last_bridge_heartbeat < cutoff) | (Organization.last_bridge_heartbeat == None)
-        ).all()
-
-        # Fetch All Tenants for Site Manager View
-        tenants = Organization.query.order_by(Organization.id).all()
+        # Cached counters; the tenant table pages in from /api/v1/super_admin/tenants
+        metrics = get_platform_metrics()
 
         return render_template('main/saas_dashboard.html',
-                             total_dealers=total_dealers,
-                             active_dealers=active_dealers,
-                             offline_bridges=offline_bridges,
-                             tenants=tenants)
+                             total_dealers=metrics['total_dealers'],
+                             active_dealers=metrics['active_dealers'],
+                             offline_count=metrics['offline_count'],
+                             offline_bridges=metrics['offline_bridges'])
 
     # 2. Marketing Control Center (Dealer Org)
     else:
@@ -629,19 +538,18 @@ def dashboard():
 
         # Bridge Status
         bridge_online = False
-        last_seen = org.last_bridge_heartbeat
+        last_seen = heartbeats.last_seen(org)
         if last_seen and (datetime.utcnow() - last_seen) < timedelta(minutes=15):
              bridge_online = True
 
         # Inventory Stats
-        parts_count = PartInventory.query.filter_by(organization_id=org.id).count()
-        units_count = Unit.query.filter_by(organization_id=org.id, display_on_web=True).count()
+        counters = get_org_metrics(org.id)
 
         return render_template('main/dealer_dashboard.html',
                              bridge_online=bridge_online,
                              last_seen=last_seen,
-                             parts_count=parts_count,
-                             units_count=units_count)
+                             parts_count=counters['parts'],
+                             units_count=counters['units_web'])
 
 
 # ====== MEDIA MANAGEMENT ENDPOINTS ======
@@ -652,7 +560,6 @@ def media():
     """Unified media management - upload image/video for FB, IG, and/or Website Banner"""
     from datetime import datetime
     from werkzeug.utils import secure_filename
-    import uuid
 
     org = g.current_org
     if not org.modules.get('facebook'):
@@ -673,52 +580,28 @@ def media():
             ext = os.path.splitext(filename)[1].lower()
 
             # Validate file type
-            video_extensions = ['.mp4', '.mov', '.avi', '.wmv', '.flv', '.mkv', '.webm']
-            image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
-
-            if ext in video_extensions:
-                media_type = 'video'
-            elif ext in image_extensions:
-                media_type = 'image'
-            else:
+            media_type = media_store.media_type_for_ext(ext)
+            if not media_type:
                 flash(f'Invalid file type: {ext}. Allowed: images (jpg, png, gif, etc) or videos (mp4, mov, avi, etc).', 'danger')
                 return redirect(url_for('marketing.media'))
 
-            # Create upload directory
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'media', str(org.id))
-            os.makedirs(upload_dir, exist_ok=True)
-
-            unique_filename = f"{uuid.uuid4().hex}{ext}"
-            file_path = os.path.join(upload_dir, unique_filename)
-            media_file.save(file_path)
+            # Hash while saving; identical files are stored once per tenant
+            unique_filename, key, content_sha256, deduped = media_store.save_upload(media_file, org.id, ext)
 
             # Construct media URL
-            if org.slug:
-                media_url = f"https://{org.slug}.bentcrankshaft.com/static/uploads/media/{org.id}/{unique_filename}"
-            else:
-                media_url = f"{request.scheme}://{request.host}/static/uploads/media/{org.id}/{unique_filename}"
+            media_url = storage.absolute_url(key, org)
 
             # Generate thumbnails based on media type
             thumbnail_url = None
+            # Same video uploaded before: reuse its thumbnail instead of re-extracting a frame
+            reused_thumbnail = existing_thumbnail_url(org.id, content_sha256) if deduped and media_type == 'video' else None
             if media_type == 'image':
                 # For images, use the original media URL as the thumbnail
                 # This preserves quality when displaying at h-80 in carousel
                 thumbnail_url = media_url
-            elif media_type == 'video':
-                # For videos, generate a thumbnail from the first frame
-                try:
-                    thumbnail_filename = f"{uuid.uuid4().hex}_thumb.jpg"
-                    thumbnail_path = os.path.join(upload_dir, thumbnail_filename)
-
-                    if generate_video_thumbnail(file_path, thumbnail_path):
-                        # Construct thumbnail URL
-                        if org.slug:
-                            thumbnail_url = f"https://{org.slug}.bentcrankshaft.com/static/uploads/media/{org.id}/{thumbnail_filename}"
-                        else:
-                            thumbnail_url = f"{request.scheme}://{request.host}/static/uploads/media/{org.id}/{thumbnail_filename}"
-                except Exception as e:
-                    current_app.logger.error(f"Failed to generate video thumbnail: {str(e)}")
-                    # If thumbnail generation fails, fall back to not having a thumbnail
+            elif reused_thumbnail:
+                thumbnail_url = reused_thumbnail
+            # Otherwise video thumbnails are extracted in the background after commit
 
             # Parse destinations
             post_to_facebook = 'post_to_facebook' in request.form and fb_configured
@@ -748,8 +631,8 @@ def media():
                 initial_status = 'scheduled'
                 post_now = False
             else:
-                initial_status = 'posted' if (post_to_facebook or post_to_instagram or post_to_banner) else 'draft'
-                post_now = (post_to_facebook or post_to_instagram)
+                initial_status = 'publishing'
+                post_now = True
 
             # Create MediaContent
             media_content = MediaContent(
@@ -759,6 +642,7 @@ def media():
                 media_url=media_url,
                 thumbnail_url=thumbnail_url,
                 media_type=media_type,
+                content_sha256=content_sha256,
                 link_url=request.form.get('link_url'),
                 post_to_facebook=post_to_facebook,
                 post_to_instagram=post_to_instagram,
@@ -770,38 +654,33 @@ def media():
             db.session.add(media_content)
             db.session.flush()  # Get the ID without committing
 
-            # Create ScheduledPost records for immediate posting to FB/IG
-            if post_now:
-                from app.tasks.marketing import post_media_task
-                message = f"{media_content.title}"
-                if media_content.description:
-                    message += f"\n\n{media_content.description}"
-
-                # Post to Facebook/Instagram
-                if post_to_facebook or post_to_instagram:
-                    task_result = post_media_task.delay(
-                        org.id,
-                        message,
-                        media_url,
-                        media_content.title,
-                        media_content.id,
-                        post_to_instagram,
-                        media_type
-                    )
-
-            # Create ScheduledPost for banner if selected
-            if post_to_banner:
-                scheduled_post = ScheduledPost(
-                    organization_id=org.id,
-                    media_content_id=media_content.id,
-                    destination='banner',
-                    scheduled_time=scheduled_post_time or datetime.utcnow(),
-                    status='posted' if not scheduled_post_time else 'pending'
-                )
-                db.session.add(scheduled_post)
+            # One ScheduledPost per destination; published by the fan-out after commit.
+            # With no destination left to publish to, the promotion stays a draft.
+            from app.tasks.marketing import media_destinations, prepare_destinations
+            if media_destinations(media_content):
+                prepare_destinations(media_content)
+            else:
+                media_content.status = 'draft'
+                post_now = False
+
+            if media_type == 'video':
+                media_content.transcode_status = 'pending'
 
             db.session.commit()
 
+            if post_now:
+                from app.tasks.marketing import fan_out_media
+                fan_out_media.delay(media_content.id)
+
+            # Thumbnails, web-optimised MP4 + HLS renditions and image variants are built in the background
+            if media_type == 'video':
+                from app.tasks.media import transcode_media_video, generate_media_thumbnails
+                generate_media_thumbnails.delay(media_content.id)
+                transcode_media_video.delay(media_content.id)
+            else:
+                from app.tasks.media import generate_media_image_variants
+                generate_media_image_variants.delay(media_content.id)
+
             if schedule_mode == 'scheduled':
                 flash(f'Promotion scheduled for {scheduled_post_time.strftime("%b %d, %I:%M %p")}.', 'success')
             else:
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+notifications_bp = Blueprint('notifications', __name__)
+
+from . import routes
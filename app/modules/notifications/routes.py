@@ -0,0 +1,59 @@
+from flask import jsonify, url_for
+from flask_login import login_required, current_user
+from app.core.extensions import db
+from app.core.models import Notification
+from app.core.notifications import get_unread_count, incr_unread, set_unread
+from . import notifications_bp
+
+@notifications_bp.route('/notifications', methods=['GET'])
+@login_required
+def index():
+    """Latest notifications for the navbar dropdown."""
+    notifications = Notification.query.filter_by(recipient_id=current_user.id).order_by(
+        Notification.timestamp.desc()
+    ).limit(20).all()
+
+    results = []
+    for n in notifications:
+        link = None
+        if n.case_id:
+            link = url_for('cases.view', case_id=n.case_id)
+        elif n.dealer_note_id and n.dealer_note:
+            link = url_for('dealers.view', dealer_id=n.dealer_note.dealer_id, _anchor='notes-section')
+        results.append({
+            'id': n.id,
+            'message': n.message,
+            'is_read': n.is_read,
+            'timestamp': n.timestamp.isoformat() if n.timestamp else None,
+            'link': link
+        })
+
+    return jsonify({'unread': get_unread_count(current_user.id), 'notifications': results})
+
+@notifications_bp.route('/notifications/unread-count', methods=['GET'])
+@login_required
+def unread_count():
+    return jsonify({'unread': get_unread_count(current_user.id)})
+
+@notifications_bp.route('/notifications/<int:notification_id>/read', methods=['POST'])
+@login_required
+def mark_read(notification_id):
+    updated = Notification.query.filter_by(
+        id=notification_id, recipient_id=current_user.id, is_read=False
+    ).update({'is_read': True}, synchronize_session=False)
+    db.session.commit()
+
+    if updated:
+        incr_unread([current_user.id], -updated)
+    return jsonify({'success': True, 'unread': get_unread_count(current_user.id)})
+
+@notifications_bp.route('/notifications/read-all', methods=['POST'])
+@login_required
+def mark_all_read():
+    Notification.query.filter_by(recipient_id=current_user.id, is_read=False).update(
+        {'is_read': True}, synchronize_session=False
+    )
+    db.session.commit()
+
+    set_unread(current_user.id, 0)
+    return jsonify({'success': True, 'unread': 0})
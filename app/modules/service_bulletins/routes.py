@@ -1,11 +1,11 @@
 from flask import render_template, request, redirect, url_for, flash, current_app, send_from_directory, g, abort
 from flask_login import login_required, current_user
 from app.modules.service_bulletins import service_bulletins_bp
-import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
 from app.core.models import db, ServiceBulletin, ServiceBulletinModel, ServiceBulletinCompletion, User
+from app.core import storage
 from .parser import parse_bulletin_pdf
 from .utils import is_serial_in_range
 from . import api_routes # Register API routes
@@ -155,11 +155,7 @@ def upload():
             
         if file and file.filename.lower().endswith('.pdf'):
             filename = secure_filename(file.filename)
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'bulletins', str(g.current_org_id))
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            file_path = os.path.join(upload_dir, filename)
-            file.save(file_path)
+            pdf_key = storage.save_upload(file, g.current_org_id, 'bulletins', filename)
             
             # Default values if parsing fails or is disabled
             sb_data = {
@@ -177,7 +173,8 @@ def upload():
             parsing_error = None
             if 'auto_parse' in request.form:
                 try:
-                    parsed_data = parse_bulletin_pdf(file_path)
+                    with storage.get_storage().local_copy(pdf_key) as file_path:
+                        parsed_data = parse_bulletin_pdf(file_path)
                     # Merge parsed data, preferring parsed over default
                     for key, val in parsed_data.items():
                         if val: sb_data[key] = val
@@ -251,10 +248,9 @@ def delete(sb_id):
     try:
         # Delete file
         if sb.pdf_filename:
-             file_path = os.path.join(current_app.root_path, 'static', 'uploads', 'bulletins', str(g.current_org_id), sb.pdf_filename)
-             current_app.logger.info(f"Removing file: {file_path}")
-             if os.path.exists(file_path):
-                 os.remove(file_path)
+             pdf_key = storage.tenant_key(g.current_org_id, 'bulletins', sb.pdf_filename)
+             current_app.logger.info(f"Removing file: {pdf_key}")
+             storage.get_storage().delete(pdf_key)
 
         current_app.logger.info("Deleting record from database")
         db.session.delete(sb)
@@ -15,7 +15,7 @@ class OrganizationSettingsForm(FlaskForm):
     
     enable_pos = BooleanField('Enable POS Integration')
     pos_provider = SelectField('POS Provider', choices=[('ideal', 'Ideal'), ('csystems', 'C-Systems'), ('commander', 'Commander'), ('none', 'None')], default='none')
-    pos_bridge_key = StringField('POS Bridge Key', description="Secret key for local sync script.")
+    pos_bridge_key = StringField('POS Bridge Key', description="Secret key for local sync script. Only a hash is kept, so it is not shown again; leave blank to keep the current key.")
     
     # Module Toggles (For Admin use)
     module_pos_sync = BooleanField('Module: POS Sync')
@@ -1,15 +1,15 @@
 from flask import render_template, request, flash, redirect, url_for, g, current_app
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from werkzeug.utils import secure_filename
-import os
 from app.core.extensions import db
 from app.core.models import User
+from app.core import storage, bridge_auth
 from . import settings_bp
 from .forms import OrganizationSettingsForm, AddUserForm, EditUserForm
 from itsdangerous import URLSafeSerializer
 from app.core.multitenancy import global_tenant_bypass
 from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.exc import IntegrityError
 
 @settings_bp.route('/settings/organization', methods=['GET', 'POST'])
 @login_required
@@ -48,7 +48,9 @@ def organization():
         
         # POS
         form.pos_provider.data = org.pos_provider or 'none'
-        form.pos_bridge_key.data = org.pos_bridge_key
+        # Only the key's hash is stored: the field sets a new key and stays blank otherwise
+        if org.pos_bridge_key_hash:
+            form.pos_bridge_key.render_kw = {'placeholder': 'A key is set. Enter a new one to replace it.'}
         form.enable_pos.data = (org.pos_provider and org.pos_provider != 'none')
         
         # Facebook
@@ -102,19 +104,13 @@ def organization():
         new_theme['primary_color'] = form.primary_color.data
         
         # Handle Logo Upload
+        logos_changed = False
         if form.company_logo.data:
-            f = form.company_logo.data
-            filename = secure_filename(f"{org.id}_logo_{f.filename}")
+            logos_changed = True
+            key = storage.save_upload(form.company_logo.data, org.id, 'logos')
             
-            # Ensure upload path exists
-            upload_dir = os.path.join(current_app.root_path, 'static/uploads/logos')
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            file_path = os.path.join(upload_dir, filename)
-            f.save(file_path)
-            
-            # Save relative URL for frontend
-            new_theme['logo_url'] = f"/static/uploads/logos/{filename}"
+            # Save URL for frontend (site-relative for local storage)
+            new_theme['logo_url'] = storage.url_for_key(key)
         
         # Handle Brand Logos
         brand_logos = new_theme.get('brand_logos', {})
@@ -124,13 +120,9 @@ def organization():
             field_name = f'brand_logo_{i}'
             field = getattr(form, field_name)
             if field.data:
-                f = field.data
-                filename = secure_filename(f"{org.id}_brand_{i}_{f.filename}")
-                upload_dir = os.path.join(current_app.root_path, 'static/uploads/brands')
-                os.makedirs(upload_dir, exist_ok=True)
-                file_path = os.path.join(upload_dir, filename)
-                f.save(file_path)
-                brand_logos[str(i)] = f"/static/uploads/brands/{filename}"
+                logos_changed = True
+                key = storage.save_upload(field.data, org.id, 'brands')
+                brand_logos[str(i)] = storage.url_for_key(key)
 
             # Handle brand logo URL links
             url_field_name = f'brand_logo_url_{i}'
@@ -176,7 +168,10 @@ def organization():
             
         org.ari_dealer_id = form.ari_dealer_id.data
         org.pos_provider = form.pos_provider.data
-        org.pos_bridge_key = form.pos_bridge_key.data
+        new_bridge_key = (form.pos_bridge_key.data or '').strip()
+        bridge_key_changed = bool(new_bridge_key) and org.hash_bridge_key(new_bridge_key) != org.pos_bridge_key_hash
+        if bridge_key_changed:
+            org.set_bridge_key(new_bridge_key)
         # Facebook - Skip manual update if empty (handled by OAuth)
         # org.facebook_page_id = form.facebook_page_id.data
         # org.facebook_access_token = form.facebook_access_token.data
@@ -200,7 +195,25 @@ def organization():
         flag_modified(org, "theme_config")
         flag_modified(org, "modules")
 
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Bridge key hashes (like slugs and custom domains) are unique across tenants
+            db.session.rollback()
+            if bridge_key_changed:
+                form.pos_bridge_key.errors.append('This key is already in use. Please choose a different one.')
+                flash("Settings were not saved: the POS bridge key is already in use.", "danger")
+            else:
+                flash("Settings were not saved: the subdomain or custom domain is already in use.", "danger")
+            return render_template('settings/organization.html', form=form, add_user_form=add_user_form, edit_user_form=edit_user_form, users=users)
+        if bridge_key_changed:
+            bridge_auth.invalidate()
+            flash("POS bridge key updated. Only its hash is stored, so update the bridge's config.json now.", "info")
+
+        # Resized logo variants for the public site are built in the background
+        if logos_changed:
+            from app.tasks.media import generate_logo_variants
+            generate_logo_variants.delay(org.id)
         
         flash("Settings updated successfully.", "success")
         return redirect(url_for('settings.organization'))
@@ -490,13 +503,8 @@ def onboarding_save():
     
     # Handle Logo Upload
     if form.company_logo.data:
-        f = form.company_logo.data
-        filename = secure_filename(f"{org.id}_logo_{f.filename}")
-        upload_dir = os.path.join(current_app.root_path, 'static/uploads/logos')
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, filename)
-        f.save(file_path)
-        new_theme['logo_url'] = f"/static/uploads/logos/{filename}"
+        key = storage.save_upload(form.company_logo.data, org.id, 'logos')
+        new_theme['logo_url'] = storage.url_for_key(key)
     
     # Content
     new_theme['hero_title'] = form.hero_title.data
@@ -521,6 +529,10 @@ def onboarding_save():
     flag_modified(org, "theme_config")
     
     db.session.commit()
+
+    if form.company_logo.data:
+        from app.tasks.media import generate_logo_variants
+        generate_logo_variants.delay(org.id)
     
     flash("Your site setup is complete! Welcome aboard. 🎉", "success")
     return redirect(url_for('marketing.dashboard'))
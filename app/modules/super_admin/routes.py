@@ -37,10 +37,9 @@ def add_tenant():
             modules={'ari': False, 'pos': 'none'},
             theme_config={'primaryColor': '#2563EB', 'logo_url': None}, # Default Blue
 
-            # Auto-generate keys
-            pos_bridge_key=secrets.token_hex(32),
             pos_provider='none'
         )
+        new_org.set_bridge_key(secrets.token_hex(32))  # Auto-generate keys
         db.session.add(new_org)
         db.session.flush() # Get ID
         
@@ -1 +1 @@
-from . import pos_sync, marketing
+from . import pos_sync, marketing, notifications, search, media, metrics, bridge, catalog
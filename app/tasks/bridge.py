@@ -0,0 +1,33 @@
+"""
+POS bridge presence tasks: batch persistence of the Redis heartbeats and the
+online/offline reconciliation in app/core/heartbeats.py.
+"""
+from celery import shared_task
+from flask import current_app
+from app.core.heartbeats import flush_pending, sweep
+
+
+@shared_task
+def flush_bridge_heartbeats():
+    """Writes the heartbeats collected since the last run to organization.last_bridge_heartbeat."""
+    try:
+        drained, updated = flush_pending()
+        if drained:
+            current_app.logger.info(f"Flushed {drained} bridge heartbeats ({updated} rows updated)")
+        return {'drained': drained, 'updated': updated}
+    except Exception as e:
+        current_app.logger.error(f"Error in flush_bridge_heartbeats: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def sweep_bridge_status():
+    """Marks bridges offline whose heartbeat expired without a notification reaching the monitor."""
+    try:
+        offline = sweep()
+        if offline:
+            current_app.logger.info(f"Sweep marked {len(offline)} bridges offline")
+        return {'offline': offline}
+    except Exception as e:
+        current_app.logger.error(f"Error in sweep_bridge_status: {str(e)}")
+        return {'success': False, 'error': str(e)}
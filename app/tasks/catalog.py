@@ -0,0 +1,39 @@
+"""
+Public catalog snapshot tasks: debounced per-tenant rebuilds and the periodic
+catch-up for app/core/catalog.py.
+"""
+from celery import shared_task
+from flask import current_app
+from app.core import catalog
+
+
+@shared_task
+def rebuild_catalog_snapshot(org_id):
+    """Rebuilds one tenant's storefront snapshot (queued after its catalog changes)."""
+    try:
+        fields = catalog.rebuild(org_id)
+        if fields is None:
+            return {'organization_id': org_id, 'removed': True}
+        return {'organization_id': org_id, 'version': fields['version']}
+    except Exception as e:
+        current_app.logger.error(f"Error in rebuild_catalog_snapshot for org {org_id}: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def rebuild_dirty_catalogs():
+    """Rebuilds snapshots still marked dirty, missing, or older than CATALOG_MAX_AGE_SECONDS."""
+    try:
+        max_age = current_app.config.get('CATALOG_MAX_AGE_SECONDS', 3600)
+        org_ids = catalog.pending_org_ids(max_age)
+        for org_id in org_ids:
+            try:
+                catalog.rebuild(org_id)
+            except Exception as e:
+                current_app.logger.error(f"Catalog rebuild failed for org {org_id}: {str(e)}")
+        if org_ids:
+            current_app.logger.info(f"Rebuilt {len(org_ids)} catalog snapshots")
+        return {'rebuilt': len(org_ids)}
+    except Exception as e:
+        current_app.logger.error(f"Error in rebuild_dirty_catalogs: {str(e)}")
+        return {'success': False, 'error': str(e)}
@@ -1,16 +1,64 @@
 """
 Marketing tasks module for async posting to Facebook, Instagram, and other platforms.
 """
-from celery import shared_task
+from celery import shared_task, chord
+from celery.exceptions import Retry
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from app.core.extensions import db
-from app.core.models import FacebookPost, MediaContent, Organization
+from app.core.models import FacebookPost, MediaContent, Organization, ScheduledPost
+from app.core import storage
 from app.integrations.facebook import get_facebook_service
 from flask import current_app
 
+VIDEO_UPLOAD_MAX_RETRIES = 5
 
-@shared_task
-def post_video_task(org_id, message, media_url, title, fb_post_id):
+
+def upload_video(fb_service, row, message, media_url, title):
+    """
+    Uploads a video with the resumable protocol when it lives in our storage,
+    recording progress on `row` (a FacebookPost or ScheduledPost) after every
+    acknowledged chunk, so a later attempt resumes where this one stopped.
+    Videos hosted elsewhere fall back to Facebook fetching `file_url`.
+    """
+    key = storage.key_for_url(media_url)
+    if not key or not storage.get_storage().exists(key):
+        return fb_service.post_video(message, media_url, title)
+
+    def checkpoint(state):
+        row.upload_session_id = state['upload_session_id']
+        row.upload_video_id = state.get('video_id')
+        row.upload_offset = state['start_offset']
+        row.upload_size = state['file_size']
+        db.session.commit()
+
+    state = None
+    if row.upload_session_id:
+        state = {
+            'upload_session_id': row.upload_session_id,
+            'video_id': row.upload_video_id,
+            'start_offset': row.upload_offset or 0,
+            'file_size': row.upload_size,
+        }
+
+    success, video_id, error = fb_service.upload_video(key, message, title, state=state, checkpoint=checkpoint)
+    if success:
+        row.upload_session_id = None
+        row.upload_offset = row.upload_size
+    return success, video_id, error
+
+
+def retry_video_upload(task, row, error):
+    """Re-queues a failed upload that has a session to resume; returns False once retries are spent."""
+    if not row.upload_session_id or task.request.retries >= VIDEO_UPLOAD_MAX_RETRIES:
+        return False
+    db.session.commit()
+    current_app.logger.warning(f"Video upload stopped at byte {row.upload_offset} of {row.upload_size} ({error}); will resume")
+    raise task.retry(countdown=min(60 * 2 ** task.request.retries, 1800), max_retries=VIDEO_UPLOAD_MAX_RETRIES)
+
+
+@shared_task(bind=True)
+def post_video_task(self, org_id, message, media_url, title, fb_post_id):
     """
     Async task to post a video to Facebook.
     """
@@ -24,22 +72,32 @@ def post_video_task(org_id, message, media_url, title, fb_post_id):
         if not fb_service:
             raise ValueError(f"Facebook not configured for organization {org_id}")
 
+        fb_post = FacebookPost.query.get(fb_post_id)
+        if not fb_post:
+            raise ValueError(f"FacebookPost {fb_post_id} not found")
+        fb_post.status = 'uploading'
+        db.session.commit()
+
         # Post video to Facebook
-        success, post_id, error = fb_service.post_video(message, media_url, title)
+        success, post_id, error = upload_video(fb_service, fb_post, message, media_url, title)
 
         # Update the FacebookPost status
-        fb_post = FacebookPost.query.get(fb_post_id)
-        if fb_post:
-            if success:
-                fb_post.status = 'posted'
-                fb_post.facebook_post_id = post_id
-                current_app.logger.info(f"Successfully posted video to Facebook. Post ID: {post_id}")
-            else:
-                fb_post.status = 'failed'
-                current_app.logger.error(f"Failed to post video: {error}")
-            db.session.commit()
+        if success:
+            fb_post.status = 'posted'
+            fb_post.facebook_post_id = post_id
+            fb_post.error_message = None
+            fb_post.posted_at = datetime.utcnow()
+            current_app.logger.info(f"Successfully posted video to Facebook. Post ID: {post_id}")
+        else:
+            fb_post.error_message = error
+            retry_video_upload(self, fb_post, error)
+            fb_post.status = 'failed'
+            current_app.logger.error(f"Failed to post video: {error}")
+        db.session.commit()
 
         return {'success': success, 'post_id': post_id, 'error': error}
+    except Retry:
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in post_video_task: {str(e)}")
         if fb_post_id:
@@ -53,119 +111,421 @@ def post_video_task(org_id, message, media_url, title, fb_post_id):
         return {'success': False, 'error': str(e)}
 
 
+PUBLISH_MAX_RETRIES = 3
+INSTAGRAM_POLL_SECONDS = 30
+INSTAGRAM_MAX_POLLS = 20  # Reels can take several minutes to process
+
+
+def media_message(media):
+    message = f"{media.title}"
+    if media.description:
+        message += f"\n\n{media.description}"
+    return message
+
+
+def media_destinations(media):
+    """Destinations a MediaContent targets, in publishing order."""
+    return [name for name, selected in (
+        ('facebook', media.post_to_facebook),
+        ('instagram', media.post_to_instagram),
+        ('banner', media.post_to_banner),
+    ) if selected]
+
+
+def prepare_destinations(media, scheduled_time=None):
+    """
+    Ensures one ScheduledPost per destination the media targets and returns
+    the ones not yet posted. Flushes so the new rows have ids; the caller
+    commits and then dispatches (see dispatch_destinations / fan_out_media).
+    """
+    existing = {sp.destination: sp for sp in media.scheduled_posts}
+    pending = []
+    for destination in media_destinations(media):
+        scheduled = existing.get(destination)
+        if not scheduled:
+            scheduled = ScheduledPost(
+                organization_id=media.organization_id,
+                media_content_id=media.id,
+                destination=destination,
+                scheduled_time=scheduled_time or media.scheduled_post_time or datetime.utcnow(),
+                status='pending'
+            )
+            db.session.add(scheduled)
+        elif scheduled.status == 'failed':
+            scheduled.status = 'pending'
+        if scheduled.status != 'posted':
+            pending.append(scheduled)
+    db.session.flush()
+    return pending
+
+
+def dispatch_destinations(media_id, scheduled_post_ids):
+    """
+    Publishes each destination in its own publish_destination subtask (they
+    run concurrently and retry independently); finalize_media_publish runs as
+    the chord callback once every one of them has finished.
+    Must be called after the ScheduledPost rows are committed.
+    """
+    if not scheduled_post_ids:
+        finalize_media_publish.delay(media_id)
+        return
+    chord(publish_destination.si(sp_id) for sp_id in scheduled_post_ids)(finalize_media_publish.si(media_id))
+
+
+def is_retryable(error):
+    """
+    Transient Graph failures (5xx, throttling) are retried. Transport errors
+    are not: the request may have gone through, and a retry would double-post.
+    """
+    return error is not None and error.status is not None and error.is_transient
+
+
+def publish_instagram(task, fb_service, scheduled, media):
+    """
+    Instagram publishing is two steps: create a media container, then publish
+    it once Instagram has processed the media. The container id is kept in
+    upload_session_id so a retry polls the same container instead of making
+    a second one.
+    """
+    container_id = scheduled.upload_session_id
+    if not container_id:
+        container_id, error = fb_service.create_instagram_container(
+            media_message(media), media.media_url, media.media_type)
+        if not container_id:
+            return False, None, error
+        scheduled.upload_session_id = container_id
+        db.session.commit()
+
+    status = fb_service.instagram_container_status(container_id)
+    if status == 'IN_PROGRESS':
+        if task.request.retries >= INSTAGRAM_MAX_POLLS:
+            return False, None, 'Instagram is still processing the media; giving up'
+        raise task.retry(countdown=INSTAGRAM_POLL_SECONDS, max_retries=INSTAGRAM_MAX_POLLS)
+    if status in ('ERROR', 'EXPIRED'):
+        scheduled.upload_session_id = None
+        return False, None, f"Instagram could not process the media ({status})"
+
+    success, media_id, error = fb_service.publish_instagram_container(container_id)
+    if success:
+        scheduled.upload_session_id = None
+    return success, media_id, error
+
+
+@shared_task(bind=True)
+def publish_destination(self, scheduled_post_id):
+    """
+    Publishes one ScheduledPost to its destination. Runs as one branch of the
+    fan-out chord, so a slow or retrying destination never holds up the others.
+    """
+    scheduled = ScheduledPost.query.get(scheduled_post_id)
+    if not scheduled:
+        return {'success': False, 'scheduled_post_id': scheduled_post_id, 'error': 'Scheduled post not found'}
+    if scheduled.status == 'posted':
+        return {'success': True, 'scheduled_post_id': scheduled_post_id, 'destination': scheduled.destination}
+
+    media = scheduled.media_content
+    fb_service = None
+    try:
+        if scheduled.destination == 'banner':
+            # The website reads banner media straight from the database
+            success, post_id, error = True, None, None
+        else:
+            fb_service = get_facebook_service(scheduled.organization)
+            if not fb_service:
+                success, post_id, error = False, None, f"Facebook not configured for organization {scheduled.organization_id}"
+            elif scheduled.destination == 'facebook' and media.media_type == 'video':
+                success, post_id, error = upload_video(fb_service, scheduled, media_message(media), media.media_url, media.title)
+            elif scheduled.destination == 'facebook':
+                success, post_id, error = fb_service.post_photo(media_message(media), media.media_url)
+            elif scheduled.destination == 'instagram':
+                success, post_id, error = publish_instagram(self, fb_service, scheduled, media)
+            else:
+                success, post_id, error = False, None, f"Unknown destination {scheduled.destination}"
+    except Retry:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        success, post_id, error = False, None, str(e)
+
+    if success:
+        scheduled.status = 'posted'
+        scheduled.posted_time = datetime.utcnow()
+        scheduled.facebook_post_id = post_id
+        scheduled.error_message = None
+        current_app.logger.info(f"Published media {scheduled.media_content_id} to {scheduled.destination}. Post ID: {post_id}")
+    else:
+        scheduled.error_message = error
+        if scheduled.destination == 'facebook' and media.media_type == 'video':
+            retry_video_upload(self, scheduled, error)
+        elif fb_service and is_retryable(fb_service.last_error) and self.request.retries < PUBLISH_MAX_RETRIES:
+            db.session.commit()
+            raise self.retry(countdown=30 * 2 ** self.request.retries, max_retries=PUBLISH_MAX_RETRIES)
+        scheduled.status = 'failed'
+        current_app.logger.error(f"Failed to publish media {scheduled.media_content_id} to {scheduled.destination}: {error}")
+    db.session.commit()
+
+    return {'success': success, 'scheduled_post_id': scheduled_post_id, 'destination': scheduled.destination,
+            'post_id': post_id, 'error': error}
+
+
+@shared_task
+def finalize_media_publish(media_content_id):
+    """
+    Fan-out callback: derives the MediaContent status from its destinations
+    ('posted', 'partial' or 'failed'). Does nothing while any destination is
+    still pending, so it is safe to call from more than one branch.
+    """
+    media = MediaContent.query.get(media_content_id)
+    if not media:
+        return {'success': False, 'error': f"MediaContent {media_content_id} not found"}
+
+    wanted = media_destinations(media)
+    if not wanted:
+        # Nothing was published: leave the status (e.g. 'draft') alone
+        return {'media_id': media_content_id, 'status': media.status, 'complete': False}
+
+    rows = [sp for sp in media.scheduled_posts if sp.destination in wanted]
+    if len(rows) < len(wanted) or any(sp.status not in ('posted', 'failed') for sp in rows):
+        return {'media_id': media_content_id, 'status': media.status, 'complete': False}
+
+    posted = sum(1 for sp in rows if sp.status == 'posted')
+    if posted == len(rows):
+        media.status = 'posted'
+    elif posted:
+        media.status = 'partial'
+    else:
+        media.status = 'failed'
+    db.session.commit()
+
+    current_app.logger.info(f"Media {media_content_id} published to {posted}/{len(rows)} destinations: {media.status}")
+    return {'media_id': media_content_id, 'status': media.status, 'complete': True}
+
+
+@shared_task
+def fan_out_media(media_content_id):
+    """
+    Publishes a MediaContent to every destination it targets, now. Queued by
+    the upload routes after their commit.
+    """
+    try:
+        media = MediaContent.query.get(media_content_id)
+        if not media:
+            raise ValueError(f"MediaContent {media_content_id} not found")
+        if not media_destinations(media):
+            return {'media_id': media_content_id, 'destinations': []}
+
+        pending = prepare_destinations(media, scheduled_time=datetime.utcnow())
+        media.status = 'publishing'
+        db.session.commit()
+
+        dispatch_destinations(media.id, [sp.id for sp in pending])
+        return {'media_id': media_content_id, 'destinations': [sp.destination for sp in pending]}
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in fan_out_media: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
 @shared_task
 def post_media_task(org_id, message, media_url, title, media_content_id, post_to_instagram=False, media_type='image'):
     """
-    Async task to post media to Facebook and/or Instagram.
+    Kept for messages queued before the destination fan-out; publishes
+    through fan_out_media.
+    """
+    return fan_out_media(media_content_id)
+
+
+@shared_task
+def publish_facebook_batch(scheduled_post_ids):
+    """
+    Publishes several Facebook image posts for one organization in a single
+    Graph batch request, then finalizes every media item involved.
     """
+    rows = ScheduledPost.query.filter(ScheduledPost.id.in_(scheduled_post_ids)).all()
     try:
-        # Get organization and Facebook service
-        org = Organization.query.get(org_id)
-        if not org:
-            raise ValueError(f"Organization {org_id} not found")
+        if not rows:
+            return {'success': False, 'error': 'No scheduled posts found'}
 
+        org = rows[0].organization
         fb_service = get_facebook_service(org)
         if not fb_service:
-            raise ValueError(f"Facebook not configured for organization {org_id}")
-
-        # Post to Facebook based on media type
-        success = False
-        post_id = None
-        error = None
+            raise ValueError(f"Facebook not configured for organization {org.id}")
 
-        if media_type == 'video':
-            success, post_id, error = fb_service.post_video(message, media_url, title)
-        else:  # image
-            success, post_id, error = fb_service.post_photo(message, media_url)
+        results = fb_service.post_many([
+            {'message': media_message(sp.media_content), 'image_url': sp.media_content.media_url} for sp in rows
+        ])
 
-        # Update the MediaContent status
-        media = MediaContent.query.get(media_content_id)
-        if media:
+        for scheduled, (success, post_id, error) in zip(rows, results):
             if success:
-                media.status = 'posted'
-                current_app.logger.info(f"Successfully posted media {media_content_id} to Facebook. Post ID: {post_id}")
+                scheduled.status = 'posted'
+                scheduled.posted_time = datetime.utcnow()
+                scheduled.facebook_post_id = post_id
+                scheduled.error_message = None
             else:
-                media.status = 'failed'
-                current_app.logger.error(f"Failed to post media {media_content_id}: {error}")
-            db.session.commit()
+                scheduled.status = 'failed'
+                scheduled.error_message = error
+                current_app.logger.error(f"Failed to post media {scheduled.media_content_id}: {error}")
+        db.session.commit()
+        outcome = {'success': all(r[0] for r in results), 'posted': sum(1 for r in results if r[0]), 'total': len(rows)}
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in publish_facebook_batch: {str(e)}")
+        for scheduled in rows:
+            if scheduled.status != 'posted':
+                scheduled.status = 'failed'
+                scheduled.error_message = str(e)
+        db.session.commit()
+        outcome = {'success': False, 'error': str(e)}
+
+    for media_id in {sp.media_content_id for sp in rows}:
+        finalize_media_publish(media_id)
+    return outcome
+
+
+@shared_task
+def share_units_task(org_id, units):
+    """
+    Shares inventory units to the organization's Facebook page in one Graph
+    batch request. `units` are post_unit payloads built by the inventory routes.
+    """
+    try:
+        org = Organization.query.get(org_id)
+        fb_service = get_facebook_service(org) if org else None
+        if not fb_service:
+            raise ValueError(f"Facebook not configured for organization {org_id}")
 
-        return {'success': success, 'media_id': media_content_id, 'post_id': post_id, 'error': error}
+        results = fb_service.post_units(units)
+        errors = sorted({error for success, _, error in results if not success and error})
+        for error in errors:
+            current_app.logger.error(f"Failed to share units for org {org_id}: {error}")
+        return {
+            'success': not errors,
+            'organization_id': org_id,
+            'posted': sum(1 for success, _, _ in results if success),
+            'total': len(units),
+            'errors': errors
+        }
     except Exception as e:
-        current_app.logger.error(f"Error in post_media_task: {str(e)}")
-        if media_content_id:
-            try:
-                media = MediaContent.query.get(media_content_id)
-                if media:
-                    media.status = 'failed'
-                    db.session.commit()
-            except:
-                pass
-        return {'success': False, 'error': str(e)}
+        current_app.logger.error(f"Error in share_units_task: {str(e)}")
+        return {'success': False, 'organization_id': org_id, 'error': str(e)}
+
+
+SCHEDULED_POST_BATCH_SIZE = 100
+SCHEDULED_POST_MAX_BATCHES = 20  # Bound one beat run; the next minute picks up the rest
+
+
+def claim_due_posts(now, batch_size=SCHEDULED_POST_BATCH_SIZE):
+    """
+    Locks up to `batch_size` due scheduled posts with FOR UPDATE SKIP LOCKED,
+    so overlapping beat runs (or several workers) never claim the same row.
+    The locks are held until the caller commits the batch.
+    """
+    return MediaContent.query.options(
+        # prepare_destinations reads each media's scheduled_posts: one query for the batch
+        selectinload(MediaContent.scheduled_posts)
+    ).filter(
+        MediaContent.status == 'scheduled',
+        MediaContent.scheduled_post_time <= now
+    ).order_by(
+        MediaContent.scheduled_post_time, MediaContent.id
+    ).limit(batch_size).with_for_update(skip_locked=True, of=MediaContent).all()
+
 
 @shared_task
 def process_scheduled_posts():
     """
     Periodic task to check for scheduled posts that are due and post them.
     This should be called every minute via Celery Beat.
+
+    Posts are claimed in batches: each batch is locked, given one
+    ScheduledPost per destination, marked publishing and committed once, and
+    the publishing tasks are queued only after that commit, so a post can
+    never be queued twice.
     """
     try:
         current_app.logger.info("Processing scheduled posts...")
 
-        # Find all scheduled posts where scheduled_post_time <= now
         now = datetime.utcnow()
-        due_posts = MediaContent.query.filter(
-            MediaContent.status == 'scheduled',
-            MediaContent.scheduled_post_time <= now
-        ).all()
+        posted_count = claimed_count = 0
 
-        current_app.logger.info(f"Found {len(due_posts)} posts due for posting")
+        for _ in range(SCHEDULED_POST_MAX_BATCHES):
+            batch = claim_due_posts(now)
+            if not batch:
+                break
+            claimed_count += len(batch)
 
-        posted_count = 0
-        for media in due_posts:
-            try:
-                # Check if organization exists and has Facebook configured
-                org = Organization.query.get(media.organization_id)
-                if not org:
-                    current_app.logger.warning(f"Organization {media.organization_id} not found for media {media.id}")
-                    continue
-
-                fb_configured = bool(org.facebook_page_id and org.facebook_access_token)
-
-                # Build message
-                message = f"{media.title}"
-                if media.description:
-                    message += f"\n\n{media.description}"
-
-                # Post to Facebook if enabled
-                if media.post_to_facebook and fb_configured:
-                    current_app.logger.info(f"Posting media {media.id} to Facebook...")
-                    post_media_task.delay(
-                        org.id,
-                        message,
-                        media.media_url,
-                        media.title,
-                        media.id,
-                        post_to_instagram=media.post_to_instagram,
-                        media_type=media.media_type
-                    )
-                    posted_count += 1
-
-                # Update status to posted (or pending if still posting)
-                media.status = 'posted'
-                db.session.commit()
-                current_app.logger.info(f"Marked media {media.id} as posted and queued for social posting")
-
-            except Exception as e:
-                current_app.logger.error(f"Error processing scheduled post {media.id}: {str(e)}")
+            # One query for every organization in the batch
+            org_ids = {media.organization_id for media in batch}
+            orgs = {org.id: org for org in Organization.query.filter(Organization.id.in_(org_ids)).all()}
+
+            prepared = []
+            for media in batch:
                 try:
+                    if media.organization_id not in orgs:
+                        current_app.logger.warning(f"Organization {media.organization_id} not found for media {media.id}")
+                        media.status = 'failed'
+                        continue
+
+                    pending = prepare_destinations(media)
+                    media.status = 'publishing'
+                    prepared.append((media, pending))
+
+                except Exception as e:
+                    current_app.logger.error(f"Error processing scheduled post {media.id}: {str(e)}")
                     media.status = 'failed'
-                    db.session.commit()
-                except:
-                    pass
 
-        current_app.logger.info(f"Processed {posted_count} scheduled posts")
-        return {'processed': posted_count}
+            # Releases the row locks; only now are the posts safe to hand off
+            db.session.commit()
+
+            # Facebook images for the same page go out as one Graph batch request;
+            # every other destination gets its own concurrent subtask
+            by_media = {}
+            image_bursts = {}
+            for media, pending in prepared:
+                by_media[media.id] = []
+                for scheduled in pending:
+                    if scheduled.destination == 'facebook' and media.media_type != 'video':
+                        image_bursts.setdefault(media.organization_id, []).append((media.id, scheduled.id))
+                    else:
+                        by_media[media.id].append(scheduled.id)
+
+            for org_id, posts in image_bursts.items():
+                if len(posts) == 1:
+                    media_id, sp_id = posts[0]
+                    by_media[media_id].append(sp_id)
+                else:
+                    current_app.logger.info(f"Posting {len(posts)} media items for org {org_id} to Facebook in one batch...")
+                    publish_facebook_batch.delay([sp_id for _, sp_id in posts])
+
+            for media_id, sp_ids in by_media.items():
+                dispatch_destinations(media_id, sp_ids)
+            posted_count += len(prepared)
+
+            if len(batch) < SCHEDULED_POST_BATCH_SIZE:
+                break
+
+        current_app.logger.info(f"Processed {claimed_count} scheduled posts ({posted_count} queued for publishing)")
+        return {'processed': posted_count, 'claimed': claimed_count}
 
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error in process_scheduled_posts: {str(e)}")
         return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def reap_stale_chunk_uploads():
+    """
+    Periodic task: delete chunked-upload sessions that have seen no activity
+    for CHUNK_UPLOAD_TTL_HOURS, so abandoned uploads stop holding temp disk.
+    """
+    from app.modules.marketing import chunk_upload
+    try:
+        ttl_seconds = current_app.config.get('CHUNK_UPLOAD_TTL_HOURS', 24) * 3600
+        reaped, freed = chunk_upload.reap_stale_sessions(ttl_seconds)
+        usage = chunk_upload.temp_usage()
+        current_app.logger.info(f"Reaped {reaped} stale upload sessions ({freed} bytes); {usage['sessions']} sessions holding {usage['total_bytes']} bytes remain")
+        return {'reaped': reaped, 'freed_bytes': freed, 'remaining_bytes': usage['total_bytes']}
+    except Exception as e:
+        current_app.logger.error(f"Error in reap_stale_chunk_uploads: {str(e)}")
+        return {'success': False, 'error': str(e)}
@@ -0,0 +1,269 @@
+"""
+Media processing tasks: video transcoding, thumbnail extraction and
+responsive image variants.
+"""
+import os
+from celery import shared_task
+from flask import current_app
+from sqlalchemy.orm.attributes import flag_modified
+from app.core.extensions import db
+from app.core.models import MediaContent, UnitImage, Unit, Organization
+from app.core import video, images, storage
+
+
+def _renditions_prefix(src_key):
+    """Derived files live next to the (content-addressed) original: .../renditions/<stem>."""
+    directory, filename = src_key.rsplit('/', 1)
+    return f"{directory}/renditions/{os.path.splitext(filename)[0]}"
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=300)
+def transcode_media_video(self, media_content_id):
+    """
+    Produces a faststart H.264/AAC MP4 and an adaptive HLS ladder for a video
+    promotion, then points media_url at the MP4. The uploaded file is kept and
+    recorded as original_url, so playback falls back to it if anything fails.
+
+    Renditions are stored next to the (content-addressed) original under
+    renditions/<file stem>/, so a deduplicated re-upload reuses them.
+    """
+    media = MediaContent.query.get(media_content_id)
+    if not media or media.media_type != 'video':
+        return {'success': False, 'error': 'Not a video'}
+
+    store = storage.get_storage()
+    original_url = media.original_url or media.media_url
+    src_key = store.key_for_url(original_url)
+    if not src_key or not store.exists(src_key):
+        return {'success': False, 'error': f'Original not found for {original_url}'}
+
+    if not video.ffmpeg_available():
+        current_app.logger.warning("ffmpeg not installed; serving original video as-is")
+        media.transcode_status = 'skipped'
+        db.session.commit()
+        return {'success': False, 'error': 'ffmpeg not available'}
+
+    prefix = _renditions_prefix(src_key)
+    web_key = f"{prefix}/web.mp4"
+    master_key = f"{prefix}/hls/master.m3u8"
+
+    try:
+        media.original_url = original_url
+        media.transcode_status = 'processing'
+        db.session.commit()
+
+        with store.local_copy(src_key) as src, store.work_dir() as work_dir:
+            info = video.probe(src)
+
+            if not store.exists(web_key):
+                web_mp4 = os.path.join(work_dir, 'web.mp4')
+                video.transcode_web_mp4(src, web_mp4)
+                store.put_file(web_key, web_mp4, content_type='video/mp4', move=True)
+            if not store.exists(master_key):
+                hls_dir = os.path.join(work_dir, 'hls')
+                video.build_hls(src, hls_dir, info['height'], info['has_audio'])
+                store.put_tree(f"{prefix}/hls", hls_dir)
+
+        # Row lock, re-reading the row over the stale identity-map copy: the thumbnail task also merges into renditions
+        media = MediaContent.query.filter_by(id=media_content_id).populate_existing().with_for_update().first()
+        media.renditions = {
+            **(media.renditions or {}),
+            'mp4': storage.url_like(original_url, web_key),
+            'hls': storage.url_like(original_url, master_key),
+            'width': info['width'],
+            'height': info['height'],
+            'duration': info['duration'],
+        }
+        media.media_url = media.renditions['mp4']
+        media.transcode_status = 'ready'
+        db.session.commit()
+
+        current_app.logger.info(f"Transcoded media {media_content_id}: {media.renditions['mp4']}")
+        return {'success': True, 'renditions': media.renditions}
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error transcoding media {media_content_id}: {str(e)}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        media = MediaContent.query.get(media_content_id)
+        if media:
+            media.transcode_status = 'failed'
+            db.session.commit()
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def generate_media_thumbnails(self, media_content_id):
+    """
+    Extracts a representative (non-black) frame from a video promotion at
+    several widths and patches thumbnail_url with the 640px one. Any
+    client-generated thumbnail saved at upload time is only a placeholder.
+    """
+    media = MediaContent.query.get(media_content_id)
+    if not media or media.media_type != 'video':
+        return {'success': False, 'error': 'Not a video'}
+
+    store = storage.get_storage()
+    source_url = media.original_url or media.media_url
+    src_key = store.key_for_url(source_url)
+    if not src_key or not store.exists(src_key):
+        return {'success': False, 'error': f'Video not found for {source_url}'}
+    if not video.ffmpeg_available():
+        return {'success': False, 'error': 'ffmpeg not available'}
+
+    prefix = _renditions_prefix(src_key)
+
+    try:
+        thumb_keys = {w: f"{prefix}/thumb_{w}.jpg" for w in video.THUMBNAIL_WIDTHS}
+        if not all(store.exists(k) for k in thumb_keys.values()):
+            # Otherwise a deduplicated upload: frames already extracted
+            with store.local_copy(src_key) as src, store.work_dir() as work_dir:
+                duration = video.probe(src)['duration']
+                for width, path in video.build_thumbnails(src, work_dir, duration).items():
+                    store.put_file(thumb_keys[width], path, content_type='image/jpeg', move=True)
+
+        urls = {str(w): storage.url_like(source_url, k) for w, k in thumb_keys.items()}
+
+        # Row lock, re-reading the row over the stale identity-map copy: the transcode task also merges into renditions
+        media = MediaContent.query.filter_by(id=media_content_id).populate_existing().with_for_update().first()
+        media.renditions = {**(media.renditions or {}), 'thumbnails': urls}
+        media.thumbnail_url = urls['640']
+        db.session.commit()
+
+        current_app.logger.info(f"Generated thumbnails for media {media_content_id}")
+        return {'success': True, 'thumbnails': urls}
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error generating thumbnails for media {media_content_id}: {str(e)}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return {'success': False, 'error': str(e)}
+
+
+def _variant_key(manifest, width, fmt='jpeg'):
+    """Storage key of the widest `fmt` variant not wider than `width`."""
+    candidates = [v for v in manifest.get('variants', []) if v['format'] in (fmt, 'png')]
+    fitting = [v for v in candidates if v['width'] <= width] or candidates
+    if not fitting:
+        return None
+    return max(fitting, key=lambda v: v['width'])['key']
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def generate_media_image_variants(self, media_content_id):
+    """
+    Builds responsive variants for an image promotion and points
+    thumbnail_url at the 640px JPEG instead of the full-size original.
+    """
+    media = MediaContent.query.get(media_content_id)
+    if not media or media.media_type != 'image':
+        return {'success': False, 'error': 'Not an image'}
+
+    try:
+        manifest = images.build_variants_for_url(media.media_url, media.organization_id)
+        if not manifest:
+            return {'success': False, 'error': f'Image not found for {media.media_url}'}
+
+        thumb_key = _variant_key(manifest, 640)
+        media = MediaContent.query.filter_by(id=media_content_id).populate_existing().with_for_update().first()
+        media.renditions = {**(media.renditions or {}), 'variants': manifest}
+        if thumb_key:
+            media.thumbnail_url = storage.url_like(media.media_url, thumb_key)
+        db.session.commit()
+
+        current_app.logger.info(f"Generated {len(manifest['variants'])} image variants for media {media_content_id}")
+        return {'success': True, 'variants': len(manifest['variants'])}
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error generating variants for media {media_content_id}: {str(e)}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def generate_unit_image_variants(self, unit_image_ids):
+    """Builds responsive variants for inventory photos (a list of UnitImage ids)."""
+    if isinstance(unit_image_ids, int):
+        unit_image_ids = [unit_image_ids]
+
+    try:
+        rows = db.session.query(UnitImage, Unit.organization_id).join(
+            Unit, UnitImage.unit_id == Unit.id
+        ).filter(UnitImage.id.in_(unit_image_ids)).all()
+
+        done = 0
+        for image, org_id in rows:
+            manifest = images.build_variants_for_url(image.image_url, org_id)
+            if manifest:
+                image.variants = manifest
+                done += 1
+        db.session.commit()
+
+        current_app.logger.info(f"Generated variants for {done} inventory images")
+        return {'success': True, 'images': done}
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error generating inventory image variants: {str(e)}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def generate_logo_variants(self, org_id):
+    """
+    Builds responsive variants for the organisation logo and brand logos and
+    stores the manifests in theme_config (logo_variants, brand_logo_variants).
+    """
+    try:
+        org = Organization.query.get(org_id)
+        if not org:
+            return {'success': False, 'error': 'Organization not found'}
+
+        # Build and upload without holding the row: this is the slow part
+        theme = org.theme_config or {}
+        logo_url = theme.get('logo_url')
+        logo_variants = images.build_variants_for_url(logo_url, org_id) if logo_url else None
+
+        brand_logos = dict(theme.get('brand_logos') or {})
+        brand_variants = {}
+        for slot, url in brand_logos.items():
+            if url:
+                manifest = images.build_variants_for_url(url, org_id)
+                if manifest:
+                    brand_variants[slot] = manifest
+
+        # Short row lock to merge into the current theme_config (settings may have changed meanwhile).
+        # Manifests for a logo that was replaced in the meantime are dropped; its own task covers it.
+        org = Organization.query.filter_by(id=org_id).populate_existing().with_for_update().first()
+        theme = dict(org.theme_config or {})
+        if theme.get('logo_url') == logo_url:
+            theme['logo_variants'] = logo_variants
+        previous = theme.get('brand_logo_variants') or {}
+        merged = {}
+        for slot, url in (theme.get('brand_logos') or {}).items():
+            if url and url == brand_logos.get(slot):
+                if slot in brand_variants:
+                    merged[slot] = brand_variants[slot]
+            elif url and slot in previous:
+                merged[slot] = previous[slot]
+        theme['brand_logo_variants'] = merged
+
+        org.theme_config = theme
+        flag_modified(org, 'theme_config')
+        db.session.commit()
+
+        current_app.logger.info(f"Generated logo variants for org {org_id}")
+        return {'success': True, 'brand_logos': len(brand_variants)}
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error generating logo variants for org {org_id}: {str(e)}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return {'success': False, 'error': str(e)}
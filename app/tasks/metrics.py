@@ -0,0 +1,30 @@
+"""
+Dashboard metrics tasks: periodic recomputation of the Redis counters in
+app/core/metrics.py, which catches drift from writes that bypass the ORM.
+"""
+from celery import shared_task
+from flask import current_app
+from app.core.metrics import refresh_platform_metrics, refresh_org_metrics
+
+
+@shared_task
+def refresh_platform_metrics_task():
+    """Recomputes tenant totals and the offline-bridge list."""
+    try:
+        metrics = refresh_platform_metrics()
+        return {'total_dealers': metrics['total_dealers'], 'offline': metrics['offline_count']}
+    except Exception as e:
+        current_app.logger.error(f"Error in refresh_platform_metrics_task: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def refresh_tenant_metrics_task():
+    """Recomputes the per-tenant parts / web-unit counters for every tenant."""
+    try:
+        counters = refresh_org_metrics()
+        current_app.logger.info(f"Refreshed dashboard metrics for {len(counters)} tenants")
+        return {'tenants': len(counters)}
+    except Exception as e:
+        current_app.logger.error(f"Error in refresh_tenant_metrics_task: {str(e)}")
+        return {'success': False, 'error': str(e)}
@@ -0,0 +1,90 @@
+"""
+Notification tasks: bulk fan-out of mention/assignment notifications and
+reconciliation of the per-user unread counters kept in Redis.
+"""
+from celery import shared_task
+from flask import current_app
+from sqlalchemy import insert, func
+from app.core.extensions import db
+from app.core.models import Notification, User
+from app.core.notifications import incr_unread, unread_key
+from app.core.cache import get_redis
+from app.core.events import publish_event
+
+
+@shared_task
+def fan_out_notifications(org_id, usernames, message, case_id=None, note_id=None, dealer_note_id=None):
+    """
+    Resolves usernames within the tenant and bulk-inserts one Notification per
+    recipient in a single statement, then bumps their unread counters.
+    """
+    try:
+        recipient_ids = [row.id for row in db.session.query(User.id).filter(
+            User.organization_id == org_id,
+            User.username.in_(usernames)
+        )]
+        if not recipient_ids:
+            return {'created': 0}
+
+        rows = [{
+            'organization_id': org_id,
+            'recipient_id': recipient_id,
+            'case_id': case_id,
+            'note_id': note_id,
+            'dealer_note_id': dealer_note_id,
+            'message': message,
+            'is_read': False
+        } for recipient_id in recipient_ids]
+
+        db.session.execute(insert(Notification), rows)
+        db.session.commit()
+
+        counts = incr_unread(recipient_ids)
+
+        for recipient_id in recipient_ids:
+            publish_event(org_id, 'notification', {
+                'message': message,
+                'case_id': case_id,
+                'unread': counts.get(recipient_id)
+            }, user_id=recipient_id)
+
+        current_app.logger.info(f"Created {len(rows)} notifications for org {org_id}")
+        return {'created': len(rows)}
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in fan_out_notifications: {str(e)}")
+        return {'created': 0, 'error': str(e)}
+
+
+@shared_task
+def reconcile_unread_counters(user_ids=None):
+    """
+    Rebuilds unread counters from the (recipient_id, is_read) index.
+    With user_ids, only those users are refreshed (cold badge keys);
+    without, every tracked counter is refreshed (periodic beat job).
+    """
+    try:
+        query = db.session.query(Notification.recipient_id, func.count(Notification.id)).filter(
+            Notification.is_read == False
+        )
+        if user_ids:
+            query = query.filter(Notification.recipient_id.in_(user_ids))
+        counts = dict(query.group_by(Notification.recipient_id).all())
+
+        r = get_redis()
+        if user_ids:
+            keys = [unread_key(user_id) for user_id in user_ids]
+        else:
+            keys = list(r.scan_iter(match=unread_key('*'), count=1000))
+            keys += [unread_key(user_id) for user_id in counts]
+
+        pipe = r.pipeline(transaction=False)
+        for key in set(keys):
+            user_id = int(key.rsplit(':', 1)[1])
+            pipe.set(key, counts.get(user_id, 0))
+        pipe.execute()
+
+        return {'reconciled': len(set(keys))}
+    except Exception as e:
+        current_app.logger.error(f"Error in reconcile_unread_counters: {str(e)}")
+        return {'reconciled': 0, 'error': str(e)}
@@ -0,0 +1,23 @@
+"""
+Search index maintenance.
+"""
+from celery import shared_task
+from flask import current_app
+from app.core.extensions import db
+from app.core.search import rebuild_index
+
+
+@shared_task
+def rebuild_search_index(org_id=None):
+    """
+    Rebuilds search_document from the source tables. Run after bulk imports
+    (POS sync, CSV uploads) that write with Core statements and so never pass
+    through the after-flush hook.
+    """
+    try:
+        total = rebuild_index(org_id)
+        return {'success': True, 'documents': total}
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error rebuilding search index: {str(e)}")
+        return {'success': False, 'error': str(e)}
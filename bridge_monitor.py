@@ -0,0 +1,13 @@
+"""
+POS bridge presence monitor.
+Turns heartbeat-key expiry in Redis into bridge offline events: python bridge_monitor.py
+"""
+import os
+from app import create_app
+from app.core.heartbeats import listen_for_expiry
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'prod')
+
+if __name__ == '__main__':
+    with app.app_context():
+        listen_for_expiry()
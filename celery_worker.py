@@ -25,6 +25,34 @@ celery.conf.update(
             'task': 'app.tasks.marketing.process_scheduled_posts',
             'schedule': crontab(minute='*'),  # Run every minute
         },
+        'reconcile-unread-counters': {
+            'task': 'app.tasks.notifications.reconcile_unread_counters',
+            'schedule': crontab(minute='*/10'),
+        },
+        'refresh-platform-metrics': {
+            'task': 'app.tasks.metrics.refresh_platform_metrics_task',
+            'schedule': crontab(minute='*'),  # Offline-bridge alerts stay within a minute
+        },
+        'refresh-tenant-metrics': {
+            'task': 'app.tasks.metrics.refresh_tenant_metrics_task',
+            'schedule': crontab(minute='*/10'),
+        },
+        'flush-bridge-heartbeats': {
+            'task': 'app.tasks.bridge.flush_bridge_heartbeats',
+            'schedule': crontab(minute='*'),
+        },
+        'sweep-bridge-status': {
+            'task': 'app.tasks.bridge.sweep_bridge_status',
+            'schedule': crontab(minute='*/5'),  # Backstop for missed expiry notifications
+        },
+        'rebuild-dirty-catalogs': {
+            'task': 'app.tasks.catalog.rebuild_dirty_catalogs',
+            'schedule': crontab(minute='*/5'),
+        },
+        'reap-stale-chunk-uploads': {
+            'task': 'app.tasks.marketing.reap_stale_chunk_uploads',
+            'schedule': crontab(minute=15),  # Hourly
+        },
     },
 )
 
@@ -16,13 +16,23 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         'connect_args': {
             'client_encoding': 'utf8'
-        }
+        },
+        # One pool per gevent worker: greenlets past pool_size + max_overflow queue for a
+        # connection (up to pool_timeout). See /api/v1/super_admin/db-pool-metrics.
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))
     }
     
     # Celery
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 
+    # Redis (counters, caches, pub/sub)
+    REDIS_URL = os.environ.get('REDIS_URL', CELERY_BROKER_URL)
+
     # Mail
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -34,13 +44,54 @@ class Config:
     # Uploads
     gcs_bucket = os.environ.get('GCS_BUCKET')  # Renamed to gcs_bucket for Celery compatibility
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB for video uploads
+    # Chunked upload staging; keep on the same volume as static/uploads so completion is a rename
+    CHUNK_UPLOAD_DIR = os.environ.get('CHUNK_UPLOAD_DIR')
+    CHUNK_UPLOAD_TTL_HOURS = int(os.environ.get('CHUNK_UPLOAD_TTL_HOURS', 24))
+    CHUNK_QUOTA_ORG_BYTES = int(os.environ.get('CHUNK_QUOTA_ORG_BYTES', 2 * 1024 * 1024 * 1024))  # 2GB per tenant
+    CHUNK_QUOTA_TOTAL_BYTES = int(os.environ.get('CHUNK_QUOTA_TOTAL_BYTES', 8 * 1024 * 1024 * 1024))  # 8GB overall
+    # Storage backend for uploads: 'local' (static/uploads), 's3' (AWS/MinIO/R2) or 'gcs'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_BUCKET = os.environ.get('STORAGE_BUCKET', gcs_bucket)
+    STORAGE_ENDPOINT_URL = os.environ.get('STORAGE_ENDPOINT_URL')  # e.g. http://minio:9000
+    STORAGE_REGION = os.environ.get('STORAGE_REGION')
+    STORAGE_ACCESS_KEY = os.environ.get('STORAGE_ACCESS_KEY')
+    STORAGE_SECRET_KEY = os.environ.get('STORAGE_SECRET_KEY')
+    STORAGE_PUBLIC_URL = os.environ.get('STORAGE_PUBLIC_URL')  # CDN / public bucket base URL
+    STORAGE_MAX_POOL_CONNECTIONS = int(os.environ.get('STORAGE_MAX_POOL_CONNECTIONS', 32))
+    # Internal nginx location that aliases static/uploads (e.g. /_protected_uploads/); unset = Flask streams
+    MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX')
 
     # CSRF Protection
     WTF_CSRF_ENABLED = False  # Disabled for multi-tenant setup with custom domains and proxies
 
+    # Storefront catalog snapshots (app/core/catalog.py)
+    CATALOG_REBUILD_DELAY_SECONDS = int(os.environ.get('CATALOG_REBUILD_DELAY_SECONDS', 10))  # Debounce window
+    CATALOG_MAX_AGE_SECONDS = int(os.environ.get('CATALOG_MAX_AGE_SECONDS', 3600))
+    CATALOG_SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR')  # Optional: also write JSON files here
+
+    # Password hashing (app/core/passwords.py); None uses werkzeug's current default
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD')
+    PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', 4))
+    # Upper bound on how long a session-cached user identity is trusted (app/core/identity.py)
+    IDENTITY_CACHE_SECONDS = int(os.environ.get('IDENTITY_CACHE_SECONDS', 300))
+
     # Facebook
     FACEBOOK_APP_ID = os.environ.get('FACEBOOK_APP_ID')
     FACEBOOK_APP_SECRET = os.environ.get('FACEBOOK_APP_SECRET')
+    # Graph API base URL; point at a local stub server in tests
+    FACEBOOK_GRAPH_URL = os.environ.get('FACEBOOK_GRAPH_URL', 'https://graph.facebook.com/v21.0')
+    FACEBOOK_GRAPH_POOL_SIZE = int(os.environ.get('FACEBOOK_GRAPH_POOL_SIZE', 20))
+    # Token-bucket budgets (requests/second) before Graph's usage headers scale them down
+    FACEBOOK_GRAPH_APP_RATE = float(os.environ.get('FACEBOOK_GRAPH_APP_RATE', 50))
+    FACEBOOK_GRAPH_PAGE_RATE = float(os.environ.get('FACEBOOK_GRAPH_PAGE_RATE', 5))
+
+    # POS bridge heartbeats (app/core/heartbeats.py)
+    BRIDGE_OFFLINE_AFTER_SECONDS = int(os.environ.get('BRIDGE_OFFLINE_AFTER_SECONDS', 3600))
+    # last_bridge_heartbeat is only rewritten once it is this stale
+    BRIDGE_HEARTBEAT_DB_RESOLUTION_SECONDS = int(os.environ.get('BRIDGE_HEARTBEAT_DB_RESOLUTION_SECONDS', 600))
+    # Bridge key auth cache (app/core/bridge_auth.py) and how long a rotated-out key stays valid
+    BRIDGE_KEY_CACHE_SECONDS = int(os.environ.get('BRIDGE_KEY_CACHE_SECONDS', 60))
+    BRIDGE_KEY_ROTATION_OVERLAP_SECONDS = int(os.environ.get('BRIDGE_KEY_ROTATION_OVERLAP_SECONDS', 86400))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -52,6 +103,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     WTF_CSRF_ENABLED = False
 
 config_by_name = {
@@ -2,6 +2,7 @@
 
 import { useEffect, useState, use } from 'react';
 import { InventoryItem, DealerConfig } from '@/lib/types';
+import { getCatalog } from '@/lib/catalog';
 import Link from 'next/link';
 
 export default function InventoryDetailPage({ params }: { params: Promise<{ id: string }> }) {
@@ -12,11 +13,35 @@ export default function InventoryDetailPage({ params }: { params: Promise<{ id:
     const [error, setError] = useState<string | null>(null);
 
     useEffect(() => {
-        // Fetch Unit Details
-        fetch(`/api/v1/inventory/${id}`)
-            .then(res => {
-                if (!res.ok) throw new Error('Unit not found');
-                return res.json();
+        // Unit and contact details come from the precomputed catalog snapshot
+        getCatalog()
+            .catch(err => {
+                console.error("Catalog snapshot unavailable", err);
+                return null;
+            })
+            .then(catalog => {
+                if (!catalog) {
+                    return fetch(`/api/v1/inventory/${id}`).then(res => {
+                        if (!res.ok) throw new Error('Unit not found');
+                        return res.json();
+                    });
+                }
+                setConfig({
+                    name: catalog.site.identity.name,
+                    slug: catalog.site.identity.slug,
+                    modules: {},
+                    theme: {
+                        contact_email: catalog.site.contact.email || undefined,
+                        contact_phone: catalog.site.contact.phone || undefined
+                    }
+                });
+                const unit = catalog.units.find(u => String(u.id) === id);
+                if (unit) return unit;
+                // Not in the snapshot (e.g. listed moments ago): ask the live endpoint
+                return fetch(`/api/v1/inventory/${id}`).then(res => {
+                    if (!res.ok) throw new Error('Unit not found');
+                    return res.json();
+                });
             })
             .then(data => {
                 setItem(data);
@@ -27,24 +52,6 @@ export default function InventoryDetailPage({ params }: { params: Promise<{ id:
                 setError(err.message);
                 setLoading(false);
             });
-
-        // Fetch Site Info for Contact Info
-        fetch('/api/v1/site-info')
-            .then(res => res.json())
-            .then(data => {
-                // Quick adaptation
-                const adapted: DealerConfig = {
-                    name: data.identity?.name,
-                    slug: data.identity?.slug,
-                    modules: {},
-                    theme: {
-                        contact_email: data.theme?.contact_email,
-                        contact_phone: data.theme?.contact_phone
-                    }
-                };
-                setConfig(adapted);
-            })
-            .catch(err => console.error("Failed to load site info", err));
     }, [id]);
 
     if (loading) return <div className="p-8 text-center text-gray-500">Loading Unit Details...</div>;
@@ -1,60 +1,90 @@
 "use client";
 
 import { useEffect, useState } from 'react';
-import { InventoryItem } from '@/lib/types';
+import { InventoryItem, InventoryFacets } from '@/lib/types';
+import { searchInventory } from '@/lib/inventory';
 import Link from 'next/link';
 
+const PAGE_SIZE = 24;
+
 export default function InventoryPage() {
     const [items, setItems] = useState<InventoryItem[]>([]);
+    const [total, setTotal] = useState(0);
+    const [page, setPage] = useState(1);
+    const [pages, setPages] = useState(1);
     const [loading, setLoading] = useState(true);
-    const [filterOptions, setFilterOptions] = useState<{ manufacturers: string[], types: string[] }>({ manufacturers: [], types: [] });
+    const [facets, setFacets] = useState<InventoryFacets | null>(null);
 
     // Filter State
     const [filterType, setFilterType] = useState('manufacturer'); // 'manufacturer' or 'type'
     const [filterValue, setFilterValue] = useState('');
+    const [searchText, setSearchText] = useState('');
+    const [query, setQuery] = useState('');
     const [sortBy, setSortBy] = useState('price');
-    const [sortOrder, setSortOrder] = useState('desc');
+    const [sortOrder, setSortOrder] = useState<'asc' | 'desc'>('desc');
+
+    // Debounce the text box
+    useEffect(() => {
+        const timer = setTimeout(() => setQuery(searchText.trim()), 300);
+        return () => clearTimeout(timer);
+    }, [searchText]);
 
+    // Filters changed: start over at page 1
     useEffect(() => {
-        // Fetch Filter Options
-        fetch('/api/v1/inventory/filters')
-            .then(res => res.json())
-            .then(data => setFilterOptions(data))
-            .catch(err => console.error("Failed to load filters", err));
-    }, []);
+        setPage(1);
+    }, [filterType, filterValue, query, sortBy, sortOrder]);
 
+    // Results and facet counts come back together
     useEffect(() => {
-        setLoading(true);
-        const params = new URLSearchParams();
-        if (filterValue) {
-            params.append(filterType, filterValue);
-        }
-        params.append('sort', sortBy);
-        params.append('order', sortOrder);
-
-        fetch(`/api/v1/inventory?${params.toString()}`)
-            .then(res => res.json())
+        const controller = new AbortController();
+        setLoading(page === 1);
+        searchInventory({
+            q: query,
+            manufacturer: filterType === 'manufacturer' && filterValue ? [filterValue] : undefined,
+            type: filterType === 'type' && filterValue ? [filterValue] : undefined,
+            sort: sortBy,
+            order: sortOrder,
+            page,
+            per_page: PAGE_SIZE,
+        }, controller.signal)
             .then(data => {
-                setItems(data);
+                setItems(prev => page === 1 ? data.results : [...prev, ...data.results]);
+                setTotal(data.total);
+                setPages(data.pages);
+                setFacets(data.facets);
                 setLoading(false);
             })
             .catch(err => {
+                if (err.name === 'AbortError') return;
                 console.error("Failed to load inventory", err);
                 setLoading(false);
             });
-    }, [filterType, filterValue, sortBy, sortOrder]);
+        return () => controller.abort();
+    }, [filterType, filterValue, query, sortBy, sortOrder, page]);
 
     const handleFilterTypeChange = (e: React.ChangeEvent<HTMLSelectElement>) => {
         setFilterType(e.target.value);
         setFilterValue(''); // Reset value when type changes
     };
 
+    const filterOptions = (filterType === 'manufacturer' ? facets?.manufacturers : facets?.types) || [];
+
     return (
         <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-12">
             <h1 className="text-4xl font-extrabold text-gray-900 mb-8 border-b pb-4">New Inventory</h1>
 
             {/* Filter Bar */}
             <div className="bg-white p-6 rounded-2xl shadow-sm border border-gray-100 mb-10">
+                <div className="mb-6">
+                    <label className="block text-sm font-semibold text-gray-700 mb-2">Search</label>
+                    <input
+                        type="search"
+                        value={searchText}
+                        onChange={(e) => setSearchText(e.target.value)}
+                        placeholder="Model, brand or keyword"
+                        className="w-full h-12 px-4 rounded-xl border-gray-200 bg-gray-50 focus:ring-2 focus:ring-blue-500 focus:bg-white transition-all text-gray-900"
+                    />
+                </div>
                 <div className="grid grid-cols-1 md:grid-cols-4 gap-6 items-end">
                     {/* Select Filter Category */}
                     <div>
@@ -80,8 +110,8 @@ export default function InventoryPage() {
                             className="w-full h-12 rounded-xl border-gray-200 bg-gray-50 focus:ring-2 focus:ring-blue-500 focus:bg-white transition-all text-gray-900"
                         >
                             <option value="">All {filterType === 'manufacturer' ? 'Manufacturers' : 'Equipment'}</option>
-                            {(filterType === 'manufacturer' ? filterOptions.manufacturers : filterOptions.types).map(opt => (
-                                <option key={opt} value={opt}>{opt}</option>
+                            {filterOptions.map(opt => (
+                                <option key={opt.value} value={opt.value}>{opt.value} ({opt.count})</option>
                             ))}
                         </select>
                     </div>
@@ -94,7 +124,7 @@ export default function InventoryPage() {
                             onChange={(e) => {
                                 const [s, o] = e.target.value.split('-');
                                 setSortBy(s);
-                                setSortOrder(o);
+                                setSortOrder(o as 'asc' | 'desc');
                             }}
                             className="w-full h-12 rounded-xl border-gray-200 bg-gray-50 focus:ring-2 focus:ring-blue-500 focus:bg-white transition-all text-gray-900"
                         >
@@ -109,11 +139,11 @@ export default function InventoryPage() {
                     {/* Results Count/Clear */}
                     <div className="flex items-center justify-between md:justify-end gap-4 h-12">
                         <span className="text-sm text-gray-500 font-medium">
-                            {loading ? '...' : items.length} Units Found
+                            {loading ? '...' : total} Units Found
                         </span>
-                        {filterValue && (
+                        {(filterValue || searchText) && (
                             <button
-                                onClick={() => setFilterValue('')}
+                                onClick={() => { setFilterValue(''); setSearchText(''); }}
                                 className="text-sm font-bold text-blue-600 hover:text-blue-800"
                             >
                                 Clear Filters X
@@ -131,7 +161,7 @@ export default function InventoryPage() {
                 <div className="text-center py-24 bg-gray-50 rounded-3xl border-2 border-dashed border-gray-200">
                     <p className="text-gray-500 text-xl font-medium">No results match your current filters.</p>
                     <button
-                        onClick={() => { setFilterValue(''); setFilterType('manufacturer'); }}
+                        onClick={() => { setFilterValue(''); setSearchText(''); setFilterType('manufacturer'); }}
                         className="mt-4 text-blue-600 font-bold underline"
                     >
                         View all inventory
@@ -144,11 +174,22 @@ export default function InventoryPage() {
                             {/* Image Aspect Ratio Container 4:3 */}
                             <div className="relative aspect-[4/3] bg-gray-50 border-b overflow-hidden">
                                 {item.image ? (
-                                    <img
-                                        src={item.image}
-                                        alt={item.name}
-                                        className="object-cover w-full h-full group-hover:scale-110 transition-transform duration-500"
-                                    />
+                                    <picture>
+                                        {item.image_srcset?.avif && (
+                                            <source type="image/avif" srcSet={item.image_srcset.avif} sizes="(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 33vw" />
+                                        )}
+                                        {item.image_srcset?.webp && (
+                                            <source type="image/webp" srcSet={item.image_srcset.webp} sizes="(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 33vw" />
+                                        )}
+                                        <img
+                                            src={item.image}
+                                            srcSet={item.image_srcset?.jpeg}
+                                            sizes="(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 33vw"
+                                            alt={item.name}
+                                            loading="lazy"
+                                            className="object-cover w-full h-full group-hover:scale-110 transition-transform duration-500"
+                                        />
+                                    </picture>
                                 ) : (
                                     <div className="flex items-center justify-center h-full text-gray-300">
                                         <i className="bi bi-image text-4xl"></i>
@@ -206,6 +247,17 @@ export default function InventoryPage() {
                     ))}
                 </div>
             )}
+
+            {!loading && page < pages && (
+                <div className="flex justify-center mt-12">
+                    <button
+                        onClick={() => setPage(p => p + 1)}
+                        className="bg-gray-900 hover:bg-blue-600 text-white px-8 py-3 rounded-2xl text-sm font-bold transition-all duration-300"
+                    >
+                        Show More ({total - items.length} remaining)
+                    </button>
+                </div>
+            )}
         </div>
     );
 }
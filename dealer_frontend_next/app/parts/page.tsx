@@ -3,6 +3,7 @@
 import { useEffect, useState } from 'react';
 import PartSmartFrame from '@/components/PartSmartFrame';
 import { PartItem, DealerConfig } from '@/lib/types';
+import { getCatalog, getCatalogParts } from '@/lib/catalog';
 
 export default function PartsPage() {
     const [parts, setParts] = useState<PartItem[]>([]);
@@ -10,11 +11,10 @@ export default function PartsPage() {
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        // Fetch local parts inventory
-        fetch('/api/v1/parts')
-            .then(res => res.json())
+        // Local parts inventory, from the precomputed snapshot
+        getCatalogParts()
             .then(data => {
-                setParts(data);
+                setParts(data.parts);
                 setLoading(false);
             })
             .catch(err => {
@@ -22,17 +22,16 @@ export default function PartsPage() {
                 setLoading(false);
             });
 
-        // Fetch dealer config to check if ARI is enabled
-        fetch('/api/v1/site-info')
-            .then(res => res.json())
-            .then(data => {
+        // Dealer config (is ARI enabled?) from the catalog snapshot
+        getCatalog()
+            .then(catalog => {
                 const adapted: DealerConfig = {
-                    name: data.identity?.name,
-                    slug: data.identity?.slug,
+                    name: catalog.site.identity.name,
+                    slug: catalog.site.identity.slug,
                     modules: {
-                        ari: data.integrations?.ari?.enabled || false,
-                        pos: data.integrations?.pos?.provider || 'none',
-                        facebook: data.integrations?.facebook?.enabled || false
+                        ari: catalog.site.integrations.ari.enabled || false,
+                        pos: catalog.site.integrations.pos.provider || 'none',
+                        facebook: catalog.site.integrations.facebook.enabled || false
                     },
                     theme: {}
                 };
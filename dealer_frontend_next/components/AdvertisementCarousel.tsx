@@ -101,18 +101,36 @@ export default function AdvertisementCarousel({
               >
                 {currentAd.media_type === 'video' ? (
                   <video
-                    src={currentAd.image}
+                    key={currentAd.id}
                     poster={currentAd.thumbnail}
                     className="carousel-video h-80 w-auto object-cover hover:opacity-90 transition-opacity"
                     controls={false}
-                    preload="none"
-                  />
+                    playsInline
+                    preload="metadata"
+                  >
+                    {/* HLS where supported natively (iOS/Android), else the faststart MP4, else the upload */}
+                    {currentAd.hls_url && <source src={currentAd.hls_url} type="application/vnd.apple.mpegurl" />}
+                    <source src={currentAd.image} type="video/mp4" />
+                    {currentAd.original_url && currentAd.original_url !== currentAd.image && (
+                      <source src={currentAd.original_url} />
+                    )}
+                  </video>
                 ) : (
-                  <img
-                    src={currentAd.thumbnail || currentAd.image}
-                    alt={currentAd.title}
-                    className="carousel-image h-80 w-auto object-cover hover:opacity-90 transition-opacity"
-                  />
+                  <picture>
+                    {currentAd.image_srcset?.avif && (
+                      <source type="image/avif" srcSet={currentAd.image_srcset.avif} sizes="(max-width: 768px) 100vw, 640px" />
+                    )}
+                    {currentAd.image_srcset?.webp && (
+                      <source type="image/webp" srcSet={currentAd.image_srcset.webp} sizes="(max-width: 768px) 100vw, 640px" />
+                    )}
+                    <img
+                      src={currentAd.thumbnail || currentAd.image}
+                      srcSet={currentAd.image_srcset?.jpeg}
+                      sizes="(max-width: 768px) 100vw, 640px"
+                      alt={currentAd.title}
+                      className="carousel-image h-80 w-auto object-cover hover:opacity-90 transition-opacity"
+                    />
+                  </picture>
                 )}
               </button>
             </div>
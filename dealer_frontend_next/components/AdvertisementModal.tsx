@@ -55,13 +55,20 @@ export default function AdvertisementModal({
         >
           {advertisement.media_type === 'video' ? (
             <video
-              src={advertisement.image}
+              key={advertisement.id}
               poster={advertisement.thumbnail}
               className="w-full h-full object-contain"
               controls={true}
               autoPlay={true}
+              playsInline
               preload="metadata"
-            />
+            >
+              {advertisement.hls_url && <source src={advertisement.hls_url} type="application/vnd.apple.mpegurl" />}
+              <source src={advertisement.image} type="video/mp4" />
+              {advertisement.original_url && advertisement.original_url !== advertisement.image && (
+                <source src={advertisement.original_url} />
+              )}
+            </video>
           ) : (
             <img
               src={advertisement.image}
@@ -0,0 +1,32 @@
+import { CatalogSnapshot, CatalogParts } from './types';
+
+// Precomputed per-tenant snapshots (served from Redis, revalidated by ETag).
+// Components share one request; it is refetched after a minute of client-side navigation.
+const REUSE_MS = 60_000;
+const snapshots = new Map<string, { promise: Promise<unknown>; at: number }>();
+
+function fetchSnapshot<T>(path: string): Promise<T> {
+    const cached = snapshots.get(path);
+    if (cached && Date.now() - cached.at < REUSE_MS) {
+        return cached.promise as Promise<T>;
+    }
+
+    // no-cache: the browser revalidates with If-None-Match and gets a 304 when unchanged
+    const promise = fetch(path, { cache: 'no-cache' }).then(res => {
+        if (!res.ok) {
+            throw new Error(`Catalog request failed: ${res.status}`);
+        }
+        return res.json() as Promise<T>;
+    });
+    promise.catch(() => snapshots.delete(path));
+    snapshots.set(path, { promise, at: Date.now() });
+    return promise;
+}
+
+export function getCatalog(): Promise<CatalogSnapshot> {
+    return fetchSnapshot<CatalogSnapshot>('/api/v1/catalog');
+}
+
+export function getCatalogParts(): Promise<CatalogParts> {
+    return fetchSnapshot<CatalogParts>('/api/v1/catalog/parts');
+}
@@ -0,0 +1,20 @@
+import { InventorySearchParams, InventorySearchResult } from './types';
+
+// Client-safe (lib/api.ts pulls in next/headers and is server-only)
+export async function searchInventory(params: InventorySearchParams, signal?: AbortSignal): Promise<InventorySearchResult> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+        if (value === undefined || value === null || value === '') return;
+        if (Array.isArray(value)) {
+            value.forEach(v => query.append(key, v));
+        } else {
+            query.append(key, String(value));
+        }
+    });
+
+    const res = await fetch(`/api/v1/inventory/search?${query.toString()}`, { signal });
+    if (!res.ok) {
+        throw new Error(`Inventory search failed: ${res.status}`);
+    }
+    return res.json();
+}
@@ -42,9 +42,22 @@ export interface DealerConfig {
         brand_logos?: Record<string, string>;
         brandLogos?: Record<string, string>;
         brandLogoUrls?: Record<string, string>;
+
+        // Responsive logo variants (srcset strings per format)
+        logoVariants?: ImageSrcset | null;
+        brandLogoVariants?: Record<string, ImageSrcset | null>;
     };
 }
 
+export interface ImageSrcset {
+    avif?: string;
+    webp?: string;
+    jpeg?: string;
+    png?: string;
+    width?: number;
+    height?: number;
+}
+
 export interface InventoryItem {
     id: number;
     name: string;
@@ -52,6 +65,7 @@ export interface InventoryItem {
     stock: number;
     status: string;
     image?: string;
+    image_srcset?: ImageSrcset | null;
     description?: string;
     manufacturer?: string;
     model_number?: string;
@@ -62,6 +76,71 @@ export interface InventoryItem {
     type?: string;
 }
 
+export interface FacetValue {
+    value: string;
+    count: number;
+}
+
+export interface InventoryFacets {
+    manufacturers: FacetValue[];
+    types: FacetValue[];
+    conditions: FacetValue[];
+    price: { min: number | null; max: number | null };
+    year: { min: number | null; max: number | null };
+}
+
+export interface InventorySearchParams {
+    q?: string;
+    manufacturer?: string[];
+    type?: string[];
+    condition?: string[];
+    min_price?: number;
+    max_price?: number;
+    min_year?: number;
+    max_year?: number;
+    sort?: string;
+    order?: 'asc' | 'desc';
+    page?: number;
+    per_page?: number;
+}
+
+export interface InventorySearchResult {
+    results: InventoryItem[];
+    total: number;
+    page: number;
+    per_page: number;
+    pages: number;
+    facets: InventoryFacets;
+}
+
+export interface CatalogSite {
+    identity: { name: string; slug: string };
+    is_active: boolean;
+    contact: { email?: string | null; phone?: string | null };
+    integrations: {
+        ari: { enabled: boolean; dealer_id?: string | null };
+        facebook: { enabled: boolean; page_id?: string | null };
+        pos: { enabled: boolean; provider?: string | null };
+    };
+}
+
+export interface CatalogSnapshot {
+    organization_id: number;
+    version: number;
+    built_at: string;
+    site: CatalogSite;
+    units: InventoryItem[];
+    facets: InventoryFacets;
+    parts_summary: { count: number; in_stock: number; manufacturers: FacetValue[] };
+}
+
+export interface CatalogParts {
+    organization_id: number;
+    version: number;
+    built_at: string;
+    parts: PartItem[];
+}
+
 export interface PartItem {
     id: number;
     part_number: string;
@@ -79,4 +158,7 @@ export interface Advertisement {
     thumbnail?: string;
     link_url?: string;
     media_type?: 'image' | 'video';
+    hls_url?: string | null;
+    original_url?: string;
+    image_srcset?: ImageSrcset | null;
 }
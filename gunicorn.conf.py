@@ -1,9 +1,14 @@
 import gevent.monkey
 gevent.monkey.patch_all()
 
+import os
+
 bind = "0.0.0.0:5000"
 workers = 1
 worker_class = "gevent"
+# Concurrent greenlets per worker. Database work is bounded separately by the
+# SQLAlchemy pool (DB_POOL_SIZE + DB_MAX_OVERFLOW); the rest wait for a connection.
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 200))
 timeout = 300
 loglevel = "debug"
 errorlog = "-"
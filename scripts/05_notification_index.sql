@@ -0,0 +1,2 @@
+-- Unread notification lookups (badge reconciliation, mark-all-read)
+CREATE INDEX IF NOT EXISTS ix_notification_recipient_read ON notification (recipient_id, is_read);
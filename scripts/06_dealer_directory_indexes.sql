@@ -0,0 +1,5 @@
+-- Dealer directory: paginated name listing plus grouped per-dealer statistics
+CREATE INDEX IF NOT EXISTS ix_dealer_org_name ON dealer (organization_id, name);
+CREATE INDEX IF NOT EXISTS ix_case_org_dealer_status ON "case" (organization_id, dealer_id, status);
+CREATE INDEX IF NOT EXISTS ix_contact_org_dealer ON contact (organization_id, dealer_id);
+CREATE INDEX IF NOT EXISTS ix_dealer_note_org_dealer_ts ON dealer_note (organization_id, dealer_id, timestamp);
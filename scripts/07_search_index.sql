@@ -0,0 +1,26 @@
+-- Unified per-tenant search index (kept in sync by app/core/search.py)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE TABLE IF NOT EXISTS search_document (
+    id SERIAL PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organization(id),
+    doc_type VARCHAR(20) NOT NULL,
+    object_id INTEGER NOT NULL,
+    parent_id INTEGER,
+    title VARCHAR(255) NOT NULL DEFAULT '',
+    subtitle VARCHAR(255),
+    body TEXT,
+    updated_at TIMESTAMP DEFAULT now(),
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(subtitle, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'C')
+    ) STORED,
+    CONSTRAINT _search_doc_type_object_uc UNIQUE (doc_type, object_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_search_document_org_vector ON search_document USING gin (organization_id, search_vector);
+CREATE INDEX IF NOT EXISTS ix_search_document_org_title_trgm ON search_document USING gin (organization_id, title gin_trgm_ops);
+
+-- Populate afterwards with the rebuild_search_index Celery task.
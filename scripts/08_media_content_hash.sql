@@ -0,0 +1,10 @@
+-- Content-addressed promotion media (per-tenant dedup)
+-- media_content is created by the app (db.create_all), so on a fresh volume it may not exist yet
+ALTER TABLE IF EXISTS media_content ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64);
+
+DO $$
+BEGIN
+    IF to_regclass('public.media_content') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS ix_media_content_org_sha256 ON media_content (organization_id, content_sha256);
+    END IF;
+END $$;
@@ -0,0 +1,5 @@
+-- Transcoded video renditions for promotions
+-- media_content is created by the app (db.create_all), so on a fresh volume it may not exist yet
+ALTER TABLE IF EXISTS media_content ADD COLUMN IF NOT EXISTS original_url VARCHAR(500);
+ALTER TABLE IF EXISTS media_content ADD COLUMN IF NOT EXISTS renditions JSON;
+ALTER TABLE IF EXISTS media_content ADD COLUMN IF NOT EXISTS transcode_status VARCHAR(20);
@@ -0,0 +1,3 @@
+-- Responsive image variant manifests (WebP/AVIF/JPEG at fixed widths)
+-- unit_image is created by the app (db.create_all), so on a fresh volume it may not exist yet
+ALTER TABLE IF EXISTS unit_image ADD COLUMN IF NOT EXISTS variants JSON;
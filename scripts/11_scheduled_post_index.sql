@@ -0,0 +1,9 @@
+-- Due scheduled posts are claimed by (status, scheduled_post_time); organization_id is covered
+-- media_content is created by the app (db.create_all), so on a fresh volume it may not exist yet
+DO $$
+BEGIN
+    IF to_regclass('public.media_content') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS ix_media_content_status_scheduled
+            ON media_content (status, scheduled_post_time) INCLUDE (organization_id);
+    END IF;
+END $$;
@@ -0,0 +1,11 @@
+-- Resumable Facebook video upload progress, so a retry continues from the last acknowledged byte
+-- facebook_post and scheduled_post are created by the app (db.create_all), so on a fresh volume they may not exist yet
+ALTER TABLE IF EXISTS facebook_post ADD COLUMN IF NOT EXISTS upload_session_id VARCHAR(100);
+ALTER TABLE IF EXISTS facebook_post ADD COLUMN IF NOT EXISTS upload_video_id VARCHAR(100);
+ALTER TABLE IF EXISTS facebook_post ADD COLUMN IF NOT EXISTS upload_offset BIGINT DEFAULT 0;
+ALTER TABLE IF EXISTS facebook_post ADD COLUMN IF NOT EXISTS upload_size BIGINT;
+
+ALTER TABLE IF EXISTS scheduled_post ADD COLUMN IF NOT EXISTS upload_session_id VARCHAR(100);
+ALTER TABLE IF EXISTS scheduled_post ADD COLUMN IF NOT EXISTS upload_video_id VARCHAR(100);
+ALTER TABLE IF EXISTS scheduled_post ADD COLUMN IF NOT EXISTS upload_offset BIGINT DEFAULT 0;
+ALTER TABLE IF EXISTS scheduled_post ADD COLUMN IF NOT EXISTS upload_size BIGINT;
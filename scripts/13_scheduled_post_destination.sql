@@ -0,0 +1,9 @@
+-- Per-destination publish rows are looked up by (media_content_id, destination)
+-- scheduled_post is created by the app (db.create_all), so on a fresh volume it may not exist yet
+DO $$
+BEGIN
+    IF to_regclass('public.scheduled_post') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS ix_scheduled_post_media_destination
+            ON scheduled_post (media_content_id, destination);
+    END IF;
+END $$;
@@ -0,0 +1,11 @@
+-- Offline-bridge scan for the SaaS command center metrics
+-- is_active / last_bridge_heartbeat are app-managed columns, so on a fresh volume they may not exist yet
+DO $$
+BEGIN
+    IF (SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'organization'
+        AND column_name IN ('is_active', 'last_bridge_heartbeat')) = 2 THEN
+        CREATE INDEX IF NOT EXISTS ix_organization_active_heartbeat
+            ON organization (is_active, last_bridge_heartbeat);
+    END IF;
+END $$;
@@ -0,0 +1,24 @@
+-- Hashed POS bridge key lookup (app/core/bridge_auth.py)
+ALTER TABLE IF EXISTS organization ADD COLUMN IF NOT EXISTS pos_bridge_key_hash VARCHAR(64);
+ALTER TABLE IF EXISTS organization ADD COLUMN IF NOT EXISTS pos_bridge_key_prev_hash VARCHAR(64);
+ALTER TABLE IF EXISTS organization ADD COLUMN IF NOT EXISTS pos_bridge_key_prev_expires TIMESTAMP;
+
+-- Backfill from the plaintext key; pos_bridge_key is app-managed, so on a fresh volume it may not exist yet
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'public' AND table_name = 'organization' AND column_name = 'pos_bridge_key') THEN
+        UPDATE organization
+        SET pos_bridge_key_hash = encode(sha256(convert_to(pos_bridge_key, 'UTF8')), 'hex')
+        WHERE pos_bridge_key IS NOT NULL AND pos_bridge_key <> '' AND pos_bridge_key_hash IS NULL;
+
+        -- Only the hash is kept from here on
+        UPDATE organization SET pos_bridge_key = NULL
+        WHERE pos_bridge_key IS NOT NULL AND pos_bridge_key_hash IS NOT NULL;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_organization_pos_bridge_key_hash
+    ON organization (pos_bridge_key_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_organization_pos_bridge_key_prev_hash
+    ON organization (pos_bridge_key_prev_hash);
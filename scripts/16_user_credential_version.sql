@@ -0,0 +1,2 @@
+-- Per-user credential version for the session-cached identity (app/core/identity.py)
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS credential_version INTEGER NOT NULL DEFAULT 1;
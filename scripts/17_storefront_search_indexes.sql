@@ -0,0 +1,17 @@
+-- Storefront faceted search (app/core/inventory_search.py)
+-- The inventory columns and unit_image are app-managed, so on a fresh volume they may not exist yet
+DO $$
+BEGIN
+    IF (SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'unit'
+        AND column_name IN ('is_inventory', 'display_on_web', 'type', 'condition', 'price', 'year')) = 6 THEN
+        CREATE INDEX IF NOT EXISTS ix_unit_storefront
+            ON unit (organization_id, is_inventory, display_on_web, manufacturer, type, condition, price, year);
+    END IF;
+
+    -- Primary-image lookup per unit
+    IF to_regclass('public.unit_image') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS ix_unit_image_unit_primary
+            ON unit_image (unit_id, is_primary);
+    END IF;
+END $$;
@@ -0,0 +1,78 @@
+"""
+Database concurrency benchmark for the gevent web worker setup.
+
+Runs SELECT pg_sleep(...) from N greenlets at several concurrency levels and
+reports queries/second plus the pool metrics. With the cooperative driver,
+throughput should scale with concurrency until the pool is saturated. With
+--blocking (no wait callback) it stays flat at one in-flight query.
+
+Usage (inside the web container, or with DB_URI pointing at the database):
+    python scripts/bench_db_concurrency.py [--levels 1,5,10,20,40] [--queries 200] [--sleep 0.05] [--blocking]
+"""
+import gevent.monkey
+gevent.monkey.patch_all()
+
+import argparse
+import os
+import sys
+import time
+
+import gevent
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_level(app, db, concurrency, queries, sleep):
+    from app.core.db_pool import get_pool_metrics
+
+    per_greenlet = max(queries // concurrency, 1)
+
+    def worker():
+        with app.app_context():
+            for _ in range(per_greenlet):
+                db.session.execute(text("SELECT pg_sleep(:s)"), {'s': sleep})
+                db.session.rollback()  # Return the connection between queries, like a request does
+            db.session.remove()
+
+    with app.app_context():
+        get_pool_metrics(db.engine, reset=True)
+        started = time.perf_counter()
+        gevent.joinall([gevent.spawn(worker) for _ in range(concurrency)], raise_error=True)
+        elapsed = time.perf_counter() - started
+        metrics = get_pool_metrics(db.engine) or {}
+
+    total = per_greenlet * concurrency
+    return total, elapsed, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='1,5,10,20,40')
+    parser.add_argument('--queries', type=int, default=200, help='Queries per level')
+    parser.add_argument('--sleep', type=float, default=0.05, help='Server-side seconds per query')
+    parser.add_argument('--blocking', action='store_true', help='Skip the gevent wait callback for comparison')
+    args = parser.parse_args()
+
+    if args.blocking:
+        import app.core.db_pool as db_pool
+        db_pool.make_psycopg2_cooperative = lambda: False
+
+    from app import create_app
+    from app.core.extensions import db
+    app = create_app(os.getenv('FLASK_CONFIG') or 'prod')
+
+    mode = 'blocking' if args.blocking else 'cooperative'
+    ideal = 1 / args.sleep
+    print(f"Driver mode: {mode}; {args.sleep * 1000:.0f} ms per query (one connection = {ideal:.0f} q/s)")
+    print(f"{'conc':>5} {'queries':>8} {'secs':>7} {'q/s':>8} {'x1':>6} {'wait avg ms':>12} {'wait max ms':>12} {'timeouts':>9}")
+
+    for level in [int(x) for x in args.levels.split(',')]:
+        total, elapsed, metrics = run_level(app, db, level, args.queries, args.sleep)
+        qps = total / elapsed
+        print(f"{level:>5} {total:>8} {elapsed:>7.2f} {qps:>8.1f} {qps / ideal:>6.1f} "
+              f"{metrics.get('wait_avg_ms', 0):>12.2f} {metrics.get('wait_max_ms', 0):>12.2f} {metrics.get('timeouts', 0):>9}")
+
+
+if __name__ == '__main__':
+    main()